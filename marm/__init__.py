@@ -69,7 +69,9 @@ __all__ = [
     'frame',
     'rtp',
     'opus',
+    'index',
     'mjr',
+    'mra',
     'pcap',
     'FFProbe',
     'FFMPEG',
@@ -93,7 +95,9 @@ from . import vp8
 from . import opus
 
 # stored packets
+from . import index
 from . import mjr
+from . import mra
 from . import pcap
 
 # helper
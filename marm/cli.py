@@ -9,11 +9,13 @@ for usage.
 """
 import argparse
 import collections
+import json
 import logging
 import os
 import re
+import sys
 
-from . import __version__, rtp, vp8, opus, mjr, frame, Frames, VideoFrame, VideoFrames
+from . import __version__, rtp, vp8, opus, mjr, mra, pcap, frame, Frames, VideoFrame, VideoFrames
 
 
 logger = logging.getLogger(__name__)
@@ -24,6 +26,11 @@ packet_types = {
     'opus': opus.OpusRTPPacket,
 }
 
+writers = {
+    'mjr': mjr.MJRWriter,
+    'mra': mra.MRAWriter,
+}
+
 encoders = {
     vp8.VP8RTPPacket: 'libvpx',
     opus.OpusRTPPacket: 'libopus',
@@ -99,6 +106,19 @@ class ParamsAction(argparse.Action):
             setattr(namespace, self.dest, map(self.parse, values))
 
 
+def int_range(value):
+    """
+    Parses "begin:end" where either is optional, e.g. "100:" or ":200".
+    """
+    begin, sep, end = value.partition(':')
+    if not sep:
+        raise ValueError('expected begin:end')
+    return (
+        int(begin) if begin.strip() else None,
+        int(end) if end.strip() else None,
+    )
+
+
 class PacketFilterAction(ParamsAction):
 
     # ParamsAction
@@ -106,9 +126,33 @@ class PacketFilterAction(ParamsAction):
     params = {
         'pt': int,
         'ssrc': int,
+        'seq': int_range,
+        'timestamp': int_range,
+        'marker': int,
     }
 
 
+class PayloadTypesAction(ParamsAction):
+
+    # ParamsAction
+
+    def parse(self, value):
+        payload_types = {}
+        for k, v in re.findall(r'([^=,\s]*)\s*=\s*([^,]*)', value):
+            try:
+                pt = int(k)
+            except ValueError, ex:
+                raise argparse.ArgumentError(
+                    self, '{0}= not a payload type ({1})'.format(k, ex),
+                )
+            if v not in packet_types:
+                raise argparse.ArgumentError(
+                    self, '"{0}" not a supported packet type'.format(v),
+                )
+            payload_types[pt] = packet_types[v]
+        return payload_types
+
+
 class VideoProfileAction(ParamsAction):
     
     # ParamsAction
@@ -191,10 +235,19 @@ def split_parser(cmd_parsers, parents):
         default=False,
         help='overwrite existing splits',
     )
+    split_parser.add_argument(
+        '-s', '--sidecar',
+        action='store_true',
+        default=False,
+        help='save sidecar indexes next to mjr splits',
+    )
     split_parser.add_argument(
         '--filter',
         action=PacketFilterAction,
-        help='packet filter',
+        help=(
+            'packet filter on rtp header fields pt, ssrc, seq, timestamp and '
+            'marker, e.g. pt=100,ssrc=1234,timestamp=0:90000'
+        ),
     )
     split_parser.add_argument(
         'packet_type',
@@ -233,20 +286,21 @@ def split_cmd(args):
     _, ext = os.path.splitext(out_format)
     if ext:
         ext = ext[1:]
-    if ext != 'mjr':
-        raise ValueError('Only {0} output archives supported.'.format('mjr'))
+    if ext not in writers:
+        raise ValueError('Only {0} output archives supported.'.format(
+            ', '.join(sorted(writers))
+        ))
+
+    writer_kwargs = {}
+    if args.sidecar and ext == 'mjr':
+        writer_kwargs['sidecar'] = True
 
     logger.info(
         'splitting "%s" w/ duration=%s, count=%s',
         in_path, args.duration, args.count,
     )
     if args.filter:
-        pt = args.filter.get('pt')
-        ssrc = args.filter.get('ssrc')
-        packet_filter = lambda pkt: (
-            (pt is None or pkt.header.type == pt) and
-            (ssrc is None or pkt.header.ssrc == ssrc)
-        )
+        packet_filter = rtp.PacketFilter(**args.filter)
     else:
         packet_filter = None
     pkts = rtp.RTPPacketReader.open(
@@ -267,12 +321,13 @@ def split_cmd(args):
             )
         else:
             logger.info('writing split %s to "%s"', i + 1, out_path)
-            pkt_count = 0
-            with open(out_path, 'wb') as fo:
-                mjr.write_header(fo, pkts.packet_type.type)
+            with writers[ext](
+                    out_path,
+                    packet_type=pkts.packet_type,
+                    **writer_kwargs) as w:
                 for pkt in split:
-                    mjr.write_packet(fo, pkt)
-                    pkt_count += 1
+                    w.write(pkt)
+            pkt_count = w.count
             logger.info('wrote %s packets to split "%s"', pkt_count, out_path)
             pkt_total += pkt_count
             split_count += 1
@@ -282,6 +337,199 @@ def split_cmd(args):
     )
 
 
+def demux_parser(cmd_parsers, parents):
+    """
+    Demux command parser.
+    """
+    demux_parser = cmd_parsers.add_parser(
+        'demux',
+        help='demultiplexes all rtp flows in a capture into separate files',
+        parents=parents,
+    )
+    demux_parser.add_argument(
+        '-f', '--force',
+        action='store_true',
+        default=False,
+        help='overwrite existing files',
+    )
+    demux_parser.add_argument(
+        '-s', '--sidecar',
+        action='store_true',
+        default=False,
+        help='save sidecar indexes next to mjr archives',
+    )
+    demux_parser.add_argument(
+        '-m', '--map',
+        action=PayloadTypesAction,
+        default={},
+        help=(
+            'payload type to packet type ({0}) mappings (e.g. 100=vp8), '
+            'otherwise inferred from clock rate'
+            .format(', '.join(packet_types.keys()))
+        ),
+    )
+    demux_parser.add_argument(
+        'in_path',
+        nargs=1,
+        help='path to input capture'
+    )
+    demux_parser.add_argument(
+        'out_format',
+        nargs='?',
+        help=(
+            'format for path to each flow\'s archive (e.g. '
+            '/tmp/out-{ssrc}-{pt}.mjr) w/ fields src_addr, src_port, '
+            'dst_addr, dst_port, ssrc, pt and type.'
+        ),
+    )
+    demux_parser.set_defaults(cmd=demux_cmd)
+
+
+def demux_cmd(args):
+    """
+    Demux command.
+    """
+    in_path = args.in_path[0]
+    out_format = args.out_format
+    if out_format is None or os.path.isdir(out_format):
+        p = os.path.abspath(in_path)
+        name, _ = os.path.splitext(os.path.basename(p))
+        d = out_format if out_format else os.path.dirname(p)
+        out_format = os.path.join(d, '{0}-{1}.mjr'.format(name, '{ssrc}-{pt}'))
+        logger.info('generated format "%s"', out_format)
+    _, ext = os.path.splitext(out_format)
+    if ext:
+        ext = ext[1:]
+    if ext not in writers:
+        raise ValueError('Only {0} output archives supported.'.format(
+            ', '.join(sorted(writers))
+        ))
+
+    writer_kwargs = {}
+    if args.sidecar and ext == 'mjr':
+        writer_kwargs['sidecar'] = True
+    out_paths = {}
+
+    def writer(flow, packet_type):
+        out_path = out_format.format(
+            src_addr=flow.src[0],
+            src_port=flow.src[1],
+            dst_addr=flow.dst[0],
+            dst_port=flow.dst[1],
+            ssrc=flow.ssrc,
+            pt=flow.type,
+            type=packet_type.type,
+        )
+        if out_path in out_paths:
+            raise ValueError(
+                'Flows {0} and {1} both map to "{2}".'
+                .format(out_paths[out_path], flow, out_path)
+            )
+        out_paths[out_path] = flow
+        if not args.force and os.path.exists(out_path):
+            logger.warn('not overwriting existing "%s", skipping %s', out_path, flow)
+            return None
+        logger.info('writing %s as %s to "%s"', flow, packet_type.__name__, out_path)
+        return writers[ext](out_path, packet_type=packet_type, **writer_kwargs)
+
+    logger.info('demuxing "%s"', in_path)
+    with open(in_path, 'rb') as fo:
+        pkts = pcap.PCapRTPPacketReader(fo)
+        flows = pkts.demux(
+            writer,
+            payload_types=args.map,
+            packet_types=packet_types.values(),
+        )
+    for flow, (packet_type, pkt_count) in flows.iteritems():
+        logger.info('wrote %s %s packets for %s', pkt_count, packet_type.__name__, flow)
+    logger.info('wrote %s flows w/ format "%s"', len(flows), out_format)
+
+
+def stats_parser(cmd_parsers, parents):
+    """
+    Stats command parser.
+    """
+    stats_parser = cmd_parsers.add_parser(
+        'stats',
+        help=(
+            'computes packet loss, duplicate, reorder, jitter, timestamp gap '
+            'and frame statistics of archives'
+        ),
+        parents=parents,
+    )
+    stats_parser.add_argument(
+        '-g', '--gap',
+        type=float,
+        default=1.0,
+        help='count timestamps further apart than this as a gap',
+        metavar='SECONDS',
+    )
+    stats_parser.add_argument(
+        '--filter',
+        action=PacketFilterAction,
+        help=(
+            'packet filter on rtp header fields pt, ssrc, seq, timestamp and '
+            'marker, e.g. pt=100,ssrc=1234'
+        ),
+    )
+    stats_parser.add_argument(
+        '-s', '--sidecar',
+        action='store_true',
+        default=False,
+        help=(
+            'save stats along w/ sidecar indexes next to mjr archives, so '
+            'they are only computed once'
+        ),
+    )
+    stats_parser.add_argument(
+        'packet_type',
+        choices=packet_types.keys(),
+        help='type of media packet in archives',
+        metavar='PACKET-TYPE',
+    )
+    stats_parser.add_argument(
+        'archives',
+        nargs='+',
+        help='input archives, stats for each are written as a line of json',
+    )
+    stats_parser.set_defaults(cmd=stats_cmd)
+
+
+def stats_cmd(args):
+    """
+    Stats command.
+    """
+    packet_type = packet_types[args.packet_type]
+    if args.filter:
+        packet_filter = rtp.PacketFilter(**args.filter)
+    else:
+        packet_filter = None
+    for path in args.archives:
+        logger.info('computing stats of "%s"', path)
+        ext = os.path.splitext(path)[1]
+        if ext == '.pcap':
+            # NOTE: only captures have arrival times, i.e. jitter
+            with open(path, 'rb') as fo:
+                pkts = pcap.PCapRTPPacketReader(
+                    fo, packet_type=packet_type, packet_filter=packet_filter,
+                )
+                stats = rtp.stream_stats(pkts.arrivals(), gap=args.gap)
+        else:
+            part_kwargs = {}
+            if args.sidecar and ext == '.mjr':
+                part_kwargs['sidecar'] = True
+            cur = rtp.RTPCursor(
+                [path],
+                packet_type=packet_type,
+                packet_filter=packet_filter,
+                **part_kwargs
+            )
+            stats, = cur.stats(gap=args.gap)
+        line = collections.OrderedDict([('path', path)])
+        line.update(stats._asdict())
+        sys.stdout.write(json.dumps(line) + '\n')
+
+
 def mux_parser(cmd_parsers, parents):
     """
     Mux command parser.
@@ -328,6 +576,13 @@ def mux_parser(cmd_parsers, parents):
         default=10,
         help='number of video frames over which estimate frame rate',
     )
+    mux_parser.add_argument(
+        '-r', '--reorder-window',
+        type=int,
+        default=0,
+        help='reorder packets by sequence number, holding back at most COUNT',
+        metavar='COUNT',
+    )
     mux_parser.add_argument(
         'container',
         nargs=1,
@@ -425,9 +680,11 @@ def mux_cmd(args):
             'using video profile -\n%s',
             '\n'.join('  {0}={1}'.format(k, v) for k, v in v_prof.items())
         )
-        v_frames = VideoFrames(v_cur)
+        v_pkts = reordered(v_cur, args.reorder_window)
+        v_frames = VideoFrames(v_pkts)
     else:
         logger.info('no video')
+        v_pkts = None
         v_frames = None
         v_prof = None
 
@@ -460,9 +717,11 @@ def mux_cmd(args):
             'using audio profile -\n%s',
             '\n'.join('  {0}={1}'.format(k, v) for k, v in a_prof.items())
         )
-        a_frames = Frames(a_cur)
+        a_pkts = reordered(a_cur, args.reorder_window)
+        a_frames = Frames(a_pkts)
     else:
         logger.info('no audio')
+        a_pkts = None
         a_frames = None
         a_prof = None
 
@@ -483,6 +742,19 @@ def mux_cmd(args):
                 video_profile=v_prof,
                 video_packets=v_frames,
             )
+        for name, pkts in [('video', v_pkts), ('audio', a_pkts)]:
+            if isinstance(pkts, rtp.ReorderedPackets):
+                logger.info(
+                    'dropped %s late and %s duplicate %s packets',
+                    pkts.late, pkts.duplicates, name,
+                )
+
+
+def reordered(cur, window):
+    if not window:
+        return cur
+    logger.info('reordering packets w/ window %s', window)
+    return rtp.ReorderedPackets(cur, window=window)
 
 
 def parser():
@@ -502,6 +774,8 @@ containers.
     )
     cmd_parsers = arg_parser.add_subparsers(title='commands')
     split_parser(cmd_parsers, [cmn_parser])
+    demux_parser(cmd_parsers, [cmn_parser])
+    stats_parser(cmd_parsers, [cmn_parser])
     mux_parser(cmd_parsers, [cmn_parser])
     return arg_parser
 
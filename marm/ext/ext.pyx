@@ -1,12 +1,15 @@
+import array
 import collections
 import logging
 import sys
 
 cimport cpython
+from cpython cimport array
 cimport cpython.exc
 cimport cpython.ref
-from libc.stdint cimport int64_t
+from libc.stdint cimport int64_t, uint8_t
 from libc.stdio cimport stderr
+from libc.stdlib cimport malloc, free
 from libc.string cimport memcpy, memset
 
 cimport libavcodec
@@ -16,6 +19,11 @@ from libcx cimport va_list, va_start, va_end, va_copy, vsnprintf
 cimport libmarm
 
 
+cdef extern from 'Python.h':
+
+    int PyObject_AsReadBuffer(object obj, const void **buffer, Py_ssize_t *buffer_len) except -1
+
+
 # exc propagation
 
 cdef struct exc_info:
@@ -722,6 +730,81 @@ cpdef object segment(
         if av_opts != NULL:
             libavutil.av_dict_free(&av_opts)
 
+
+RTP_CODEC_NONE = libmarm.MARM_RTP_CODEC_NONE
+RTP_CODEC_VP8 = libmarm.MARM_RTP_CODEC_VP8
+
+cpdef object scan_mjr(
+        object buf,
+        Py_ssize_t pos,
+        int codec,
+        object idx,
+        int strict=0,
+        size_t chunk=4096):
+    """
+    Scans mjr packets in `buf` (e.g. an `mmap.mmap`) starting at `pos` w/o
+    unpacking them and appends them to `idx`, an `index.PacketIndex`. Scanning
+    stops at the first truncated or invalid packet, or if `strict` the first
+    implausible one (see `mjr.is_plausible_record`).
+
+    :returns: Position just past the last scanned packet.
+    """
+    cdef const void *data = NULL
+    cdef Py_ssize_t data_len = 0
+    cdef libmarm.marm_rtp_entry_t *entries = NULL
+    cdef size_t nb_entries = 0
+    cdef size_t end = 0
+    cdef size_t i, n
+    cdef array.array offset = idx.offset
+    cdef array.array size = idx.size
+    cdef array.array seq = idx.seq
+    cdef array.array timestamp = idx.timestamp
+    cdef array.array ssrc = idx.ssrc
+    cdef array.array type_ = idx.type
+    cdef array.array flags = idx.flags
+
+    columns = (offset, size, seq, timestamp, ssrc, type_, flags)
+    if ''.join([column.typecode for column in columns]) != 'lIHIIBB':
+        raise TypeError('Unexpected index column types.')
+    PyObject_AsReadBuffer(buf, &data, &data_len)
+    if pos < 0 or pos > data_len:
+        raise ValueError('Invalid position {0}.'.format(pos))
+    end = pos
+
+    entries = <libmarm.marm_rtp_entry_t *>malloc(
+        chunk * sizeof(libmarm.marm_rtp_entry_t)
+    )
+    if entries == NULL:
+        raise MemoryError()
+    try:
+        while True:
+            # scan chunk
+            with nogil:
+                end = libmarm.marm_mjr_scan(
+                    <const uint8_t *>data, data_len, end,
+                    codec, strict,
+                    entries, chunk, &nb_entries,
+                )
+
+            # append it
+            n = len(offset)
+            for column in columns:
+                array.resize(column, n + nb_entries)
+            for i in range(nb_entries):
+                offset.data.as_longs[n + i] = entries[i].offset
+                size.data.as_uints[n + i] = entries[i].size
+                seq.data.as_ushorts[n + i] = entries[i].seq
+                timestamp.data.as_uints[n + i] = entries[i].timestamp
+                ssrc.data.as_uints[n + i] = entries[i].ssrc
+                type_.data.as_uchars[n + i] = entries[i].type
+                flags.data.as_uchars[n + i] = entries[i].flags
+
+            if nb_entries < chunk:
+                break
+    finally:
+        free(entries)
+    return end
+
 # init
 
 libavformat.av_register_all()
@@ -1,4 +1,4 @@
-from libc.stdint cimport int64_t, uint64_t
+from libc.stdint cimport int64_t, uint8_t, uint16_t, uint32_t, uint64_t
 
 cimport libavcodec
 cimport libavformat
@@ -55,6 +55,39 @@ cdef extern from 'marm.h':
 
     ctypedef marm_ctx_s marm_ctx_t
 
+    # rtp
+
+    int MARM_RTP_CODEC_NONE
+    int MARM_RTP_CODEC_VP8
+
+    int MARM_RTP_FLAG_MARKER
+    int MARM_RTP_FLAG_START_OF_FRAME
+    int MARM_RTP_FLAG_KEY_FRAME
+
+    struct marm_rtp_entry_s:
+
+        int64_t offset
+        uint32_t size
+        uint16_t seq
+        uint32_t timestamp
+        uint32_t ssrc
+        uint8_t type
+        uint8_t flags
+
+    ctypedef marm_rtp_entry_s marm_rtp_entry_t
+
+    # mjr
+
+    size_t marm_mjr_scan(
+        const uint8_t *buf,
+        size_t len,
+        size_t pos,
+        int codec,
+        int strict,
+        marm_rtp_entry_t *entries,
+        size_t max_nb_entries,
+        size_t *nb_entries) nogil
+
     # mpegts
 
     struct marm_mpegts_cc_s:
@@ -100,6 +100,42 @@ typedef struct marm_ctx_s {
     marm_filter_packet_t filter_packet;
 } marm_ctx_t;
 
+#define MARM_RTP_CODEC_NONE 0
+#define MARM_RTP_CODEC_VP8  1
+
+#define MARM_RTP_FLAG_MARKER            (1 << 0)
+#define MARM_RTP_FLAG_START_OF_FRAME    (1 << 1)
+#define MARM_RTP_FLAG_KEY_FRAME         (1 << 2)
+
+/**
+ * Stored rtp packet index entry.
+ */
+typedef struct marm_rtp_entry_s {
+    int64_t offset;
+    uint32_t size;
+    uint16_t seq;
+    uint32_t timestamp;
+    uint32_t ssrc;
+    uint8_t type;
+    uint8_t flags;
+} marm_rtp_entry_t;
+
+/**
+ * Scans up to `max_nb_entries` mjr packets in `buf` starting at `pos`. Stops
+ * at the first truncated or invalid packet, or if `strict` the first one that
+ * is not rtp version 2 or followed by a marker. Returns position just past the
+ * last scanned packet.
+ */
+size_t marm_mjr_scan(
+    const uint8_t *buf,
+    size_t len,
+    size_t pos,
+    int codec,
+    int strict,
+    marm_rtp_entry_t *entries,
+    size_t max_nb_entries,
+    size_t *nb_entries);
+
 #define MARM_MPEGTS_PAT_PID  0x0000
 #define MARM_MPEGTS_SDT_PID  0x0011
 
@@ -0,0 +1,126 @@
+#include <string.h>
+
+#include "marm.h"
+
+#define MJR_MARKER "MEETECHO"
+#define MJR_MARKER_LEN 8
+#define MJR_RECORD_HEADER_LEN (MJR_MARKER_LEN + 2)
+
+#define RTP_HEADER_LEN 12
+
+#ifndef MIN
+#define MIN(a, b) ((a) < (b) ? (a) : (b))
+#endif
+
+static uint16_t read_u16(const uint8_t *b) {
+    return ((uint16_t)b[0] << 8) | (uint16_t)b[1];
+}
+
+static uint32_t read_u32(const uint8_t *b) {
+    return (
+        ((uint32_t)b[0] << 24) |
+        ((uint32_t)b[1] << 16) |
+        ((uint32_t)b[2] << 8) |
+        (uint32_t)b[3]
+    );
+}
+
+/**
+ * Start of frame and key frame flags for a vp8 rtp payload, see
+ * https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
+ */
+static uint8_t vp8_flags(const uint8_t *b, size_t len) {
+    size_t offset = 1;
+    uint8_t x = 0;
+
+    if (len < 1)
+        return 0;
+
+    // descriptor, s == 1 && pid == 0
+    if ((b[0] & 0x1f) != 0x10)
+        return 0;
+
+    // descriptor x, i, l, tk
+    if (b[0] & 0x80) {
+        if (len < offset + 1)
+            return 0;
+        x = b[offset];
+        offset += 1;
+        if (x & 0x80) {
+            if (len < offset + 1)
+                return 0;
+            offset += (b[offset] & 0x80) ? 2 : 1;
+        }
+        if (x & 0x40)
+            offset += 1;
+        if (x & 0x30)
+            offset += 1;
+    }
+
+    // frame header, see https://tools.ietf.org/html/rfc6386#section-9.1
+    if (len < offset + 3)
+        return MARM_RTP_FLAG_START_OF_FRAME;
+    if (b[offset] & 0x01)
+        return MARM_RTP_FLAG_START_OF_FRAME;
+    return MARM_RTP_FLAG_START_OF_FRAME | MARM_RTP_FLAG_KEY_FRAME;
+}
+
+size_t marm_mjr_scan(
+    const uint8_t *buf,
+    size_t len,
+    size_t pos,
+    int codec,
+    int strict,
+    marm_rtp_entry_t *entries,
+    size_t max_nb_entries,
+    size_t *nb_entries) {
+
+    size_t n = 0, size, offset, end;
+    const uint8_t *b;
+    marm_rtp_entry_t *e;
+
+    while (n < max_nb_entries) {
+        // record header
+        if (len - pos < MJR_RECORD_HEADER_LEN)
+            break;
+        if (memcmp(buf + pos, MJR_MARKER, MJR_MARKER_LEN) != 0)
+            break;
+        size = read_u16(buf + pos + MJR_MARKER_LEN);
+        offset = pos + MJR_RECORD_HEADER_LEN;
+        if (len - offset < size)
+            break;
+
+        // rtp header
+        b = buf + offset;
+        if (size < RTP_HEADER_LEN)
+            break;
+
+        // plausible, i.e. rtp version 2 and followed by a (partial) marker
+        if (strict) {
+            if ((b[0] >> 6) != 2)
+                break;
+            end = offset + size;
+            if (memcmp(buf + end, MJR_MARKER, MIN(len - end, MJR_MARKER_LEN)) != 0)
+                break;
+        }
+        e = &entries[n];
+        e->offset = offset;
+        e->size = size;
+        e->seq = read_u16(b + 2);
+        e->timestamp = read_u32(b + 4);
+        e->ssrc = read_u32(b + 8);
+        e->type = b[1] & 0x7f;
+        e->flags = (b[1] & 0x80) ? MARM_RTP_FLAG_MARKER : 0;
+
+        // rtp payload, janus de-pads recorded packets
+        offset = RTP_HEADER_LEN + (b[0] & 0x0f) * 4;
+        if (codec == MARM_RTP_CODEC_VP8 && size > offset)
+            e->flags |= vp8_flags(b + offset, size - offset);
+
+        n += 1;
+        pos += MJR_RECORD_HEADER_LEN + size;
+    }
+
+    *nb_entries = n;
+    return pos;
+}
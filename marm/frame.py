@@ -93,10 +93,11 @@ class Frames(collections.Iterator):
     def next(self):
         packet = self.packets.next()
         pts = int(getattr(packet, self.pts) + self.pts_offset)
+        # NOTE: str copies data if it's a view (e.g. of an mmap)
         return self.frame_type(
             pts=pts,
             flags=self.flags,
-            data=packet.data.data
+            data=str(packet.data.data)
         )
 
 class VideoFrame(Frame):
@@ -0,0 +1,334 @@
+"""
+Indexes of stored `rtp.RTPPacket`s used for random access (e.g. by
+`rtp.RTPCursor`) and their persistence as *sidecar* files stored next to the
+archive they index, e.g.:
+
+.. code:: python
+
+    idx = marm.index.load_sidecar('path/to/video.mjr', marm.vp8.VP8RTPPacket)
+    if idx is None:
+        idx = build_it()
+        marm.index.save_sidecar('path/to/video.mjr', idx, marm.vp8.VP8RTPPacket)
+
+"""
+import array
+import collections
+import json
+import logging
+import os
+import struct
+import sys
+
+
+logger = logging.getLogger(__name__)
+
+
+# `PacketIndex.flags` bits.
+FLAG_MARKER = 1 << 0
+FLAG_START_OF_FRAME = 1 << 1
+FLAG_KEY_FRAME = 1 << 2
+
+
+class PacketIndex(object):
+    """
+    Column oriented index of stored packets. Each column is an `array.array`
+    and for each packet holds its:
+
+    - offset, position of the packet understood by the
+      `rtp.RTPPacketReader.read_packet` of the reader that indexed it
+    - size, of the packet in bytes
+    - seq, its rtp sequence number
+    - timestamp, its rtp timestamp
+    - ssrc, its rtp synchronization source
+    - type, its rtp payload type
+    - flags, combination of `FLAG_*` bits
+
+    `end` is the position just past the last indexed packet and `meta` is a
+    dict of json-able values persisted along w/ the index.
+
+    `orders` maps names (e.g. "seq") to permutations of its rows, as
+    `array.array`s, persisted along w/ the index while they're the same
+    length as it (see `rtp.packet_order`).
+    """
+
+    # NOTE: 'l' is 64 bits on LP64 (array has no 'q' in python 2)
+    columns = [
+        ('offset', 'l'),
+        ('size', 'I'),
+        ('seq', 'H'),
+        ('timestamp', 'I'),
+        ('ssrc', 'I'),
+        ('type', 'B'),
+        ('flags', 'B'),
+    ]
+
+    Entry = collections.namedtuple(
+        'Entry', [name for name, _ in columns]
+    )
+
+    def __init__(self):
+        for name, typecode in self.columns:
+            setattr(self, name, array.array(typecode))
+        self.end = None
+        self.meta = {}
+        self.orders = {}
+
+    def append(self, offset, size, seq, timestamp, ssrc, type, flags):
+        self.offset.append(offset)
+        self.size.append(size)
+        self.seq.append(seq)
+        self.timestamp.append(timestamp)
+        self.ssrc.append(ssrc)
+        self.type.append(type)
+        self.flags.append(flags)
+
+    def add(self, offset, size, pkt):
+        """
+        Appends entry for an `rtp.RTPPacket` at `offset`.
+        """
+        self.append(
+            offset,
+            size,
+            pkt.header.seq_number,
+            pkt.header.timestamp,
+            pkt.header.ssrc,
+            pkt.header.type,
+            packet_flags(pkt),
+        )
+
+    def extend(self, other):
+        for name, _ in self.columns:
+            getattr(self, name).extend(getattr(other, name))
+        self.end = other.end
+
+    def select(self, rows):
+        """
+        Creates index of only these `rows`.
+        """
+        idx = type(self)()
+        for row in rows:
+            idx.append(*self[row])
+        idx.end = self.end
+        return idx
+
+    def dump(self, fo, stamp):
+        """
+        Writes this index tagged w/ a `Stamp` to `fo`.
+        """
+        end = -1 if self.end is None else self.end
+        fo.write(struct.pack(
+            '>{0}sBcQdq'.format(len(MAGIC)),
+            MAGIC, VERSION, BYTE_ORDER, stamp.size, stamp.mtime, end,
+        ))
+        write_string(fo, stamp.packet_type)
+        sections = [
+            (name, getattr(self, name)) for name, _ in self.columns
+        ] + [
+            (ORDER_PREFIX + name, order)
+            for name, order in sorted(self.orders.iteritems())
+            if len(order) == len(self)
+        ]
+        fo.write(struct.pack('>H', len(sections) + 1))
+        for name, column in sections:
+            write_section(fo, name, column.typecode, column.tostring())
+        write_section(fo, 'meta', JSON_TYPECODE, json.dumps(self.meta))
+
+    @classmethod
+    def load(cls, fo):
+        """
+        Reads an index written by `dump` from `fo`.
+
+        :returns: Tuple of its `Stamp` and the index.
+        """
+        fmt = '>{0}sBcQdq'.format(len(MAGIC))
+        magic, version, byte_order, size, mtime, end = read_struct(fo, fmt)
+        if magic != MAGIC:
+            raise ValueError('Invalid magic "{0}" != "{1}".'.format(magic, MAGIC))
+        if version != VERSION:
+            raise ValueError('Unsupported version {0} != {1}.'.format(version, VERSION))
+        if byte_order != BYTE_ORDER:
+            raise ValueError('Unsupported byte order "{0}".'.format(byte_order))
+        stamp = Stamp(size=size, mtime=mtime, packet_type=read_string(fo))
+        idx = cls()
+        idx.end = None if end == -1 else end
+        typecodes = dict(cls.columns)
+        nb_section, = read_struct(fo, '>H')
+        for _ in xrange(nb_section):
+            name, typecode, buf = read_section(fo)
+            if typecode == JSON_TYPECODE:
+                setattr(idx, name, json.loads(buf))
+                continue
+            if name.startswith(ORDER_PREFIX) and typecode == ORDER_TYPECODE:
+                order = array.array(ORDER_TYPECODE)
+                order.fromstring(buf)
+                idx.orders[name[len(ORDER_PREFIX):]] = order
+                continue
+            if typecodes.get(name) != typecode:
+                raise ValueError('Unexpected section "{0}".'.format(name))
+            getattr(idx, name).fromstring(buf)
+        lengths = set(len(getattr(idx, name)) for name in typecodes)
+        lengths.update(len(order) for order in idx.orders.itervalues())
+        if len(lengths) > 1:
+            raise ValueError('Column length mismatch.')
+        return stamp, idx
+
+    def __getitem__(self, row):
+        return self.Entry(*(getattr(self, name)[row] for name, _ in self.columns))
+
+    def __iter__(self):
+        return (self[row] for row in xrange(len(self)))
+
+    def __len__(self):
+        return len(self.offset)
+
+
+def packet_flags(pkt):
+    """
+    Computes `PacketIndex.flags` for an `rtp.RTPPacket`.
+    """
+    flags = 0
+    if pkt.header.markerbit:
+        flags |= FLAG_MARKER
+    if getattr(pkt.data, 'is_start_of_frame', False):
+        flags |= FLAG_START_OF_FRAME
+        # NOTE: like native scans, a frame header too short to tell isn't a
+        # key frame
+        try:
+            if pkt.data.is_key_frame:
+                flags |= FLAG_KEY_FRAME
+        except ValueError:
+            pass
+    return flags
+
+
+# Identifies what a sidecar index was built from.
+Stamp = collections.namedtuple('Stamp', ['size', 'mtime', 'packet_type'])
+
+
+def stamp(path, packet_type):
+    st = os.stat(path)
+    return Stamp(
+        size=st.st_size,
+        mtime=st.st_mtime,
+        packet_type=packet_type_name(packet_type),
+    )
+
+
+def packet_type_name(packet_type):
+    # NOTE: lazy variants (see `rtp.lazy`) index the same
+    packet_type = getattr(packet_type, 'eager_type', packet_type)
+    return '{0}.{1}'.format(packet_type.__module__, packet_type.__name__)
+
+
+SIDECAR_EXT = '.idx'
+
+
+def sidecar_path(path):
+    return path + SIDECAR_EXT
+
+
+def load_sidecar(path, packet_type, prefix=False, is_prefix=None):
+    """
+    Loads sidecar `PacketIndex` for archive at `path` if it's valid, i.e. was
+    built for `packet_type` and archive file size and mtime have not changed.
+
+    If `prefix=True` the archive is assumed to only ever be appended to and
+    an index of a smaller version of it is also valid. Its `end` is then where
+    indexing should resume. As its mtime then changes too `is_prefix`, when
+    given, is called w/ such an index to check the archive still holds what
+    was indexed (e.g. wasn't rewritten) rather than trusting its size.
+
+    :returns: The index or None if missing or stale.
+    """
+    s_path = sidecar_path(path)
+    try:
+        with open(s_path, 'rb') as fo:
+            s_stamp, idx = PacketIndex.load(fo)
+    except (IOError, OSError):
+        return None
+    except (ValueError, struct.error), ex:
+        logger.info('ignoring invalid index "%s" - %s', s_path, ex)
+        return None
+    c_stamp = stamp(path, packet_type)
+    if s_stamp != c_stamp:
+        if not (
+                prefix and
+                s_stamp.packet_type == c_stamp.packet_type and
+                s_stamp.size <= c_stamp.size and
+                idx.end is not None):
+            logger.debug('ignoring stale index "%s"', s_path)
+            return None
+        if is_prefix is not None and not is_prefix(idx):
+            logger.info('ignoring index "%s" of rewritten archive', s_path)
+            return None
+    return idx
+
+
+def save_sidecar(path, idx, packet_type):
+    """
+    Saves `PacketIndex` as sidecar for archive at `path`. Failures (e.g.
+    read-only directory) are logged and ignored.
+
+    :returns: True if saved, otherwise False.
+    """
+    s_path = sidecar_path(path)
+    t_path = '{0}.{1}.tmp'.format(s_path, os.getpid())
+    try:
+        with open(t_path, 'wb') as fo:
+            idx.dump(fo, stamp(path, packet_type))
+        os.rename(t_path, s_path)
+    except (IOError, OSError), ex:
+        logger.info('unable to save index "%s" - %s', s_path, ex)
+        if os.path.exists(t_path):
+            os.remove(t_path)
+        return False
+    return True
+
+
+MAGIC = 'MARMIDX'
+
+VERSION = 1
+
+BYTE_ORDER = '<' if sys.byteorder == 'little' else '>'
+
+JSON_TYPECODE = 'j'
+
+ORDER_PREFIX = 'order.'
+
+ORDER_TYPECODE = 'l'
+
+
+def read_struct(fo, fmt):
+    size = struct.calcsize(fmt)
+    b = fo.read(size)
+    if len(b) != size:
+        raise ValueError('Failed to read {0} bytes for "{1}" at {2}.'.format(size, fmt, fo.tell()))
+    return struct.unpack(fmt, b)
+
+
+def read_string(fo):
+    length, = read_struct(fo, '>H')
+    b = fo.read(length)
+    if len(b) != length:
+        raise ValueError('Failed to read {0} length string at {1}.'.format(length, fo.tell()))
+    return b
+
+
+def read_section(fo):
+    name = read_string(fo)
+    typecode, length = read_struct(fo, '>cQ')
+    buf = fo.read(length)
+    if len(buf) != length:
+        raise ValueError('Failed to read {0} length section at {1}.'.format(length, fo.tell()))
+    return name, typecode, buf
+
+
+def write_string(fo, buf):
+    fo.write(struct.pack('>H', len(buf)))
+    fo.write(buf)
+
+
+def write_section(fo, name, typecode, buf):
+    write_string(fo, name)
+    fo.write(struct.pack('>cQ', typecode, len(buf)))
+    fo.write(buf)
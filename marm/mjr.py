@@ -1,18 +1,50 @@
+import array
+import mmap
 import os
+import StringIO
 import struct
 
-from . import rtp
+from . import ext, index, rtp, vp8
 
 
 class MJRRTPPacketReader(rtp.RTPPacketReader):
     """
     Iterates and indexes `RTPPacket`s from an MJR formatted file.
+
+    If `sidecar=True` its `packet_index` is saved to and loaded from a
+    sidecar file (see `index.save_sidecar`) next to the MJR file, so opening
+    it never writes anything unless asked to. When not filtered and
+    `packet_type` supports it (see `scan_codec`) the index is built by
+    natively scanning the file rather than unpacking its packets.
+
+    If `mmap=True` the file is memory mapped and packets are unpacked from
+    `buffer`s referencing the mapping rather than from copies of it. Note
+    that packet data is then also a `buffer` referencing the mapping.
+
+    If `follow=True` the file is assumed to still be appended to (e.g. by a
+    live janus session) and so a stale sidecar index is extended rather than
+    rebuilt, see `update_index`.
+
+    If `recover=True` damaged records (e.g. from a crashed gateway) are
+    skipped by resyncing on the next plausible record (see `find_record`)
+    rather than ending the file there. Skipped byte ranges are recorded in
+    the `packet_index` as `meta['skipped']`. A sidecar index built in the
+    other mode is ignored, i.e. rebuilt.
     """
 
     def __init__(self, *args, **kwargs):
+        self.sidecar = kwargs.pop('sidecar', False)
+        mapped = kwargs.pop('mmap', False)
+        self.follow = kwargs.pop('follow', False)
+        self.recover = kwargs.pop('recover', False)
         super(MJRRTPPacketReader, self).__init__(*args, **kwargs)
         self.type = read_header(self.fo)
         self.org = self.fo.tell()
+        self.file = self.fo
+        if mapped:
+            self.fo = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.fo.seek(self.org)
+        self.is_mapped = mapped
 
     # rtp.RTPPacketReader
     
@@ -28,26 +60,347 @@ class MJRRTPPacketReader(rtp.RTPPacketReader):
                 raise
         if restore:
             self.fo.seek(org)
-    
+
+    def packet_index(self):
+        path = self.path if self.sidecar and not self.is_filtered else None
+        if path:
+            idx = index.load_sidecar(
+                path, self.packet_type,
+                prefix=self.follow, is_prefix=self._is_indexed_prefix,
+            )
+            if idx is not None and idx.meta.get('recover', False) != self.recover:
+                # NOTE: e.g. a strict index ends at the first damaged record
+                idx = None
+            if idx is not None:
+                if self.follow and self.update_index(idx):
+                    index.save_sidecar(path, idx, self.packet_type)
+                return idx
+        idx = index.PacketIndex()
+        idx.end = self.org
+        idx.meta['recover'] = self.recover
+        self.update_index(idx)
+        if path:
+            index.save_sidecar(path, idx, self.packet_type)
+        return idx
+
+    def save_index(self, idx):
+        path = self.path if self.sidecar and not self.is_filtered else None
+        # NOTE: only while it's not stale, see `index.load_sidecar`
+        if not path or idx.end != os.path.getsize(path):
+            return False
+        return index.save_sidecar(path, idx, self.packet_type)
+
+    def update_index(self, idx):
+        if self.is_mapped:
+            self._remap()
+        count = len(idx)
+        skipped = idx.meta.setdefault('skipped', []) if self.recover else None
+        with self.restoring():
+            if not self._scan(idx, skipped):
+                self.fo.seek(idx.end)
+                for pos, buf in self._records(skipped):
+                    pkt = self.filter_packet(buf, depadded=True)
+                    if pkt is not None:
+                        idx.add(pos + RECORD_HEADER_SIZE, len(buf), pkt)
+                    idx.end = pos + RECORD_HEADER_SIZE + len(buf)
+        return len(idx) - count
+
+    def read_packet(self, offset, size):
+        if self.is_mapped:
+            if offset + size > len(self.fo):
+                raise ValueError('Failed to read {0} length packet at {1}.'.format(size, offset))
+            buf = buffer(self.fo, offset, size)
+        else:
+            self.fo.seek(offset)
+            buf = self.fo.read(size)
+            if len(buf) != size:
+                raise ValueError('Failed to read {0} length packet at {1}.'.format(size, offset))
+        return self.packet_type(buf, depadded=True)
+
+    def read_packets(self, idx, row=0):
+        if self.is_mapped:
+            # NOTE: views of the mapping, so never seek
+            return super(MJRRTPPacketReader, self).read_packets(idx, row)
+        return (
+            self.packet_type(buf, depadded=True)
+            for buf in self._read_forward(idx, row)
+        )
+
     def __iter__(self):
 
         def pkts():
-            for buf in read_packets(self.fo):
+            for _, buf in self._records():
                 # NOTE: janus appears to de-pad rtp packets it records
-                pkt = self.packet_type(buf, depadded=True)
-                if not self.packet_filter(pkt):
+                pkt = self.filter_packet(buf, depadded=True)
+                if pkt is None:
                     continue
                 yield pkt
 
         self.fo.seek(self.org)
         return pkts()
 
+    # internals
+
+    def _is_indexed_prefix(self, idx):
+        # NOTE: last indexed record, or w/o any what follows them, is intact
+        with self.restoring():
+            try:
+                if not len(idx):
+                    self.fo.seek(idx.end)
+                    return MARKER.startswith(self.fo.read(len(MARKER)))
+                i = len(idx) - 1
+                self.fo.seek(idx.offset[i] - RECORD_HEADER_SIZE)
+                buf = read_packet(self.fo)
+                return (
+                    len(buf) == idx.size[i] and
+                    struct.unpack_from('>HI', buf, 2) == (idx.seq[i], idx.timestamp[i])
+                )
+            except (ValueError, struct.error):
+                return False
+
+    def _records(self, skipped=None):
+        read = view_packet if self.is_mapped else read_packet
+        pos = self.fo.tell()
+        if self.recover:
+            self.fo.seek(0, os.SEEK_END)
+            size = self.fo.tell()
+            self.fo.seek(pos)
+        while True:
+            if self.recover and not is_plausible_record(self.fo, pos, size):
+                end, r_pos = resync(self.fo, pos, size)
+                if end is not None:
+                    self.fo.seek(pos)
+                    yield pos, read(self.fo)
+                    pos = end
+                if r_pos is None:
+                    break
+                if skipped is not None and r_pos > pos:
+                    skipped.append([pos, r_pos])
+                pos = r_pos
+                continue
+            try:
+                if self.recover:
+                    self.fo.seek(pos)
+                buf = read(self.fo)
+            except ValueError, ex:
+                if not is_eof(ex):
+                    raise
+                break
+            yield pos, buf
+            pos += RECORD_HEADER_SIZE + len(buf)
+
+    def _scan(self, idx, skipped=None):
+        if self.header_filter is not None:
+            scanned = index.PacketIndex()
+            scanned.end = idx.end
+            if not self._scan_all(scanned, skipped):
+                return False
+            for row in xrange(len(scanned)):
+                if self.header_filter.match_row(scanned, row):
+                    idx.append(*scanned[row])
+            idx.end = scanned.end
+            return True
+        if self.is_filtered:
+            return False
+        return self._scan_all(idx, skipped)
+
+    def _scan_all(self, idx, skipped=None):
+        codec = scan_codec(self.packet_type)
+        if codec is None:
+            return False
+        if self.is_mapped:
+            mm = self.fo
+        else:
+            try:
+                fileno = self.fo.fileno()
+            except AttributeError:
+                return False
+            mm = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        try:
+            while True:
+                idx.end = ext.scan_mjr(mm, idx.end, codec, idx, self.recover)
+                if not self.recover:
+                    break
+                end, r_pos = resync(mm, idx.end, len(mm))
+                if end is not None:
+                    buf = buffer(mm, idx.end + RECORD_HEADER_SIZE, end - idx.end - RECORD_HEADER_SIZE)
+                    idx.add(idx.end + RECORD_HEADER_SIZE, len(buf), self.packet_type(buf, depadded=True))
+                    idx.end = end
+                if r_pos is None:
+                    break
+                if skipped is not None and r_pos > idx.end:
+                    skipped.append([idx.end, r_pos])
+                idx.end = r_pos
+        finally:
+            if mm is not self.fo:
+                mm.close()
+        return True
+
+    def _remap(self):
+        if self.fo.size() == len(self.fo):
+            return
+        # NOTE: not closed since packets may still reference old mapping
+        pos = self.fo.tell()
+        self.fo = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fo.seek(pos)
+
 
 rtp.RTPPacketReader.register('mjr', MJRRTPPacketReader)
 
 
+class MJRWriter(object):
+    """
+    Writes `rtp.RTPPacket`s, or their packed bytes, to an MJR file. Records
+    are batched and written `buffer_size` bytes at a time, and the sidecar
+    index (see `index.save_sidecar`) is built as batches are written and, if
+    `sidecar=True`, saved on `close`.
+
+    When written data is synced to disk is controlled by `sync`, one of:
+
+    - `SYNC_NONE` leave it to the os
+    - `SYNC_CLOSE` on `close`
+    - `SYNC_FLUSH` on every `flush`, i.e. whenever a batch is written
+
+    e.g.:
+
+    .. code:: python
+
+        with marm.mjr.MJRWriter('path/to/video.mjr', packet_type=marm.vp8.VP8RTPPacket) as w:
+            for pkt in pkts:
+                w.write(pkt)
+
+    """
+
+    SYNC_NONE = 'none'
+    SYNC_CLOSE = 'close'
+    SYNC_FLUSH = 'flush'
+
+    SYNCS = [
+        SYNC_NONE,
+        SYNC_CLOSE,
+        SYNC_FLUSH,
+    ]
+
+    def __init__(
+            self,
+            fo,
+            type_=None,
+            packet_type=rtp.RTPPacket,
+            buffer_size=1024 * 1024,
+            sidecar=False,
+            sync=SYNC_NONE):
+        if sync not in self.SYNCS:
+            raise ValueError('Invalid sync "{0}", expected one of {1}.'.format(
+                sync, ', '.join(self.SYNCS)
+            ))
+        if isinstance(fo, basestring):
+            fo, self.owned = open(fo, 'wb'), True
+        else:
+            self.owned = False
+        self.fo = fo
+        self.type = type_ if type_ is not None else packet_type.type
+        if self.type not in (AUDIO_TYPE, VIDEO_TYPE):
+            raise ValueError('Unsupported type "{0}".'.format(self.type))
+        self.packet_type = packet_type
+        self.buffer_size = buffer_size
+        self.sidecar = sidecar
+        self.sync = sync
+        self.idx = index.PacketIndex()
+        self.count = 0
+        self.batch = []
+        self.batch_size = 0
+        write_header(self.fo, self.type)
+        self.pos = len(MARKER) + 2 + len(self.type)
+        self.idx.end = self.pos
+
+    @property
+    def path(self):
+        name = getattr(self.fo, 'name', None)
+        if isinstance(name, basestring) and os.path.isfile(name):
+            return name
+
+    def write(self, pkt):
+        """
+        Writes an `rtp.RTPPacket` or its packed bytes.
+        """
+        buf = pkt.pack() if isinstance(pkt, rtp.RTPPacket) else pkt
+        if not isinstance(buf, str):
+            buf = str(buf)
+        if len(buf) > 0xffff:
+            raise ValueError('Packet length {0} > {1}.'.format(len(buf), 0xffff))
+        if len(buf) < RTP_HEADER_SIZE:
+            raise ValueError('Packet length {0} < {1}.'.format(len(buf), RTP_HEADER_SIZE))
+        self.batch.append(struct.pack('>{0}sH'.format(len(MARKER)), MARKER, len(buf)))
+        self.batch.append(buf)
+        self.batch_size += RECORD_HEADER_SIZE + len(buf)
+        self.count += 1
+        if self.batch_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes batched records.
+        """
+        if self.batch:
+            buf = ''.join(self.batch)
+            self.fo.write(buf)
+            self._index(buf)
+            self.pos += len(buf)
+            self.idx.end = self.pos
+            self.batch = []
+            self.batch_size = 0
+        self.fo.flush()
+        if self.sync == self.SYNC_FLUSH:
+            os.fsync(self.fo.fileno())
+
+    def close(self):
+        """
+        Writes batched records, syncs per `sync` and saves the sidecar index.
+        """
+        if self.fo is None:
+            return
+        self.flush()
+        if self.sync == self.SYNC_CLOSE:
+            os.fsync(self.fo.fileno())
+        path = self.path if self.sidecar else None
+        if self.owned:
+            self.fo.close()
+        self.fo = None
+        if path:
+            index.save_sidecar(path, self.idx, self.packet_type)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    # internals
+
+    def _index(self, buf):
+        batch = index.PacketIndex()
+        codec = scan_codec(self.packet_type)
+        if codec is not None:
+            ext.scan_mjr(buf, 0, codec, batch)
+        else:
+            pos = 0
+            for b in read_packets(StringIO.StringIO(buf)):
+                pkt = self.packet_type(b, depadded=True)
+                batch.add(pos + RECORD_HEADER_SIZE, len(b), pkt)
+                pos += RECORD_HEADER_SIZE + len(b)
+        batch.offset = array.array(
+            batch.offset.typecode, (offset + self.pos for offset in batch.offset)
+        )
+        self.idx.extend(batch)
+
+
 MARKER = 'MEETECHO'
 
+# Marker and length preceding each stored packet.
+RECORD_HEADER_SIZE = len(MARKER) + 2
+
+RTP_HEADER_SIZE = rtp.RTPHeader._size_
+
 AUDIO_TYPE = 'audio'
 
 VIDEO_TYPE = 'video'
@@ -102,6 +455,147 @@ def read_packets(fo):
         # eof
 
 
+def view_packet(mm):
+    """
+    Like `read_packet` but for an `mmap.mmap` and returns a `buffer`
+    referencing the packet in it rather than a copy.
+    """
+    pos = mm.tell()
+    b = mm[pos:pos + len(MARKER)]
+    if len(b) != len(MARKER):
+        raise ValueError('Failed to read {0} length string at {1}.'.format(len(MARKER), pos))
+    if b != MARKER:
+        raise ValueError('Invalid marker "{0}" != "{1}"'.format(b, MARKER))
+    if pos + RECORD_HEADER_SIZE > len(mm):
+        raise ValueError('Failed to read string length at {0}.'.format(pos + len(MARKER)))
+    length, = struct.unpack_from('>H', mm, pos + len(MARKER))
+    pos += RECORD_HEADER_SIZE
+    if pos + length > len(mm):
+        raise ValueError('Failed to read {0} length string at {1}.'.format(length, pos))
+    mm.seek(pos + length)
+    return buffer(mm, pos, length)
+
+
+def view_packets(mm):
+    try:
+        while True:
+            yield view_packet(mm)
+    except ValueError, ex:
+        if not is_eof(ex):
+            raise
+        # eof
+
+
+def scan_codec(packet_type):
+    """
+    Determines how `ext.scan_mjr` should scan packets of `packet_type`.
+
+    :returns: One of `ext.RTP_CODEC_*` or None if `packet_type` has a video
+              payload that cannot be natively scanned.
+    """
+    payload_type = packet_type.payload_type
+    if payload_type is None or not issubclass(payload_type, rtp.RTPVideoPayloadMixin):
+        return ext.RTP_CODEC_NONE
+    if issubclass(payload_type, vp8.VP8RTPPayload):
+        return ext.RTP_CODEC_VP8
+    return None
+
+
+def find_marker(fo, pos, chunk=64 * 1024):
+    """
+    Finds next `MARKER` at or after `pos` in `fo`, using `mmap.mmap.find` if
+    it's mapped and otherwise reading it in `chunk` byte blocks.
+
+    :returns: Position of the marker or None if there is none.
+    """
+    if isinstance(fo, mmap.mmap):
+        pos = fo.find(MARKER, pos)
+        return None if pos == -1 else pos
+    fo.seek(pos)
+    tail = ''
+    while True:
+        buf = fo.read(chunk)
+        if not buf:
+            return None
+        b = tail + buf
+        i = b.find(MARKER)
+        if i != -1:
+            return pos - len(tail) + i
+        tail = b[-(len(MARKER) - 1):]
+        pos += len(buf)
+
+
+def record_end(fo, pos, size):
+    """
+    Checks whether `fo` has a complete record at `pos`, i.e. a `MARKER`
+    followed by a length that fits in the `size` byte file and an rtp version
+    2 packet.
+
+    :returns: Position just past the record or None if there is none.
+    """
+    fo.seek(pos)
+    b = fo.read(RECORD_HEADER_SIZE + 1)
+    if len(b) != RECORD_HEADER_SIZE + 1 or b[:len(MARKER)] != MARKER:
+        return None
+    length, = struct.unpack_from('>H', b, len(MARKER))
+    end = pos + RECORD_HEADER_SIZE + length
+    if length < RTP_HEADER_SIZE or end > size:
+        return None
+    if ord(b[RECORD_HEADER_SIZE]) >> 6 != 2:
+        return None
+    return end
+
+
+def is_plausible_record(fo, pos, size):
+    """
+    Checks whether `fo` has what looks like a valid record at `pos`, i.e. a
+    complete one (see `record_end`) followed by another `MARKER` or the end of
+    the file.
+    """
+    end = record_end(fo, pos, size)
+    if end is None:
+        return False
+    fo.seek(end)
+    b = fo.read(len(MARKER))
+    return b == MARKER[:len(b)]
+
+
+def resync(fo, pos, size):
+    """
+    Decides how to carry on after an implausible (see `is_plausible_record`)
+    record at `pos`. The record itself is kept if it's complete and does not
+    overlap the next plausible one, in which case it's whatever follows it
+    that is damaged.
+
+    :returns: Tuple of the end of the record at `pos` if it should be kept
+              (otherwise None) and the position of the next plausible record
+              (None if there is none).
+    """
+    r_pos = find_record(fo, pos + 1)
+    end = record_end(fo, pos, size)
+    if end is not None and r_pos is not None and r_pos < end:
+        end = None
+    return end, r_pos
+
+
+def find_record(fo, pos):
+    """
+    Finds next plausible (see `is_plausible_record`) record at or after `pos`
+    in `fo`, e.g. to resync after a damaged one.
+
+    :returns: Position of the record or None if there is none.
+    """
+    fo.seek(0, os.SEEK_END)
+    size = fo.tell()
+    while True:
+        pos = find_marker(fo, pos)
+        if pos is None:
+            return None
+        if is_plausible_record(fo, pos, size):
+            return pos
+        pos += 1
+
+
 def skip_packet(fo):
     read_marker(fo)
     b = fo.read(2)
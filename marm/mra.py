@@ -0,0 +1,339 @@
+"""
+Block-compressed, seekable archive of stored `rtp.RTPPacket`s laid out as:
+
+- header, magic, version and stream type (e.g. "video")
+- blocks, each independently zlib compressed packets
+- trailer, block index (w/ extended, i.e. unwrapped, rtp timestamp bounds
+  of each block) and zlib compressed `index.PacketIndex` of all packets
+- footer, position of trailer and magic
+
+so that reading a packet only decompresses the block holding it.
+"""
+import bisect
+import collections
+import os
+import StringIO
+import struct
+import zlib
+
+from . import index, rtp
+
+
+class MRARTPPacketReader(rtp.RTPPacketReader):
+    """
+    Iterates and indexes `RTPPacket`s from an MRA formatted file.
+
+    Its `packet_index` is stored in the file and its offsets are packet
+    ordinals. The last decompressed block is cached so sequential reads only
+    decompress each block once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MRARTPPacketReader, self).__init__(*args, **kwargs)
+        self.type = read_header(self.fo)
+        self.org = self.fo.tell()
+        self.blocks, self.idx = read_trailer(self.fo)
+        self.ordinals = [block.ordinal for block in self.blocks]
+        # NOTE: running max (and min from the end) so they're sorted, as
+        # blocks of late or reordered packets overlap
+        self.max_timestamps = []
+        for block in self.blocks:
+            self.max_timestamps.append(max(
+                self.max_timestamps[-1] if self.max_timestamps else block.max_timestamp,
+                block.max_timestamp,
+            ))
+        self.min_timestamps = []
+        for block in reversed(self.blocks):
+            self.min_timestamps.append(min(
+                self.min_timestamps[-1] if self.min_timestamps else block.min_timestamp,
+                block.min_timestamp,
+            ))
+        self.min_timestamps.reverse()
+        self.cached = None
+        self.fo.seek(self.org)
+
+    def block_of(self, ordinal):
+        """
+        Finds block holding packet w/ `ordinal`.
+
+        :returns: Index of the block in `blocks`.
+        """
+        if not (0 <= ordinal < len(self.idx)):
+            raise IndexError(
+                'Packet ordinal {0} out of range [0,{1})'
+                .format(ordinal, len(self.idx))
+            )
+        return bisect.bisect_right(self.ordinals, ordinal) - 1
+
+    def blocks_at(self, timestamp):
+        """
+        Finds blocks that may hold packets w/ extended rtp `timestamp`, i.e.
+        as unwrapped by `rtp.unwrap_timestamps` w/o a `max_jump`.
+
+        :returns: List of indexes of blocks in `blocks`.
+        """
+        begin = bisect.bisect_left(self.max_timestamps, timestamp)
+        end = bisect.bisect_right(self.min_timestamps, timestamp)
+        return [
+            i for i in xrange(begin, end)
+            if self.blocks[i].min_timestamp <= timestamp <= self.blocks[i].max_timestamp
+        ]
+
+    # rtp.RTPPacketReader
+
+    def index(self, restore=True):
+        for ordinal in xrange(len(self.idx)):
+            yield ordinal
+
+    def packet_index(self):
+        if not self.is_filtered:
+            return self.idx
+        if self.header_filter is not None:
+            return self.idx.select(
+                ordinal for ordinal in xrange(len(self.idx))
+                if self.header_filter.match_row(self.idx, ordinal)
+            )
+        return self.idx.select(
+            ordinal for ordinal, pkt in enumerate(self._packets())
+            if self.packet_filter(pkt)
+        )
+
+    def update_index(self, idx):
+        # NOTE: archives are written once
+        return 0
+
+    def read_packet(self, offset, size):
+        block, data, offsets = self._block(self.block_of(offset))
+        if self.idx.size[offset] != size:
+            raise ValueError('Failed to read {0} length packet at {1}.'.format(size, offset))
+        pos = offsets[offset - block.ordinal]
+        return self.packet_type(data[pos:pos + size])
+
+    def __iter__(self):
+
+        def pkts():
+            if self.header_filter is not None:
+                # NOTE: blocks w/o matching packets are never decompressed
+                for ordinal in xrange(len(self.idx)):
+                    if self.header_filter.match_row(self.idx, ordinal):
+                        yield self.read_packet(ordinal, self.idx.size[ordinal])
+                return
+            for pkt in self._packets():
+                if not self.packet_filter(pkt):
+                    continue
+                yield pkt
+
+        self.fo.seek(self.org)
+        return pkts()
+
+    # internals
+
+    def _packets(self):
+        for i in xrange(len(self.blocks)):
+            block, data, offsets = self._block(i)
+            for ordinal in xrange(block.ordinal, block.ordinal + block.count):
+                pos = offsets[ordinal - block.ordinal]
+                yield self.packet_type(data[pos:pos + self.idx.size[ordinal]])
+
+    def _block(self, i):
+        if self.cached is None or self.cached[0] is not self.blocks[i]:
+            block = self.blocks[i]
+            self.fo.seek(block.offset)
+            buf = self.fo.read(block.size)
+            if len(buf) != block.size:
+                raise ValueError('Failed to read {0} length block at {1}.'.format(block.size, block.offset))
+            data = zlib.decompress(buf)
+            offsets, pos = [], 0
+            for ordinal in xrange(block.ordinal, block.ordinal + block.count):
+                offsets.append(pos)
+                pos += self.idx.size[ordinal]
+            if pos != len(data):
+                raise ValueError('Block {0} length {1} != {2}.'.format(i, len(data), pos))
+            self.cached = block, data, offsets
+        return self.cached
+
+
+rtp.RTPPacketReader.register('mra', MRARTPPacketReader)
+
+
+class MRAWriter(object):
+    """
+    Writes `rtp.RTPPacket`s, or their packed bytes, to an MRA file. Packets
+    are compressed in blocks of about `block_size` bytes at zlib compression
+    `level`. The archive is only readable once closed, e.g.:
+
+    .. code:: python
+
+        with marm.mra.MRAWriter('path/to/video.mra', packet_type=marm.vp8.VP8RTPPacket) as w:
+            for pkt in pkts:
+                w.write(pkt)
+
+    """
+
+    def __init__(
+            self,
+            fo,
+            type_=None,
+            packet_type=rtp.RTPPacket,
+            block_size=256 * 1024,
+            level=6):
+        if isinstance(fo, basestring):
+            fo, self.owned = open(fo, 'wb'), True
+        else:
+            self.owned = False
+        self.fo = fo
+        self.type = type_ if type_ is not None else packet_type.type
+        if self.type not in (AUDIO_TYPE, VIDEO_TYPE):
+            raise ValueError('Unsupported type "{0}".'.format(self.type))
+        self.packet_type = packet_type
+        self.block_size = block_size
+        self.level = level
+        self.idx = index.PacketIndex()
+        self.blocks = []
+        self.batch = []
+        self.batch_size = 0
+        self.batch_timestamps = None
+        self.timestamp = None
+        self.count = 0
+        write_header(self.fo, self.type)
+        self.pos = len(MAGIC) + 1 + 2 + len(self.type)
+
+    def write(self, pkt):
+        """
+        Writes an `rtp.RTPPacket` or its packed bytes.
+        """
+        if isinstance(pkt, rtp.RTPPacket):
+            buf = pkt.pack()
+        else:
+            buf = str(pkt)
+            pkt = self.packet_type(buf)
+        self.idx.add(self.count, len(buf), pkt)
+        timestamp = pkt.header.timestamp
+        if self.timestamp is not None:
+            # NOTE: extended like `rtp.unwrap_timestamps`
+            timestamp = self.timestamp + (
+                ((timestamp - self.timestamp + 0x80000000) & 0xffffffff) -
+                0x80000000
+            )
+        self.timestamp = timestamp
+        if self.batch_timestamps is None:
+            self.batch_timestamps = [timestamp, timestamp]
+        else:
+            self.batch_timestamps[0] = min(self.batch_timestamps[0], timestamp)
+            self.batch_timestamps[1] = max(self.batch_timestamps[1], timestamp)
+        self.batch.append(buf)
+        self.batch_size += len(buf)
+        self.count += 1
+        if self.batch_size >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Compresses and writes batched packets as a block.
+        """
+        if not self.batch:
+            return
+        buf = zlib.compress(''.join(self.batch), self.level)
+        min_timestamp, max_timestamp = self.batch_timestamps
+        self.blocks.append(Block(
+            offset=self.pos,
+            size=len(buf),
+            ordinal=self.count - len(self.batch),
+            count=len(self.batch),
+            min_timestamp=min_timestamp,
+            max_timestamp=max_timestamp,
+        ))
+        self.fo.write(buf)
+        self.pos += len(buf)
+        self.batch = []
+        self.batch_size = 0
+        self.batch_timestamps = None
+
+    def close(self):
+        """
+        Writes batched packets, trailer and footer.
+        """
+        if self.fo is None:
+            return
+        self.flush()
+        self.idx.end = self.count
+        write_trailer(self.fo, self.pos, self.blocks, self.idx, self.packet_type)
+        if self.owned:
+            self.fo.close()
+        else:
+            self.fo.flush()
+        self.fo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+MAGIC = 'MARMRA'
+
+VERSION = 2
+
+AUDIO_TYPE = 'audio'
+
+VIDEO_TYPE = 'video'
+
+# Location of a compressed block of packets.
+Block = collections.namedtuple('Block', [
+    'offset',
+    'size',
+    'ordinal',
+    'count',
+    'min_timestamp',
+    'max_timestamp',
+])
+
+BLOCK_FORMAT = '>QIQIqq'
+
+FOOTER_FORMAT = '>Q{0}s'.format(len(MAGIC))
+
+
+def read_header(fo):
+    magic, version = index.read_struct(fo, '>{0}sB'.format(len(MAGIC)))
+    if magic != MAGIC:
+        raise ValueError('Invalid magic "{0}" != "{1}".'.format(magic, MAGIC))
+    if version != VERSION:
+        raise ValueError('Unsupported version {0} != {1}.'.format(version, VERSION))
+    type_ = index.read_string(fo)
+    if type_ not in (AUDIO_TYPE, VIDEO_TYPE):
+        raise ValueError('Unsupported type "{0}".'.format(type_))
+    return type_
+
+
+def write_header(fo, type_):
+    fo.write(struct.pack('>{0}sB'.format(len(MAGIC)), MAGIC, VERSION))
+    index.write_string(fo, type_)
+
+
+def read_trailer(fo):
+    fo.seek(-struct.calcsize(FOOTER_FORMAT), os.SEEK_END)
+    pos, magic = index.read_struct(fo, FOOTER_FORMAT)
+    if magic != MAGIC:
+        raise ValueError('Invalid footer magic "{0}" != "{1}".'.format(magic, MAGIC))
+    fo.seek(pos)
+    nb_block, = index.read_struct(fo, '>I')
+    blocks = [
+        Block(*index.read_struct(fo, BLOCK_FORMAT))
+        for _ in xrange(nb_block)
+    ]
+    buf = zlib.decompress(index.read_section(fo)[2])
+    _, idx = index.PacketIndex.load(StringIO.StringIO(buf))
+    return blocks, idx
+
+
+def write_trailer(fo, pos, blocks, idx, packet_type):
+    fo.write(struct.pack('>I', len(blocks)))
+    for block in blocks:
+        fo.write(struct.pack(BLOCK_FORMAT, *block))
+    buf = StringIO.StringIO()
+    idx.dump(buf, index.Stamp(
+        size=pos, mtime=0, packet_type=index.packet_type_name(packet_type),
+    ))
+    index.write_section(fo, 'index', 'z', zlib.compress(buf.getvalue(), 9))
+    fo.write(struct.pack(FOOTER_FORMAT, pos, MAGIC))
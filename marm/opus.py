@@ -8,6 +8,8 @@ clock_rate = 48000
 
 class OpusRTPPayload(rtp.RTPAudioPayloadMixin, rtp.RTPPayload):
 
+    __slots__ = ('data',)
+
     def __init__(self, *args, **kwargs):
         if args:
             if kwargs:
@@ -84,15 +86,28 @@ class OpusRTPPayload(rtp.RTPAudioPayloadMixin, rtp.RTPPayload):
         if value:
             return fo.getvalue()
 
+    @property
+    def size(self):
+        return len(self.data)
+
     def unpack(self, buf):
         self.data = buf
 
+    def __getstate__(self):
+        # NOTE: buffers (e.g. of an mmap) aren't pickle-able so are copied
+        return str(self.data) if isinstance(self.data, buffer) else self.data,
+
+    def __setstate__(self, state):
+        self.data, = state
+
 
 class OpusRTPPacket(rtp.RTPTimeMixin, rtp.RTPPacket):
     """
     https://tools.ietf.org/html/draft-ietf-payload-rtp-opus-11
     """
 
+    __slots__ = ()
+
     # RTPPacket
 
     type = rtp.RTPPacket.AUDIO_TYPE
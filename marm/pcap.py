@@ -1,50 +1,688 @@
 """
+Reads `rtp.RTPPacket`s from PCAP (i.e. libpcap, *not* pcapng) formatted
+captures.
+
+Captured frames are decoded by fixed offsets, so frames that do not carry rtp
+over udp are skipped w/o building any per-frame objects. Supported link types
+are:
+
+- Ethernet, including 802.1Q/802.1ad VLAN tags
+- Linux cooked (SLL)
+- raw IPv4/IPv6
 """
-import dpkt
+import array
+import collections
+import logging
+import math
+import socket
+import struct
 
-from . import rtp
+from . import index, rtp
 
 
-def is_rtp_packet(pkt):
-    if (not isinstance(pkt.data, dpkt.ip.IP) or
-        not isinstance(pkt.data.data, dpkt.udp.UDP)):
-        return False
-    rtp = dpkt.rtp.RTP(pkt.data.data.data)
-    return rtp.version == 2 and (rtp.pt < 64 or 96 <= rtp.pt)
+logger = logging.getLogger(__name__)
 
 
 class PCapRTPPacketReader(rtp.RTPPacketReader):
     """
     Iterates and indexes `RTPPacket`s from a PCAP formatted file.
+
+    Its `packet_index` offsets are those of rtp packets within captured
+    frames, so `read_packet` is a single seek and read.
     """
-    
+
     def __init__(self, *args, **kwargs):
         super(PCapRTPPacketReader, self).__init__(*args, **kwargs)
-        self.org = self.fo.tell() + dpkt.pcap.FileHdr.__hdr_len__
-        self.i = iter(dpkt.pcap.Reader(self.fo))
-        try:
-            self.i.next()
-        except StopIteration:
-            pass
+        self.header = read_file_header(self.fo)
+        if self.header.linktype not in LINK_HEADERS:
+            raise ValueError('Unsupported linktype {0}.'.format(self.header.linktype))
+        self.record_header = struct.Struct(self.header.byte_order + 'IIII')
+        self.org = self.fo.tell()
         self.reset()
 
+    def demux(self, writer, payload_types=None, packet_types=None, probe_secs=1.0):
+        """
+        Demultiplexes all rtp flows (see `Flow`) in a single pass over the
+        capture.
+
+        :param writer: Callable taking a `Flow` and its `rtp.RTPPacket` type
+            and returning a writer (e.g. `mjr.MJRWriter`) for it, or None to
+            drop the flow. Writers only need `write`, called w/ packed
+            packets, and `close`, called once the capture is exhausted.
+        :param payload_types: Optional dict mapping rtp payload types to
+            `rtp.RTPPacket` types.
+        :param packet_types: Candidate `rtp.RTPPacket` types for flows whose
+            payload type is not in `payload_types`. The one w/ `clock_rate`
+            closest to that of the flow is used, which is estimated from the
+            first `probe_secs` of it. Flows whose type cannot be resolved are
+            dropped.
+
+        :returns: Dict mapping each written `Flow` to its `rtp.RTPPacket`
+            type and packet count.
+        """
+        payload_types = payload_types or {}
+        packet_types = [
+            packet_type for packet_type in (packet_types or [])
+            if getattr(packet_type, 'clock_rate', None)
+        ]
+        flows = {}
+        counts = collections.Counter()
+        pending = collections.defaultdict(list)
+        dropped = set()
+
+        def resolve(flow, probed):
+            packet_type = payload_types.get(flow.type)
+            if packet_type is None:
+                packet_type = infer_packet_type(
+                    (probed[0][0], rtp_timestamp(probed[0][1])),
+                    (probed[-1][0], rtp_timestamp(probed[-1][1])),
+                    packet_types,
+                )
+            w = None
+            if packet_type is not None:
+                w = writer(flow, packet_type)
+            if w is None:
+                logger.info('dropping flow %s', flow)
+                dropped.add(flow)
+                return
+            flows[flow] = w, packet_type
+            for _, buf in probed:
+                write(flow, w, packet_type, buf)
+
+        def write(flow, w, packet_type, buf):
+            if self.header_filter is not None:
+                if not self.header_filter.match(buf):
+                    return
+            elif self.is_filtered and not self.packet_filter(packet_type(buf)):
+                return
+            w.write(buf)
+            counts[flow] += 1
+
+        try:
+            with self.restoring():
+                self.fo.seek(self.org)
+                linktype = self.header.linktype
+                for _, secs, buf in self._records():
+                    offset = ip_offset(linktype, buf)
+                    if offset is None:
+                        continue
+                    span = udp_payload(buf, offset)
+                    if span is None or not is_rtp(buf, *span):
+                        continue
+                    flow = rtp_flow(buf, offset, span[0])
+                    buf = buf[span[0]:span[1]]
+                    if flow in flows:
+                        w, packet_type = flows[flow]
+                        write(flow, w, packet_type, buf)
+                        continue
+                    if flow in dropped:
+                        continue
+                    probed = pending[flow]
+                    probed.append((secs, buf))
+                    if flow.type in payload_types or secs - probed[0][0] >= probe_secs:
+                        resolve(flow, pending.pop(flow))
+            for flow, probed in pending.items():
+                resolve(flow, probed)
+        finally:
+            for w, _ in flows.values():
+                w.close()
+        return dict(
+            (flow, (packet_type, counts[flow]))
+            for flow, (_, packet_type) in flows.iteritems()
+        )
+
+    def arrivals(self):
+        """
+        Iterates (capture time in seconds, `rtp.RTPPacket`) tuples, e.g. for
+        `rtp.stream_stats` to compute jitter.
+        """
+
+        def pkts():
+            for _, secs, buf, (begin, end) in self._rtp_records():
+                pkt = self.filter_packet(buf[begin:end])
+                if pkt is None:
+                    continue
+                yield secs, pkt
+
+        self.fo.seek(self.org)
+        return pkts()
+
     # rtp.RTPPacketReader
 
+    def index(self, restore=True):
+        org = self.fo.tell()
+        for pos, _, buf, (begin, end) in self._rtp_records():
+            if self.header_filter is None and self.is_filtered:
+                if not self.packet_filter(self.packet_type(buf[begin:end])):
+                    continue
+            yield pos + begin
+        if restore:
+            self.fo.seek(org)
+
+    def packet_index(self):
+        idx = index.PacketIndex()
+        idx.end = self.org
+        self.update_index(idx)
+        return idx
+
+    def update_index(self, idx):
+        count = len(idx)
+        with self.restoring():
+            self.fo.seek(idx.end)
+            for pos, _, buf in self._records():
+                span = rtp_payload(self.header.linktype, buf)
+                if span is not None and (
+                        self.header_filter is None or
+                        self.header_filter.match(buf, span[0])):
+                    pkt = self.filter_packet(buf[span[0]:span[1]])
+                    if pkt is not None:
+                        idx.add(pos + span[0], span[1] - span[0], pkt)
+                idx.end = pos + len(buf)
+        return len(idx) - count
+
+    def read_packet(self, offset, size, packet_type=None):
+        self.fo.seek(offset)
+        buf = self.fo.read(size)
+        if len(buf) != size:
+            raise ValueError('Failed to read {0} length packet at {1}.'.format(size, offset))
+        return (packet_type or self.packet_type)(buf)
+
+    def read_packets(self, idx, row=0):
+        return (self.packet_type(buf) for buf in self._read_forward(idx, row))
+
     def __iter__(self):
 
         def pkts():
-            while True:
-                _, buf = self.i.next()
-                eth = dpkt.ethernet.Ethernet(buf)
-                if not is_rtp_packet(eth):
-                    continue
-                pkt = self.packet_type(eth.data.data.data)
-                if not self.packet_filter(pkt):
+            for _, _, buf, (begin, end) in self._rtp_records():
+                pkt = self.filter_packet(buf[begin:end])
+                if pkt is None:
                     continue
                 yield pkt
 
         self.fo.seek(self.org)
         return pkts()
 
+    # internals
+
+    def _records(self):
+        read, unpack = self.fo.read, self.record_header.unpack
+        scale = 1e-9 if self.header.nanoseconds else 1e-6
+        pos = self.fo.tell()
+        while True:
+            buf = read(RECORD_HEADER_SIZE)
+            if len(buf) != RECORD_HEADER_SIZE:
+                break
+            secs, frac, incl_len, _ = unpack(buf)
+            buf = read(incl_len)
+            if len(buf) != incl_len:
+                break
+            pos += RECORD_HEADER_SIZE
+            yield pos, secs + frac * scale, buf
+            pos += incl_len
+
+    def _rtp_records(self):
+        linktype = self.header.linktype
+        for pos, secs, buf in self._records():
+            span = rtp_payload(linktype, buf)
+            if span is None:
+                continue
+            if self.header_filter is not None:
+                if not self.header_filter.match(buf, span[0]):
+                    continue
+            yield pos, secs, buf, span
+
 
 rtp.RTPPacketReader.register('pcap', PCapRTPPacketReader)
+
+
+class PCapSession(object):
+    """
+    Indexes all rtp flows (see `Flow`) in a capture once and hands out
+    `PCapFlowReader` views of them, e.g.:
+
+    .. code:: python
+
+        with marm.pcap.PCapSession('path/to/call.pcap') as session:
+            flow, = session.find(ssrc=3830765780, type=100)
+            cur = marm.rtp.RTPCursor(
+                [flow], session.reader, packet_type=marm.vp8.VP8RTPPacket,
+            )
+
+    All views share the capture's file object, so use a session per thread.
+    """
+
+    def __init__(self, fo):
+        if isinstance(fo, basestring):
+            fo, self.owned = open(fo, 'rb'), True
+        else:
+            self.owned = False
+        self.pkts = PCapRTPPacketReader(fo)
+        self.fo = self.pkts.fo
+        self.idx = index.PacketIndex()
+        self.idx.end = self.pkts.org
+        self.flows = []
+        self.rows = {}
+        self.spans = {}
+        self.idxs = {}
+        self.update()
+
+    def update(self):
+        """
+        Indexes packets captured since the session was last indexed.
+
+        :returns: Number of packets added to `idx`.
+        """
+        count = len(self.idx)
+        linktype = self.pkts.header.linktype
+        with self.pkts.restoring():
+            self.fo.seek(self.idx.end)
+            for pos, secs, buf in self.pkts._records():
+                self.idx.end = pos + len(buf)
+                offset = ip_offset(linktype, buf)
+                if offset is None:
+                    continue
+                span = udp_payload(buf, offset)
+                if span is None or not is_rtp(buf, *span):
+                    continue
+                begin, end = span
+                flow = rtp_flow(buf, offset, begin)
+                if flow not in self.rows:
+                    self.flows.append(flow)
+                    self.rows[flow] = array.array('l')
+                    self.spans[flow] = [None, None]
+                b = ord(buf[begin + 1])
+                seq, ts = struct.unpack_from('>HI', buf, begin + 2)
+                self.rows[flow].append(len(self.idx))
+                self.idx.append(
+                    pos + begin, end - begin, seq, ts, flow.ssrc, flow.type,
+                    index.FLAG_MARKER if b & 0x80 else 0,
+                )
+                flow_span = self.spans[flow]
+                if flow_span[0] is None:
+                    flow_span[0] = (secs, ts)
+                flow_span[1] = (secs, ts)
+        if len(self.idx) != count:
+            self.idxs.clear()
+        return len(self.idx) - count
+
+    def find(self, **fields):
+        """
+        Finds flows whose `Flow` fields match these, e.g. `find(ssrc=1234)`.
+        """
+        return [
+            flow for flow in self.flows
+            if all(getattr(flow, k) == v for k, v in fields.iteritems())
+        ]
+
+    def infer_packet_type(self, flow, packet_types):
+        """
+        Infers `rtp.RTPPacket` type of `flow` from its clock rate, see
+        `infer_packet_type`.
+        """
+        return infer_packet_type(
+            self.spans[flow][0], self.spans[flow][1], [
+                packet_type for packet_type in packet_types
+                if getattr(packet_type, 'clock_rate', None)
+            ]
+        )
+
+    def reader(self, flow, **kwargs):
+        """
+        Creates a `PCapFlowReader` view of `flow` w/ `packet_type=` and
+        `packet_filter=` from `kwargs`.
+        """
+        if flow not in self.rows:
+            raise ValueError('No flow {0}.'.format(flow))
+        return PCapFlowReader(self, flow, **kwargs)
+
+    def close(self):
+        if self.owned:
+            self.fo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class PCapFlowReader(rtp.RTPPacketReader):
+    """
+    Iterates and indexes `RTPPacket`s of a single flow in a `PCapSession`
+    w/o re-scanning the capture.
+    """
+
+    def __init__(self, session, flow, **kwargs):
+        super(PCapFlowReader, self).__init__(session.fo, **kwargs)
+        self.session = session
+        self.flow = flow
+        self.name = session.pkts.name
+        self.org = session.pkts.org
+
+    # rtp.RTPPacketReader
+
+    def index(self, restore=True):
+        s_idx = self.session.idx
+        for row in self._rows():
+            if self.header_filter is not None:
+                if not self.header_filter.match_row(s_idx, row):
+                    continue
+            elif self.is_filtered:
+                pkt = self.read_packet(s_idx.offset[row], s_idx.size[row])
+                if not self.packet_filter(pkt):
+                    continue
+            yield s_idx.offset[row]
+
+    def packet_index(self):
+        key = self.flow, self.packet_type
+        if not self.is_filtered and key in self.session.idxs:
+            return self.session.idxs[key]
+        idx = index.PacketIndex()
+        idx.end = self.org
+        self.update_index(idx)
+        if not self.is_filtered:
+            self.session.idxs[key] = idx
+        return idx
+
+    def update_index(self, idx):
+        count = len(idx)
+        s_idx = self.session.idx
+        if idx.end >= s_idx.end:
+            self.session.update()
+        rows = self.session.rows[self.flow]
+        i = len(rows)
+        while i and s_idx.offset[rows[i - 1]] >= idx.end:
+            i -= 1
+        # NOTE: only need packets if filtered by a predicate or flags depend
+        # on payload
+        framed = getattr(self.packet_type.payload_type, 'is_start_of_frame', None) is not None
+        for row in rows[i:]:
+            if self.header_filter is not None:
+                if not self.header_filter.match_row(s_idx, row):
+                    continue
+            elif self.is_filtered:
+                pkt = self.read_packet(s_idx.offset[row], s_idx.size[row])
+                if not self.packet_filter(pkt):
+                    continue
+            if not framed:
+                idx.append(*s_idx[row])
+                continue
+            offset, size = s_idx.offset[row], s_idx.size[row]
+            idx.add(offset, size, self.read_packet(offset, size))
+        idx.end = s_idx.end
+        return len(idx) - count
+
+    def read_packet(self, offset, size):
+        return self.session.pkts.read_packet(offset, size, self.packet_type)
+
+    def __iter__(self):
+
+        def pkts():
+            s_idx = self.session.idx
+            for row in self._rows():
+                if self.header_filter is not None:
+                    if not self.header_filter.match_row(s_idx, row):
+                        continue
+                    yield self.read_packet(s_idx.offset[row], s_idx.size[row])
+                    continue
+                pkt = self.read_packet(s_idx.offset[row], s_idx.size[row])
+                if not self.packet_filter(pkt):
+                    continue
+                yield pkt
+
+        return pkts()
+
+    # internals
+
+    def _rows(self):
+        rows = self.session.rows[self.flow]
+        return (rows[i] for i in xrange(len(rows)))
+
+
+# Identifies an rtp flow in a capture by its source and destination (i.e.
+# address, port tuples), rtp ssrc and payload type.
+Flow = collections.namedtuple('Flow', ['src', 'dst', 'ssrc', 'type'])
+
+MAGIC = 0xa1b2c3d4
+
+NS_MAGIC = 0xa1b23c4d
+
+FILE_HEADER_SIZE = 24
+
+RECORD_HEADER_SIZE = 16
+
+# Global header of a capture.
+FileHeader = collections.namedtuple('FileHeader', [
+    'byte_order',
+    'version_major',
+    'version_minor',
+    'snaplen',
+    'linktype',
+    'nanoseconds',
+])
+
+LINKTYPE_ETHERNET = 1
+
+LINKTYPE_RAW = 101
+
+LINKTYPE_LINUX_SLL = 113
+
+LINKTYPE_IPV4 = 228
+
+LINKTYPE_IPV6 = 229
+
+# Link type to its (header size, offset of its ethertype) or None if it has
+# no link header.
+LINK_HEADERS = {
+    LINKTYPE_ETHERNET: (14, 12),
+    LINKTYPE_LINUX_SLL: (16, 14),
+    LINKTYPE_RAW: None,
+    12: None,  # DLT_RAW on some platforms
+    14: None,  # DLT_RAW on others
+    LINKTYPE_IPV4: None,
+    LINKTYPE_IPV6: None,
+}
+
+ETHERTYPE_IP = 0x0800
+
+ETHERTYPE_IP6 = 0x86dd
+
+ETHERTYPE_VLANS = (0x8100, 0x88a8, 0x9100)
+
+IP_PROTO_UDP = 17
+
+IP6_EXTENSION_HEADERS = (0, 43, 60)
+
+UDP_HEADER_SIZE = 8
+
+RTP_HEADER_SIZE = 12
+
+U16 = struct.Struct('>H')
+
+
+def read_file_header(fo):
+    """
+    Reads global header of a capture from `fo`.
+
+    :returns: The `FileHeader`.
+    """
+    buf = fo.read(FILE_HEADER_SIZE)
+    if len(buf) != FILE_HEADER_SIZE:
+        raise ValueError('Failed to read {0} byte header.'.format(FILE_HEADER_SIZE))
+    for byte_order in ('<', '>'):
+        magic, = struct.unpack_from(byte_order + 'I', buf)
+        if magic in (MAGIC, NS_MAGIC):
+            break
+    else:
+        raise ValueError('Invalid magic 0x{0}.'.format(buf[:4].encode('hex')))
+    major, minor, _, _, snaplen, linktype = struct.unpack_from(byte_order + 'HHiIII', buf, 4)
+    return FileHeader(
+        byte_order=byte_order,
+        version_major=major,
+        version_minor=minor,
+        snaplen=snaplen,
+        linktype=linktype & 0x0fffffff,
+        nanoseconds=magic == NS_MAGIC,
+    )
+
+
+def ip_offset(linktype, buf):
+    """
+    Finds IPv4/IPv6 header in a captured frame.
+
+    :returns: Offset of the header in `buf` or None if it has none.
+    """
+    link = LINK_HEADERS.get(linktype)
+    if link is None:
+        return 0 if linktype in LINK_HEADERS else None
+    offset, type_offset = link
+    if len(buf) < offset:
+        return None
+    ethertype, = U16.unpack_from(buf, type_offset)
+    while ethertype in ETHERTYPE_VLANS:
+        if len(buf) < offset + 4:
+            return None
+        ethertype, = U16.unpack_from(buf, offset + 2)
+        offset += 4
+    if ethertype not in (ETHERTYPE_IP, ETHERTYPE_IP6):
+        return None
+    return offset
+
+
+def udp_payload(buf, offset):
+    """
+    Finds UDP payload of an unfragmented IPv4/IPv6 packet at `offset`.
+
+    :returns: Tuple of begin and end offsets of the payload in `buf` or None
+        if it has none.
+    """
+    if len(buf) < offset + 1:
+        return None
+    b = ord(buf[offset])
+    version = b >> 4
+    if version == 4:
+        size = (b & 0x0f) * 4
+        if size < 20 or len(buf) < offset + size + UDP_HEADER_SIZE:
+            return None
+        if ord(buf[offset + 9]) != IP_PROTO_UDP:
+            return None
+        length, = U16.unpack_from(buf, offset + 2)
+        flags, = U16.unpack_from(buf, offset + 6)
+        if flags & 0x3fff:
+            return None
+        # NOTE: 0 w/ tcp segmentation offload
+        end = offset + length if length else len(buf)
+        offset += size
+    elif version == 6:
+        if len(buf) < offset + 40:
+            return None
+        length, = U16.unpack_from(buf, offset + 4)
+        proto = ord(buf[offset + 6])
+        end = offset + 40 + length if length else len(buf)
+        offset += 40
+        while proto in IP6_EXTENSION_HEADERS:
+            if len(buf) < offset + 2:
+                return None
+            proto = ord(buf[offset])
+            offset += (ord(buf[offset + 1]) + 1) * 8
+        if proto != IP_PROTO_UDP or len(buf) < offset + UDP_HEADER_SIZE:
+            return None
+    else:
+        return None
+    # NOTE: udp length is not trusted, some captures (e.g. of rewritten
+    # packets) leave it stale
+    return offset + UDP_HEADER_SIZE, min(end, len(buf))
+
+
+def is_rtp(buf, begin=0, end=None):
+    """
+    Checks if `buf[begin:end]` looks like an rtp (rather than e.g. rtcp)
+    packet.
+    """
+    if end is None:
+        end = len(buf)
+    if end - begin < RTP_HEADER_SIZE:
+        return False
+    if ord(buf[begin]) >> 6 != 2:
+        return False
+    pt = ord(buf[begin + 1]) & 0x7f
+    return pt < 64 or 96 <= pt
+
+
+def rtp_payload(linktype, buf):
+    """
+    Finds rtp packet carried by a captured frame.
+
+    :returns: Tuple of begin and end offsets of the rtp packet in `buf` or
+        None if it has none.
+    """
+    offset = ip_offset(linktype, buf)
+    if offset is None:
+        return None
+    span = udp_payload(buf, offset)
+    if span is None or not is_rtp(buf, *span):
+        return None
+    return span
+
+
+def is_rtp_packet(pkt, linktype=LINKTYPE_ETHERNET):
+    """
+    Checks if a captured frame, either its bytes or a decoded (e.g. `dpkt`)
+    packet, carries an rtp packet. See `rtp_payload`.
+    """
+    if not isinstance(pkt, (basestring, buffer)):
+        pkt = str(pkt)
+    return rtp_payload(linktype, pkt) is not None
+
+
+def rtp_flow(buf, offset, begin):
+    """
+    Identifies flow of rtp packet at `begin` carried by the IPv4/IPv6 packet
+    at `offset` in `buf` (see `udp_payload`).
+
+    :returns: The `Flow`.
+    """
+    if ord(buf[offset]) >> 4 == 4:
+        src = socket.inet_ntoa(buf[offset + 12:offset + 16])
+        dst = socket.inet_ntoa(buf[offset + 16:offset + 20])
+    else:
+        src = socket.inet_ntop(socket.AF_INET6, buf[offset + 8:offset + 24])
+        dst = socket.inet_ntop(socket.AF_INET6, buf[offset + 24:offset + 40])
+    src_port, dst_port = struct.unpack_from('>HH', buf, begin - UDP_HEADER_SIZE)
+    ssrc, = struct.unpack_from('>I', buf, begin + 8)
+    return Flow(
+        src=(src, src_port),
+        dst=(dst, dst_port),
+        ssrc=ssrc,
+        type=ord(buf[begin + 1]) & 0x7f,
+    )
+
+
+def rtp_timestamp(buf, begin=0):
+    ts, = struct.unpack_from('>I', buf, begin + 4)
+    return ts
+
+
+def infer_packet_type(begin, end, packet_types):
+    """
+    Infers `rtp.RTPPacket` type of a flow from its clock rate.
+
+    :param begin: Capture time, rtp timestamp tuple of an early packet in the
+        flow.
+    :param end: Capture time, rtp timestamp tuple of a later packet in the
+        flow.
+    :param packet_types: Candidate `rtp.RTPPacket` types w/ a `clock_rate`.
+
+    :returns: Candidate w/ `clock_rate` closest to the estimated one or None
+        if it cannot be estimated.
+    """
+    (b_secs, b_ts), (e_secs, e_ts) = begin, end
+    if not packet_types or e_secs <= b_secs:
+        return None
+    rate = ((e_ts - b_ts) & 0xffffffff) / (e_secs - b_secs)
+    if rate <= 0:
+        return None
+    return min(
+        packet_types,
+        key=lambda packet_type: abs(math.log(rate / packet_type.clock_rate))
+    )
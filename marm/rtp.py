@@ -1,42 +1,147 @@
 from __future__ import division
 
 import abc
+import array
+import bisect
 import collections
 import contextlib
 import copy
-import ctypes
 import datetime
+import heapq
 import inspect
 import itertools
+import json
 import logging
 import os
 import StringIO
 import struct
+import time
 
-from . import ext, VideoFrame
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import ext, index, VideoFrame
 
 
 logger = logging.getLogger(__name__)
 
 
-class RTPHeader(ctypes.BigEndianStructure):
+class BitFields(object):
+    """
+    Compact fixed size record of integer (bit-)fields unpacked from bytes,
+    e.g. a protocol header. Fields are plain `__slots__` decoded once rather
+    than `ctypes` bit-field descriptors decoded on every access.
+
+    Sub-classes list their fields in `__slots__`, their size in bytes as
+    `_size_` and implement `_unpack` and `pack`.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    __slots__ = ()
+
+    _size_ = 0
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(self.__slots__):
+            raise TypeError('Too many initializers')
+        for name in self.__slots__:
+            setattr(self, name, 0)
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.iteritems():
+            if name not in self.__slots__:
+                raise TypeError('Unexpected keyword argument \'{0}\''.format(name))
+            setattr(self, name, value)
+
+    @classmethod
+    def from_buffer_copy(cls, buf, offset=0):
+        if len(buf) - offset < cls._size_:
+            raise ValueError('Buffer size too small ({0} instead of at least {1} bytes)'.format(
+                len(buf) - offset, cls._size_
+            ))
+        obj = cls.__new__(cls)
+        obj._unpack(buf, offset)
+        return obj
+
+    @abc.abstractmethod
+    def _unpack(self, buf, offset):
+        pass
+
+    @abc.abstractmethod
+    def pack(self):
+        pass
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(
+            '{0}={1}'.format(name, getattr(self, name)) for name in self.__slots__
+        ))
+
+
+class RTPHeader(BitFields):
     """
     See https://tools.ietf.org/html/rfc3550#section-5.1
     """
 
-    _pack_ = 1
-
-    _fields_ = [
-        ('version', ctypes.c_uint16, 2),
-        ('padding', ctypes.c_uint16, 1),
-        ('extension', ctypes.c_uint16, 1),
-        ('csrccount', ctypes.c_uint16, 4),
-        ('markerbit', ctypes.c_uint16, 1),
-        ('type', ctypes.c_uint16, 7),
-        ('seq_number', ctypes.c_uint16),
-        ('timestamp', ctypes.c_uint32),
-        ('ssrc', ctypes.c_uint32),
-    ]
+    __slots__ = (
+        'version',
+        'padding',
+        'extension',
+        'csrccount',
+        'markerbit',
+        'type',
+        'seq_number',
+        'timestamp',
+        'ssrc',
+    )
+
+    _size_ = 12
+
+    _struct = struct.Struct('>BBHII')
+
+    # NOTE: precomputed bit-fields for each value of the first two bytes
+    _b0s = [(b >> 6, (b >> 5) & 0x01, (b >> 4) & 0x01, b & 0x0f) for b in xrange(256)]
+    _b1s = [(b >> 7, b & 0x7f) for b in xrange(256)]
+
+    @classmethod
+    def from_buffer_copy(cls, buf, offset=0):
+        try:
+            b0, b1, seq_number, timestamp, ssrc = cls._struct.unpack_from(buf, offset)
+        except struct.error:
+            return super(RTPHeader, cls).from_buffer_copy(buf, offset)
+        obj = object.__new__(cls)
+        obj.version, obj.padding, obj.extension, obj.csrccount = cls._b0s[b0]
+        obj.markerbit, obj.type = cls._b1s[b1]
+        obj.seq_number = seq_number
+        obj.timestamp = timestamp
+        obj.ssrc = ssrc
+        return obj
+
+    def _unpack(self, buf, offset):
+        b0, b1, self.seq_number, self.timestamp, self.ssrc = self._struct.unpack_from(buf, offset)
+        self.version, self.padding, self.extension, self.csrccount = self._b0s[b0]
+        self.markerbit, self.type = self._b1s[b1]
+
+    def pack(self):
+        return self._struct.pack(
+            ((self.version & 0x03) << 6) |
+            ((self.padding & 0x01) << 5) |
+            ((self.extension & 0x01) << 4) |
+            (self.csrccount & 0x0f),
+            ((self.markerbit & 0x01) << 7) | (self.type & 0x7f),
+            self.seq_number & 0xffff,
+            self.timestamp & 0xffffffff,
+            self.ssrc & 0xffffffff,
+        )
 
 
 class RTPTimeMixin(object):
@@ -44,6 +149,8 @@ class RTPTimeMixin(object):
     `RTPPacket` mixin used to compute timing information. 
     """
 
+    __slots__ = ()
+
     # In Hz (e.g. 48000).
     clock_rate = None
 
@@ -66,6 +173,8 @@ class RTPPayload(object):
     type via `RTPPacket.payload_type`.
     """
 
+    __slots__ = ()
+
     @abc.abstractmethod
     def pack(self, fo=None):
         pass
@@ -74,12 +183,21 @@ class RTPPayload(object):
     def unpack(self, buf):
         pass
 
+    @property
+    def size(self):
+        """
+        Packed size in bytes. Override to measure w/o packing.
+        """
+        return len(self.pack())
+
 
 class RTPAudioPayloadMixin(object):
     """
     `RTPPayload` mixin used to query audio information.
     """
 
+    __slots__ = ()
+
     @abc.abstractproperty
     def nb_samples(self):
         pass
@@ -106,6 +224,8 @@ class RTPVideoPayloadMixin(object):
     `RTPPayload` mixin used to query video information.
     """
 
+    __slots__ = ()
+
     @abc.abstractproperty
     def is_start_of_frame(self):
         pass
@@ -164,6 +284,8 @@ class RTPPacket(object):
 
     """
 
+    __slots__ = ('header', 'csrcs', 'data', 'pad')
+
     AUDIO_TYPE = 'audio'
     VIDEO_TYPE = 'video'
 
@@ -194,7 +316,7 @@ class RTPPacket(object):
             fo, value = StringIO.StringIO(), True
         else:
             value = False
-        fo.write(buffer(self.header))
+        fo.write(self.header.pack())
         if self.header.csrccount:
             fo.write(struct.pack('>{0}I'.format(self.header.csrccount), self.csrcs))
         if isinstance(self.data, RTPPayload):
@@ -208,37 +330,266 @@ class RTPPacket(object):
         if value:
             return fo.getvalue()
 
+    @property
+    def size(self):
+        """
+        Packed size in bytes, measured w/o packing.
+        """
+        size = self.header._size_ + 4 * self.header.csrccount + self.pad
+        if isinstance(self.data, RTPPayload):
+            size += self.data.size
+        elif self.data is not None:
+            size += len(self.data)
+        return size
+
     def unpack(self, buf, depadded=True):
-        # header
         header = RTPHeader.from_buffer_copy(buf)
-        buf = buf[ctypes.sizeof(header):]
+        csrcs, data, pad = self._unpack_body(buf, header, depadded)
+        self.header = header
+        self.csrcs = csrcs
+        self.data = data
+        self.pad = pad
+
+    def _unpack_body(self, buf, header, depadded):
+        offset = header._size_
 
         # csrcs
         if header.csrccount:
             fmt = '>{0}I'.format(header.csrccount)
-            csrcs = struct.unpack(fmt, buf[:struct.calcsize(fmt)])
-            buf = buf[struct.calcsize(fmt):]
+            csrcs = struct.unpack_from(fmt, buf, offset)
+            offset += struct.calcsize(fmt)
         else:
             csrcs = []
 
         # padding
+        end = len(buf)
         if not depadded and header.padding == 1:
-            pad, = struct.unpack('>B', buf[-1])
+            pad, = struct.unpack_from('>B', buf, end - 1)
             logger.debug('stripping %s rtp pad from data', pad)
-            buf = buf[:-pad]
+            end -= pad
         else:
             pad = 0
 
         # data
+        buf = view(buf, offset, end)
         if self.payload_type:
             data = self.payload_type(buf) if buf else None
         else:
             data = buf
 
-        self.header = header
-        self.csrcs = csrcs
-        self.data = data
-        self.pad = pad
+        return csrcs, data, pad
+
+    def __getstate__(self):
+        # NOTE: buffers (e.g. of an mmap) aren't pickle-able so are copied
+        data = str(self.data) if isinstance(self.data, buffer) else self.data
+        return self.header, self.csrcs, data, self.pad
+
+    def __setstate__(self, state):
+        self.header, self.csrcs, self.data, self.pad = state
+
+
+class LazyRTPPacketMixin(object):
+    """
+    `RTPPacket` mixin that keeps a reference to the buffer it is unpacked from
+    and only decodes its:
+
+    - header and
+    - csrcs, data (i.e. payload) and pad
+
+    when first accessed. Passes that only look at e.g. `header.timestamp`
+    then never decode payloads. Use `lazy` to create a lazy variant of an
+    `RTPPacket` type, e.g.:
+
+    .. code:: python
+
+        pkts = marm.mjr.MJRRTPPacketReader(
+            'path/to/video.mjr', packet_type=marm.rtp.lazy(marm.vp8.VP8RTPPacket),
+        )
+
+    """
+
+    _buf = None
+
+    _depadded = True
+
+    _header = None
+
+    _body = None
+
+    def unpack(self, buf, depadded=True):
+        self._buf = buf
+        self._depadded = depadded
+        self._header = None
+        self._body = None
+
+    def pack(self, fo=None):
+        if self._buf is None or self._header is not None or self._body is not None:
+            return super(LazyRTPPacketMixin, self).pack(fo)
+        # NOTE: nothing decoded so nothing changed
+        if fo is None:
+            return str(self._buf)
+        fo.write(self._buf)
+
+    @property
+    def size(self):
+        if self._buf is None or self._body is not None:
+            return super(LazyRTPPacketMixin, self).size
+        return len(self._buf)
+
+    @property
+    def is_decoded(self):
+        return self._buf is None or self._body is not None
+
+    def __reduce__(self):
+        # NOTE: `lazy` types aren't bound in their module so go through it
+        return _lazy_packet, (self.eager_type,), self.__getstate__()
+
+    def __getstate__(self):
+        if self._buf is None or self._header is not None or self._body is not None:
+            return super(LazyRTPPacketMixin, self).__getstate__()
+        return str(self._buf), self._depadded
+
+    def __setstate__(self, state):
+        if len(state) == 2:
+            self.unpack(*state)
+        else:
+            super(LazyRTPPacketMixin, self).__setstate__(state)
+
+    @property
+    def header(self):
+        if self._header is None:
+            if self._buf is None:
+                self._header = RTPHeader()
+            else:
+                self._header = RTPHeader.from_buffer_copy(self._buf)
+        return self._header
+
+    @header.setter
+    def header(self, value):
+        self._header = value
+
+    @property
+    def csrcs(self):
+        return self._decode()[0]
+
+    @csrcs.setter
+    def csrcs(self, value):
+        self._decode()[0] = value
+
+    @property
+    def data(self):
+        return self._decode()[1]
+
+    @data.setter
+    def data(self, value):
+        self._decode()[1] = value
+
+    @property
+    def pad(self):
+        return self._decode()[2]
+
+    @pad.setter
+    def pad(self, value):
+        self._decode()[2] = value
+
+    def _decode(self):
+        if self._body is None:
+            if self._buf is None:
+                self._body = [[], '', 0]
+            else:
+                self._body = list(self._unpack_body(self._buf, self.header, self._depadded))
+        return self._body
+
+
+class PacketFilter(object):
+    """
+    Declarative `RTPPacketReader.packet_filter` matching rtp header fields.
+    Each is optional and is one of:
+
+    - `pt`, payload type
+    - `ssrc`, synchronization source
+    - `seq`, (begin, end) range of sequence numbers
+    - `timestamp`, (begin, end) range of timestamps
+    - `marker`, marker bit
+
+    where ranges are half-open and either end can be None. Readers check it
+    against raw packet header bytes (see `match`) or `index.PacketIndex`
+    columns (see `match_row`) rather than unpacked packets, but it is also a
+    plain predicate on `RTPPacket`s, e.g.:
+
+    .. code:: python
+
+        pkts = marm.mjr.MJRRTPPacketReader(
+            'path/to/video.mjr',
+            packet_type=marm.vp8.VP8RTPPacket,
+            packet_filter=marm.rtp.PacketFilter(ssrc=1234, timestamp=(0, 90000)),
+        )
+
+    """
+
+    HEADER = struct.Struct('>BBHII')
+
+    def __init__(self, pt=None, ssrc=None, seq=None, timestamp=None, marker=None):
+        self.pt = pt
+        self.ssrc = ssrc
+        self.seq = seq
+        self.timestamp = timestamp
+        self.marker = marker
+
+    def match(self, buf, offset=0):
+        """
+        Checks rtp header of packet at `offset` in `buf`.
+        """
+        _, b, seq, timestamp, ssrc = self.HEADER.unpack_from(buf, offset)
+        return self.match_fields(b & 0x7f, ssrc, seq, timestamp, b & 0x80)
+
+    def match_row(self, idx, row):
+        """
+        Checks `row` of an `index.PacketIndex`.
+        """
+        return self.match_fields(
+            idx.type[row],
+            idx.ssrc[row],
+            idx.seq[row],
+            idx.timestamp[row],
+            idx.flags[row] & index.FLAG_MARKER,
+        )
+
+    def match_fields(self, pt, ssrc, seq, timestamp, marker):
+        if self.pt is not None and pt != self.pt:
+            return False
+        if self.ssrc is not None and ssrc != self.ssrc:
+            return False
+        if self.seq is not None and not self._in(seq, self.seq):
+            return False
+        if self.timestamp is not None and not self._in(timestamp, self.timestamp):
+            return False
+        if self.marker is not None and bool(marker) != bool(self.marker):
+            return False
+        return True
+
+    @staticmethod
+    def _in(value, (begin, end)):
+        return (
+            (begin is None or begin <= value) and
+            (end is None or value < end)
+        )
+
+    def __call__(self, pkt):
+        return self.match_fields(
+            pkt.header.type,
+            pkt.header.ssrc,
+            pkt.header.seq_number,
+            pkt.header.timestamp,
+            pkt.header.markerbit,
+        )
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(
+            '{0}={1!r}'.format(k, getattr(self, k))
+            for k in ('pt', 'ssrc', 'seq', 'timestamp', 'marker')
+            if getattr(self, k) is not None
+        ))
 
 
 class RTPPacketReader(collections.Iterable):
@@ -258,6 +609,10 @@ class RTPPacketReader(collections.Iterable):
     formats = {
     }
 
+    # Gaps in bytes between packets read by `read_packets` up to which they
+    # are read through rather than seeked over.
+    max_skip = 64 * 1024
+
     @classmethod
     def register(cls, format, type_):
         if not inspect.isclass(type_) or issubclass(RTPPacketReader, type_):
@@ -287,11 +642,18 @@ class RTPPacketReader(collections.Iterable):
         self.packet_type = kwargs.pop('packet_type', self.packet_type)
         if self.packet_type is None:
             raise Exception('Missing packet_type= and no default for {0}.'.format(self.__name__))
-        self.packet_filter = kwargs.pop('packet_filter', None) or (lambda pkt: True)
+        packet_filter = kwargs.pop('packet_filter', None)
+        self.packet_filter = packet_filter or (lambda pkt: True)
+        self.is_filtered = packet_filter is not None
+        if isinstance(packet_filter, PacketFilter):
+            self.header_filter = packet_filter
+        else:
+            self.header_filter = None
         if len(args) == 1 and not isinstance(args[0], basestring) and not kwargs:
             self.fo = args[0]
         else:
             self.fo = open(*args, **kwargs)
+        self.name = getattr(self.fo, 'name', None)
         self.org = kwargs.pop('org', self.fo.tell())
 
     def index(self, restore=True):
@@ -305,6 +667,80 @@ class RTPPacketReader(collections.Iterable):
         if restore:
             self.fo.seek(org)
 
+    def packet_index(self):
+        """
+        Indexes packets matching `packet_filter`.
+
+        :returns: An `index.PacketIndex` whose offsets can be passed to
+            `read_packet`.
+        """
+        idx = index.PacketIndex()
+        with self.restoring():
+            i = iter(self)
+            pos = self.fo.tell()
+            for pkt in i:
+                idx.add(pos, len(pkt.pack()), pkt)
+                pos = self.fo.tell()
+            idx.end = pos
+        return idx
+
+    def update_index(self, idx):
+        """
+        Extends `idx`, as built by `packet_index`, w/ packets appended since
+        it was built (i.e. from `idx.end`). A partially written trailing packet
+        is left for a later update.
+
+        :returns: Number of packets added to `idx`.
+        """
+        count = len(idx)
+        with self.restoring():
+            i = iter(self)
+            self.fo.seek(idx.end)
+            pos = idx.end
+            for pkt in i:
+                idx.add(pos, len(pkt.pack()), pkt)
+                pos = self.fo.tell()
+            idx.end = pos
+        return len(idx) - count
+
+    def save_index(self, idx):
+        """
+        Persists `idx`, as built by `packet_index`, e.g. after adding
+        `index.PacketIndex.orders` to it. Most readers don't persist indexes.
+
+        :returns: True if saved, otherwise False.
+        """
+        return False
+
+    def read_packet(self, offset, size):
+        """
+        Reads packet at `offset` of `size` bytes as recorded by
+        `packet_index`.
+        """
+        i = iter(self)
+        self.fo.seek(offset)
+        return i.next()
+
+    def read_packets(self, idx, row=0):
+        """
+        Generator yielding packets of `idx`, as built by `packet_index`, from
+        `row` on in stored order, including rows appended to `idx` while
+        iterating (see `update_index`). Readers w/ offsets in their file
+        read forward through it rather than seeking to each packet, so its
+        file object must not be moved between packets.
+        """
+        while row < len(idx):
+            yield self.read_packet(idx.offset[row], idx.size[row])
+            row += 1
+
+    @property
+    def path(self):
+        """
+        Path to file backing this reader, or None if it has none.
+        """
+        if isinstance(self.name, basestring) and os.path.isfile(self.name):
+            return self.name
+
     def reset(self):
         """
         Resets file object to initial packet position.
@@ -319,6 +755,38 @@ class RTPPacketReader(collections.Iterable):
         finally:
             self.fo.seek(pos)
 
+    def _read_forward(self, idx, row):
+        # NOTE: yields buffers of packets at idx offsets read sequentially
+        pos = None
+        while row < len(idx):
+            offset, size = idx.offset[row], idx.size[row]
+            if pos is None or not (0 <= offset - pos <= self.max_skip):
+                self.fo.seek(offset)
+            elif offset != pos:
+                self.fo.read(offset - pos)
+            buf = self.fo.read(size)
+            if len(buf) != size:
+                raise ValueError('Failed to read {0} length packet at {1}.'.format(size, offset))
+            yield buf
+            pos = offset + size
+            row += 1
+
+    def filter_packet(self, buf, **kwargs):
+        """
+        Unpacks `buf` as a `packet_type` if it passes `packet_filter`. A
+        `PacketFilter` is checked against the raw header before unpacking.
+
+        :returns: The packet or None if filtered out.
+        """
+        if self.header_filter is not None:
+            if not self.header_filter.match(buf):
+                return None
+            return self.packet_type(buf, **kwargs)
+        pkt = self.packet_type(buf, **kwargs)
+        if not self.packet_filter(pkt):
+            return None
+        return pkt
+
     @property
     def is_empty(self):
         with self.restoring():
@@ -335,11 +803,26 @@ class RTPCursor(collections.Iterable):
     Cursor used to iterate over a collection or stored `RTPPacket`s.
     """
 
+    # Packet count and time span of an indexed part, see `index_parts`.
+    PartSpan = collections.namedtuple('PartSpan', [
+        'name',
+        'count',
+        'begin_secs',
+        'end_secs',
+    ])
+
+    # Default maximum number of parts w/ opened readers, i.e. file handles.
+    max_open = 64
+
     def __init__(
             self,
             parts,
             part_type=None,
             empty=True,
+            pool=None,
+            order=None,
+            packet_cache=None,
+            max_open=None,
             **part_kwargs):
         """
         :param parts: Collection of parts that `part_type` can turn into an
@@ -347,18 +830,44 @@ class RTPCursor(collections.Iterable):
 
         :param part_type: Type or call-able used to turn each part into an
             iterable of `RTPPacket`s, typically something implementing
-            `RTPPacketReader`. Defaults to `RTPPacketReader.open`.
+            `RTPPacketReader`. Defaults to `open_reader`.
 
         :param empty: When `False` *removes* parts w/o any packets.
 
+        :param pool: When given all parts are indexed up front on this thread
+            or process pool, see `index_parts`.
+
+        :param order: When given packets of each part are walked in this
+            order (see `packet_order`) rather than as stored, i.e. as a
+            sorted view of the part that is never rewritten.
+
+        :param packet_cache: `PacketCache` of packets read, by default they
+            aren't cached. Cached packets are shared by all reads of them so
+            must be treated as read-only.
+
+        :param max_open: Overrides the default `max_open`, must be at least 1.
+            Beyond it the least recently read parts are closed, keeping their
+            indexes, so they're re-opened but never re-indexed when read again.
+
         :param part_kwargs: Keyword arguments to be passed to `part_type`.
 
         """
-        self.part_type = part_type or RTPPacketReader.open
+        self.part_type = part_type or open_reader
         self.packet_type = part_kwargs.get('packet_type', RTPPacket)
+        self.order = order
+        self.part_kwargs = part_kwargs
+        self.packet_cache = packet_cache
+        if max_open is not None:
+            if max_open < 1:
+                raise ValueError('Invalid max open {0}.'.format(max_open))
+            self.max_open = max_open
+        self.opened = self._Opened(self.max_open)
         self.parts = [
-            self._Part(part, self.part_type, part_kwargs) for part in parts
+            self._Part(part, self.part_type, part_kwargs, order, self.opened)
+            for part in parts
         ]
+        if pool is not None:
+            self.index_parts(pool)
         if empty is False:
             self.parts = [p for p in self.parts if not p.is_empty]
         self.pos_part, self.pos_pkt = 0, 0
@@ -367,10 +876,121 @@ class RTPCursor(collections.Iterable):
         else:
             self.part = None
         self.c = collections.defaultdict(dict)
+        self._timeline = None
 
     def probe(self, window=100):
         return self.packet_type.payload_type.probe(self, window)
 
+    def index_parts(self, pool=None):
+        """
+        Indexes all parts up front, optionally in parallel on a thread or
+        process `pool` (anything w/ a `map` like `multiprocessing.Pool`). For
+        a process pool `part_type` and its keyword arguments must be
+        pickle-able. Indexes are then kept rather than rebuilt when parts are
+        opened.
+
+        :returns: List of `PartSpan`s, one for each part.
+        """
+        args = [
+            (part.part_type, part.file, part.part_kwargs)
+            for part in self.parts
+        ]
+        idxs = (pool.map if pool is not None else map)(index_part, args)
+        spans = []
+        for part, idx in zip(self.parts, idxs):
+            part.index(idx)
+            idx = part.sorted_index()
+            clock_rate = getattr(self.packet_type, 'clock_rate', None)
+            if len(idx) and clock_rate:
+                timestamps = unwrap_timestamps(idx.timestamp)
+                begin_secs = timestamps[0] / clock_rate
+                end_secs = timestamps[-1] / clock_rate
+            else:
+                begin_secs, end_secs = None, None
+            spans.append(self.PartSpan(
+                name=part.name,
+                count=len(idx),
+                begin_secs=begin_secs,
+                end_secs=end_secs,
+            ))
+        return spans
+
+    def table(self):
+        """
+        Builds an `RTPPacketTable` of all packets in all parts.
+        """
+        return RTPPacketTable.build(self)
+
+    def timeline(self):
+        """
+        Gets `RTPTimeline` of all parts, rebuilding it if parts it covers were
+        extended (see `poll`). Parts are only indexed, and their indexes kept,
+        once its seeks reach them.
+        """
+        if self._timeline is None or any(
+                len(self.parts[part].idx) != count
+                for part, count in self._timeline.counts.iteritems()):
+            self._timeline = RTPTimeline(
+                getattr(self.packet_type, 'clock_rate', None),
+                self._SortedIndexes(self.parts),
+            )
+        return self._timeline
+
+    def stats(self, gap=1.0):
+        """
+        Computes `StreamStats` of each part from its index, see
+        `index_stats`. They're saved along w/ indexes so computed once.
+
+        :returns: List of `StreamStats`, one for each part.
+        """
+        self._keep_indexes()
+        return [part.stats(gap) for part in self.parts]
+
+    def poll(self):
+        """
+        Extends indexes of opened parts w/ packets appended to them since they
+        were indexed, e.g. for parts still being recorded.
+
+        :returns: Number of new packets.
+        """
+        return sum(part.refresh() for part in self.parts if part.is_opened)
+
+    def wait(self, timeout=None, interval=0.5):
+        """
+        Polls every `interval` seconds until there are new packets or
+        `timeout` seconds have elapsed.
+
+        :returns: Number of new packets, so 0 if timed out.
+        """
+        expires = None if timeout is None else time.time() + timeout
+        while True:
+            count = self.poll()
+            if count:
+                return count
+            if expires is None:
+                time.sleep(interval)
+                continue
+            remaining = expires - time.time()
+            if remaining <= 0:
+                return 0
+            time.sleep(min(interval, remaining))
+
+    def follow(self, timeout=None, interval=0.5):
+        """
+        Generator yielding packets after the current position, waiting (see
+        `wait`) for more to be appended when it runs out of them.
+        """
+        if self.part is None:
+            return
+        while True:
+            try:
+                _, pkt = self._next()
+            except StopIteration:
+                if not self.wait(timeout, interval):
+                    return
+                continue
+            yield pkt
+
     @property
     def is_empty(self):
         return len(self.parts) == 0
@@ -465,8 +1085,6 @@ class RTPCursor(collections.Iterable):
                 'Part {0} packet index {1} out of range [0,{2})'
                 .format(part, pos_pkt, len(part))
             )
-        if self.part:
-            self.part.close()
         self.pos_part, self.pos_pkt = (pos_part, pos_pkt)
         self.part = part
 
@@ -489,23 +1107,63 @@ class RTPCursor(collections.Iterable):
         self.each(stop, func)
         return s['count']
 
-    def compute(self, m, r, stop=None, zero=0, cache=None):
+    def compute(self, m, r, stop=None, zero=0, cache=None, pool=None):
+        """
+        Map-reduces packets from the current position up to `stop`, by
+        default the last packet, w/ `m` and `r` starting from `zero`.
+
+        :param cache: Tag under which reductions of whole parts are cached.
+            When a string it names the reduction and reductions surviving a
+            json round-trip are also saved along w/ parts' indexes (see
+            `_Part.save`), so computed once per part rather than once per
+            cursor.
+
+        :param pool: When given whole parts are reduced on this thread or
+            process pool (see `compute_part`). For a process pool `m`, `r`,
+            `part_type` and its keyword arguments must be pickle-able.
+
+        """
         value = zero
         org = self.tell()
         stop = stop or (-1, -1)
-        spans = 0
-        for part, b_pos, e_pos in self.spans(org, stop):
-            spans += 1
-            if cache and self.is_cached(cache, (part, b_pos, e_pos)):
-                v = self.cache(cache, (part, b_pos, e_pos))
+        spans = list(self.spans(org, stop))
+        name = cache if isinstance(cache, basestring) else None
+        if name is not None:
+            self._keep_indexes()
+        vs = {}
+        for span in spans:
+            part, b_pos, e_pos = span
+            if cache and self.is_cached(cache, span):
+                vs[span] = self.cache(cache, span)
+            elif name is not None and (b_pos == 0 and e_pos == -1):
+                saved = self.parts[part].reduction(name)
+                if saved is not None:
+                    vs[span] = saved['value']
+        wholes = [
+            span for span in spans
+            if span not in vs and (span[1] == 0 and span[2] == -1)
+        ]
+        if pool is not None and wholes:
+            args = [
+                (p.part_type, p.file, p.part_kwargs, p.order, m, r, zero)
+                for p in (self.parts[part] for part, _, _ in wholes)
+            ]
+            vs.update(zip(wholes, pool.map(compute_part, args)))
+        for span in spans:
+            part, b_pos, e_pos = span
+            if span in vs:
+                v = vs[span]
             else:
                 self.seek((part, b_pos))
                 md = (m(pkt) for pkt in self.slice(
                     (part, e_pos), inclusive=(e_pos == -1)
                 ))
                 v = reduce(r, md, zero)
-                if cache and (b_pos == 0 and e_pos == -1):
-                    self.cache(cache, (part, b_pos, e_pos), v)
+            if b_pos == 0 and e_pos == -1:
+                if cache and not self.is_cached(cache, span):
+                    self.cache(cache, span, v)
+                if name is not None and self.parts[part].reduction(name) is None:
+                    self.parts[part].reduced(name, v)
             value = reduce(r, [v], value)
         if spans:
             self.seek(stop)
@@ -537,63 +1195,81 @@ class RTPCursor(collections.Iterable):
             pass
 
     def prev_key_frame(self):
-        return self.search(
-            lambda pkt: pkt.data.is_start_of_frame and pkt.data.is_key_frame,
-            'backward'
-        )
+        return self.search_frames(index.FLAG_START_OF_FRAME | index.FLAG_KEY_FRAME, 'backward')
 
     def next_key_frame(self):
-        return self.search(
-            lambda pkt: pkt.data.is_start_of_frame and pkt.data.is_key_frame,
-            'forward'
-        )
+        return self.search_frames(index.FLAG_START_OF_FRAME | index.FLAG_KEY_FRAME, 'forward')
 
     def prev_start_of_frame(self):
-        return self.search(
-            lambda pkt: (
-                pkt.data.is_start_of_frame and pkt.data.is_start_of_frame
-            ),
-            'backward'
-        )
+        return self.search_frames(index.FLAG_START_OF_FRAME, 'backward')
 
     def next_start_of_frame(self):
-        return self.search(
-            lambda pkt: (
-                pkt.data.is_start_of_frame and pkt.data.is_start_of_frame
-            ),
-            'forward'
-        )
+        return self.search_frames(index.FLAG_START_OF_FRAME, 'forward')
+
+    def search_frames(self, flags, dir='forward'):
+        """
+        Like `search` for packets w/ all `flags` set (see `index.FLAG_*`)
+        but bisects each part's frame index (see `_Part.frames`) rather than
+        reading and matching packets one at a time.
+
+        :returns: The matching packet, or None if there is none in which
+            case the cursor is left where `search` would've left it.
+        """
+        if dir not in ('forward', 'backward'):
+            raise ValueError('Invalid direction "{0}".'.format(dir))
+        if self.part is None:
+            return None
+        pos_part, pos_pkt = last = self.tell()
+        if dir == 'forward':
+            parts = xrange(pos_part, len(self.parts))
+        else:
+            parts = xrange(pos_part, -1, -1)
+        for i in parts:
+            part = self.parts[i]
+            part.keep_index()
+            positions = part.frames(flags)
+            if dir == 'forward':
+                # NOTE: stepping forward stops at an empty part
+                if i != pos_part and not len(part):
+                    break
+                j = bisect.bisect_right(positions, pos_pkt if i == pos_part else -1)
+                if j < len(positions):
+                    self.seek((i, positions[j]))
+                    return self.current()
+                if len(part):
+                    last = (i, len(part) - 1)
+            else:
+                j = bisect.bisect_left(positions, pos_pkt if i == pos_part else len(part)) - 1
+                if j >= 0:
+                    self.seek((i, positions[j]))
+                    return self.current()
+                if len(part):
+                    last = (i, 0)
+        self.seek(last)
 
     def interval(self, pos=None):
-        # FIXME: sum inter-packet delta w/ reset detection?
         if not pos:
             pos = (-1, -1)
         if self.is_empty:
             return None
-        start = self.current().secs
+        timeline = self.timeline()
+        start = timeline.secs(self.tell())
         self.seek(pos)
-        delta = self.current().secs - start
-        return delta
+        return timeline.secs(self.tell()) - start
 
     def fastforward(self, secs):
-        # FIXME: sum inter-packet delta w/ reset detection?
         if not secs:
             return 0
         if secs < 0:
             return self.rewind(-secs)
-        start = self.current().secs
-        self.search(lambda pkt: pkt.secs - start >= secs, 'forward')
-        return (self.current().secs - start) - secs
+        return self._time_seek(secs) - secs
 
     def rewind(self, secs):
-        # FIXME: sum inter-packet delta w/ reset detection?
         if not secs:
             return 0
         if secs < 0:
             return self.fastforward(-secs)
-        start = self.current().secs
-        self.search(lambda pkt: start - pkt.secs >= secs, 'backward')
-        return (start - self.current().secs) - secs
+        return -self._time_seek(-secs) - secs
 
     def time_cut(self, begin_secs, end_secs, align=True):
         """
@@ -698,13 +1374,15 @@ class RTPCursor(collections.Iterable):
 
     def time_positions(self, *args):
         """
+        Converts **time** offsets relative to current position in seconds to
+        **cursor** positions, see `fastforward` and `rewind`. The cursor is
+        left at the last of them.
         """
-        pos = []
+        timeline = self.timeline()
         org = self.tell()
-        for secs in args:
-            self.seek(org)
-            self.fastforward(secs)
-            pos.append(self.tell())
+        pos = [timeline.seek(org, secs) for secs in args]
+        if pos:
+            self.seek(pos[-1])
         return pos
 
     def prev_to(self, pos, count=1):
@@ -837,7 +1515,7 @@ class RTPCursor(collections.Iterable):
     def current(self):
         if not self.part.is_opened:
             self.part.open()
-        return self.part.packet(self.pos_pkt)
+        return self._packet()
 
     def copy(self):
         return copy.copy(self)
@@ -846,6 +1524,13 @@ class RTPCursor(collections.Iterable):
         obj = type(self)(
             part_type=self.part_type,
             parts=[part.file for part in self.parts],
+            order=self.order,
+            packet_cache=(
+                self.packet_cache.copy()
+                if self.packet_cache is not None else None
+            ),
+            max_open=self.max_open,
+            **self.part_kwargs
         )
         obj.seek(self.tell())
         return obj
@@ -875,33 +1560,201 @@ class RTPCursor(collections.Iterable):
 
     class _Part(collections.Sequence):
 
-        def __init__(self, file, part_type, part_kwargs):
+        def __init__(self, file, part_type, part_kwargs, order=None, opened=None):
             self.file = file
             self.part_type = part_type
             self.part_kwargs = part_kwargs
+            self.order = order
+            self.opened = opened
             self.pkts = None
-            self.i = None
-            self.idx = []
+            self.idx = index.PacketIndex()
+            self.perm = None
+            self.unsaved = False
+            self.keep_idx = False
+            self.stream = None
+            self.next_row = None
+            self.frame_idxs = {}
+
+        def index(self, idx):
+            self.idx = idx
+            self.keep_idx = True
+            self.stream = None
+            self.frame_idxs = {}
+            if self.sort():
+                self.save()
+
+        def keep_index(self):
+            """
+            Indexes this part, unless it already was, and keeps its index.
+            """
+            if self.keep_idx:
+                return
+            self.index(
+                self.idx if self.is_opened
+                else index_part((self.part_type, self.file, self.part_kwargs))
+            )
 
         def open(self):
             self.close()
             self.pkts = self.part_type(self.file, **self.part_kwargs)
-            for pos in self.pkts.index():
-                self.idx.append(pos)
-            self.i = iter(self.pkts)
+            if not self.keep_idx:
+                # NOTE: kept once built so closing never means re-indexing
+                self.index(self.pkts.packet_index())
+            if self.opened is not None:
+                self.opened.touch(self)
 
         def close(self):
+            if self.unsaved:
+                self.save()
+            if self.opened is not None:
+                self.opened.discard(self)
             self.pkts = None
-            self.i = None
-            del self.idx[:]
+            self.stream = None
+            self.next_row = None
+
+        def refresh(self):
+            if self.is_closed:
+                return 0
+            count = self.pkts.update_index(self.idx)
+            if count and self.sort():
+                # NOTE: saved on close rather than on every poll
+                self.unsaved = True
+            return count
+
+        def sort(self):
+            """
+            Orders packets of this part per `order` (see `packet_order`).
+
+            :returns: True if the permutation was newly built, i.e. isn't
+                saved along w/ the part's index, otherwise False.
+            """
+            if self.order is None:
+                return False
+            order = self.idx.orders.get(self.order)
+            is_saved = order is not None and len(order) == len(self.idx)
+            self.perm = packet_order(self.idx, self.order)
+            return not is_saved
+
+        def reduction(self, name):
+            """
+            Gets reduction of this part saved as `name` (see `reduced`).
+
+            :returns: Dict w/ the reduction as its "value", or None if there
+                is none for the part's current index and order.
+            """
+            saved = self.idx.meta.get('reductions', {}).get(name)
+            if (saved is None or
+                    saved['count'] != len(self.idx) or
+                    saved['order'] != self.order):
+                return None
+            return saved
+
+        def reduced(self, name, value):
+            """
+            Saves reduction `value` of this part as `name` along w/ its index
+            if it survives a json round-trip (e.g. tuples and dicts w/ int
+            keys don't), see `RTPCursor.compute`.
+
+            :returns: True if saved, otherwise False.
+            """
+            try:
+                if json.loads(json.dumps(value)) != value:
+                    return False
+            except (TypeError, ValueError):
+                return False
+            self.idx.meta.setdefault('reductions', {})[name] = {
+                'count': len(self.idx),
+                'order': self.order,
+                'value': value,
+            }
+            return self.save()
+
+        def stats(self, gap=1.0):
+            """
+            Computes `StreamStats` of this part (see `index_stats`), saving
+            them along w/ its index when newly computed.
+            """
+            stats = self.idx.meta.get('stats')
+            is_saved = (
+                stats is not None and
+                stats['count'] == len(self.idx) and
+                stats['gap'] == gap
+            )
+            packet_type = self.part_kwargs.get('packet_type', RTPPacket)
+            stats = index_stats(self.idx, packet_type, gap)
+            if not is_saved:
+                self.save()
+            return stats
+
+        def save(self):
+            """
+            Saves index of this part if its reader supports it, see
+            `RTPPacketReader.save_index`.
+            """
+            self.unsaved = False
+            if not len(self.idx):
+                return False
+            with self.reading() as pkts:
+                if not hasattr(pkts, 'save_index'):
+                    return False
+                return pkts.save_index(self.idx)
+
+        @contextlib.contextmanager
+        def reading(self):
+            """
+            Yields this part's reader, or if it's closed a new one that's
+            closed after.
+            """
+            if self.pkts is not None:
+                yield self.pkts
+                return
+            pkts = self.part_type(self.file, **self.part_kwargs)
+            try:
+                yield pkts
+            finally:
+                if isinstance(self.file, basestring):
+                    for fo in set([pkts.fo, getattr(pkts, 'file', pkts.fo)]):
+                        fo.close()
+
+        def frames(self, flags):
+            """
+            Frame index of this part, i.e. sorted positions of its packets w/
+            all `flags` set (e.g. `index.FLAG_START_OF_FRAME`). It's built
+            from the part's index, so w/o reading packets, and rebuilt when
+            that's extended.
+            """
+            count, positions = self.frame_idxs.get(flags, (None, None))
+            if count == len(self.idx):
+                return positions
+            if numpy is not None:
+                column = _column(self.idx.flags)
+                if self.perm is not None:
+                    column = column[_column(self.perm)]
+                positions = numpy.flatnonzero((column & flags) == flags)
+            else:
+                column = self.idx.flags
+                positions = array.array('l', (
+                    i for i in xrange(len(self.idx))
+                    if column[self.row(i)] & flags == flags
+                ))
+            self.frame_idxs[flags] = len(self.idx), positions
+            return positions
+
+        def sorted_index(self, idx=None):
+            """
+            Gets `idx`, by default this part's, w/ its rows in `order`.
+            """
+            if idx is None:
+                idx = self.idx
+            if self.order is None:
+                return idx
+            return idx.select(packet_order(idx, self.order))
 
         @property
         def is_empty(self):
-            return  (
-                len(self.idx) != 0
-                if self.pkts is not None
-                else self.part_type(self.file, **self.part_kwargs).is_empty
-            )
+            if self.keep_idx:
+                return len(self.idx) == 0
+            return self.part_type(self.file, **self.part_kwargs).is_empty
 
         @property
         def name(self):
@@ -919,11 +1772,26 @@ class RTPCursor(collections.Iterable):
         def is_closed(self):
             return not self.is_opened
 
+        def row(self, i):
+            return self.perm[i] if self.perm is not None else i
+
         def packet(self, i):
             if self.is_closed:
                 self.open()
-            self.pkts.fo.seek(self.idx[i], os.SEEK_SET)
-            return self.i.next()
+            elif self.opened is not None:
+                self.opened.touch(self)
+            row = self.row(i)
+            if row != self.next_row:
+                self.stream = None
+            elif self.stream is None and hasattr(self.pkts, 'read_packets'):
+                # NOTE: sequential so stream from here on rather than seek
+                self.stream = self.pkts.read_packets(self.idx, row)
+            if self.stream is not None:
+                pkt = self.stream.next()
+            else:
+                pkt = self.pkts.read_packet(self.idx.offset[row], self.idx.size[row])
+            self.next_row = row + 1
+            return pkt
 
         # collections.Sequence
 
@@ -933,6 +1801,68 @@ class RTPCursor(collections.Iterable):
         def __len__(self):
             return len(self.idx)
 
+    class _Opened(object):
+        """
+        Least recently used parts w/ opened readers, closing them beyond
+        `max_open`.
+        """
+
+        def __init__(self, max_open):
+            self.max_open = max_open
+            self.parts = collections.OrderedDict()
+
+        def touch(self, part):
+            key = id(part)
+            if next(reversed(self.parts), None) == key:
+                return
+            self.parts.pop(key, None)
+            self.parts[key] = part
+            while len(self.parts) > self.max_open:
+                _, lru = self.parts.popitem(last=False)
+                lru.close()
+
+        def discard(self, part):
+            self.parts.pop(id(part), None)
+
+        def __len__(self):
+            return len(self.parts)
+
+    class _SortedIndexes(collections.Sequence):
+
+        # NOTE: parts are indexed, and their indexes kept, when accessed
+
+        def __init__(self, parts):
+            self.parts = parts
+
+        def __getitem__(self, i):
+            part = self.parts[i]
+            part.keep_index()
+            return part.sorted_index()
+
+        def __len__(self):
+            return len(self.parts)
+
+    def _keep_indexes(self):
+        for part in self.parts:
+            part.keep_index()
+
+    def _packet(self):
+        # NOTE: keyed by stored row, which unlike position survives re-sorts
+        if self.packet_cache is None:
+            return self.part.packet(self.pos_pkt)
+        part, row = self.part, self.part.row(self.pos_pkt)
+        return self.packet_cache.get(
+            (self.pos_part, row),
+            lambda: (part.packet(self.pos_pkt), part.idx.size[row]),
+        )
+
+    def _time_seek(self, secs):
+        timeline = self.timeline()
+        org = self.tell()
+        pos = timeline.seek(org, secs)
+        self.seek(pos)
+        return timeline.secs(pos) - timeline.secs(org)
+
     def _next(self):
         # next
         (pos_part, pos_pkt) = (self.pos_part, self.pos_pkt)
@@ -956,7 +1886,7 @@ class RTPCursor(collections.Iterable):
             raise
 
         # read
-        pos, pkt = self.tell(), self.part.packet(self.pos_pkt)
+        pos, pkt = self.tell(), self._packet()
         return pos, pkt
 
     def _prev(self):
@@ -983,10 +1913,1137 @@ class RTPCursor(collections.Iterable):
             raise
 
         # read
-        pos, pkt = self.tell(), self.part.packet(self.pos_pkt)
+        pos, pkt = self.tell(), self._packet()
         return pos, pkt
 
 
+class RTPPacketTable(object):
+    """
+    Column oriented table of stored `RTPPacket`s used to analyze a whole
+    stream at once rather than calling back for each packet. It's built from
+    `index.PacketIndex`es so packets are never read. Each column holds for
+    each packet its:
+
+    - seq, its rtp sequence number
+    - timestamp, its rtp timestamp extended to 64 bits, see
+      `unwrap_timestamps`
+    - secs, its extended timestamp in seconds
+    - size, of the packet in bytes
+    - marker, start_of_frame and key_frame, 1 if set otherwise 0
+    - part and pkt, its `RTPCursor` position
+
+    Columns are `numpy` arrays, and helpers vectorized, if it's installed.
+    Otherwise they are `array.array`s.
+    """
+
+    columns = [
+        ('seq', 'H'),
+        ('timestamp', 'l'),
+        ('secs', 'd'),
+        ('size', 'I'),
+        ('marker', 'B'),
+        ('start_of_frame', 'B'),
+        ('key_frame', 'B'),
+        ('part', 'l'),
+        ('pkt', 'l'),
+    ]
+
+    # Flag columns and their `index.PacketIndex.flags` bits.
+    flags = [
+        ('marker', index.FLAG_MARKER),
+        ('start_of_frame', index.FLAG_START_OF_FRAME),
+        ('key_frame', index.FLAG_KEY_FRAME),
+    ]
+
+    def __init__(self, clock_rate, idxs):
+        """
+        :param clock_rate: Of the packets, see `RTPTimeMixin.clock_rate`.
+
+        :param idxs: List of `index.PacketIndex`es, one for each part.
+        """
+        if not clock_rate:
+            raise ValueError('Invalid clock rate {0}.'.format(clock_rate))
+        self.clock_rate = clock_rate
+        seq = array.array('H')
+        timestamp = array.array('I')
+        size = array.array('I')
+        flags = array.array('B')
+        part = array.array('l')
+        pkt = array.array('l')
+        for i, idx in enumerate(idxs):
+            seq.extend(idx.seq)
+            timestamp.extend(idx.timestamp)
+            size.extend(idx.size)
+            flags.extend(idx.flags)
+            part.extend(array.array('l', [i]) * len(idx))
+            pkt.extend(xrange(len(idx)))
+        self.seq = _column(seq)
+        self.timestamp = unwrap_timestamps(timestamp)
+        self.size = _column(size)
+        self.part = _column(part)
+        self.pkt = _column(pkt)
+        if numpy is not None:
+            self.secs = self.timestamp / clock_rate
+            flags = _column(flags)
+            for name, bit in self.flags:
+                setattr(self, name, ((flags & bit) != 0).astype(numpy.uint8))
+        else:
+            self.secs = array.array(
+                'd', (ts / clock_rate for ts in self.timestamp)
+            )
+            for name, bit in self.flags:
+                setattr(self, name, array.array(
+                    'B', (1 if f & bit else 0 for f in flags)
+                ))
+        self._running_secs = None
+
+    @classmethod
+    def build(cls, src):
+        """
+        Builds table of all packets of an `RTPPacketReader` or `RTPCursor`.
+        Unopened cursor parts are indexed w/o opening them.
+        """
+        if isinstance(src, RTPCursor):
+            idxs = [
+                part.sorted_index(
+                    part.idx
+                    if part.is_opened or part.keep_idx
+                    else index_part((part.part_type, part.file, part.part_kwargs))
+                )
+                for part in src.parts
+            ]
+        else:
+            idxs = [src.packet_index()]
+        return cls(getattr(src.packet_type, 'clock_rate', None), idxs)
+
+    def position(self, row):
+        """
+        `RTPCursor` position of packet at `row`.
+        """
+        return int(self.part[row]), int(self.pkt[row])
+
+    def count(self, begin=0, end=None, **flags):
+        """
+        Counts packets in rows [`begin`, `end`) w/ flags equal to these, e.g.
+        `count(start_of_frame=True)`.
+        """
+        for name in flags:
+            if name not in dict(self.flags):
+                raise TypeError('Unexpected flag "{0}".'.format(name))
+        if end is None:
+            end = len(self)
+        if begin >= end:
+            return 0
+        if numpy is not None:
+            match = numpy.ones(end - begin, dtype=bool)
+            for name, value in flags.iteritems():
+                match &= (getattr(self, name)[begin:end] != 0) == bool(value)
+            return int(match.sum())
+        columns = [
+            (getattr(self, name), bool(value))
+            for name, value in flags.iteritems()
+        ]
+        return sum(
+            1 for row in xrange(begin, end)
+            if all(bool(column[row]) == value for column, value in columns)
+        )
+
+    def time_row(self, secs):
+        """
+        Finds first row at or after `secs`, i.e. where an `RTPCursor` at the
+        first packet would `fastforward` to. It bisects the running maximum
+        of `secs` so is O(log n) once that's computed.
+
+        :returns: The row or `len(self)` if there is none.
+        """
+        if self._running_secs is None:
+            if numpy is not None:
+                self._running_secs = numpy.maximum.accumulate(self.secs)
+            else:
+                running, m = array.array('d'), None
+                for value in self.secs:
+                    if m is None or value > m:
+                        m = value
+                    running.append(m)
+                self._running_secs = running
+        if numpy is not None:
+            return int(numpy.searchsorted(self._running_secs, secs, 'left'))
+        return bisect.bisect_left(self._running_secs, secs)
+
+    def time_position(self, secs):
+        """
+        `RTPCursor` position of first packet at or after `secs`.
+
+        :returns: The position or None if there is none.
+        """
+        row = self.time_row(secs)
+        if row == len(self):
+            return None
+        return self.position(row)
+
+    def gaps(self):
+        """
+        Finds gaps in sequence numbers, i.e. packets lost (or reordered).
+
+        :returns: List of (row, number of missing packets before it) tuples.
+        """
+        if numpy is not None:
+            deltas = numpy.diff(self.seq.astype(numpy.int32)) % (1 << 16)
+            rows = numpy.flatnonzero((deltas > 1) & (deltas < (1 << 15)))
+            return [(int(row) + 1, int(deltas[row]) - 1) for row in rows]
+        gaps = []
+        for row in xrange(1, len(self)):
+            delta = (self.seq[row] - self.seq[row - 1]) % (1 << 16)
+            if 1 < delta < (1 << 15):
+                gaps.append((row, delta - 1))
+        return gaps
+
+    def frame_rows(self, key_frames=False):
+        """
+        Rows of start-of-frame, or only key frame, packets.
+        """
+        column = self.key_frame if key_frames else self.start_of_frame
+        if numpy is not None:
+            return numpy.flatnonzero(column)
+        return array.array('l', (row for row, v in enumerate(column) if v))
+
+    def frame_ids(self):
+        """
+        Groups packets by frame, i.e. the number of start-of-frame packets
+        before each of them. Packets before the first start-of-frame packet
+        are in frame -1.
+        """
+        if numpy is not None:
+            return numpy.cumsum(self.start_of_frame, dtype=numpy.int64) - 1
+        ids, frame = array.array('l'), -1
+        for v in self.start_of_frame:
+            frame += v
+            ids.append(frame)
+        return ids
+
+    def frame_rate(self, window=10, min_window=10):
+        """
+        Estimates video frame rate from first `window` start-of-frame packets,
+        see `estimate_video_frame_rate`.
+        """
+        rows = self.frame_rows()[:window]
+        if len(rows) < min_window:
+            raise ValueError(
+                'Not enough start-of-frame packets {0} (< {1}).'
+                .format(len(rows), min_window)
+            )
+        span = float(self.secs[rows[-1]] - self.secs[rows[0]])
+        return (len(rows) - 1) / span
+
+    def bit_rates(self, window=1.0):
+        """
+        Computes bit rate of consecutive `window` second windows starting at
+        the first packet.
+
+        :returns: List of (window begin secs, bits per second) tuples.
+        """
+        if not len(self):
+            return []
+        epoch = self.secs[0]
+        if numpy is not None:
+            bins = numpy.floor((self.secs - epoch) / window).astype(numpy.int64)
+            included = bins >= 0
+            totals = numpy.bincount(
+                bins[included], weights=self.size[included]
+            )
+            totals = [int(total) for total in totals]
+        else:
+            totals = []
+            for secs, size in itertools.izip(self.secs, self.size):
+                b = int((secs - epoch) // window)
+                if b < 0:
+                    continue
+                if b >= len(totals):
+                    totals.extend([0] * (b + 1 - len(totals)))
+                totals[b] += size
+        return [
+            (epoch + i * window, total * 8 / window)
+            for i, total in enumerate(totals)
+        ]
+
+    def split_rows(self, duration=None, count=None):
+        """
+        Splits rows into consecutive chunks of at most `count` packets and/or
+        spanning less than `duration` seconds (or `datetime.timedelta`) from
+        their first packet.
+
+        :returns: List of (begin, end) row tuples.
+        """
+        if isinstance(duration, datetime.timedelta):
+            duration = duration.total_seconds()
+        chunks, begin = [], 0
+        while begin < len(self):
+            end = len(self)
+            if count is not None:
+                end = min(end, begin + count)
+            if duration is not None:
+                stop = self.secs[begin] + duration
+                if numpy is not None:
+                    over = numpy.flatnonzero(self.secs[begin:end] >= stop)
+                    if len(over):
+                        end = begin + int(over[0])
+                else:
+                    for row in xrange(begin, end):
+                        if self.secs[row] >= stop:
+                            end = row
+                            break
+            end = max(end, begin + 1)
+            chunks.append((begin, end))
+            begin = end
+        return chunks
+
+    def __len__(self):
+        return len(self.seq)
+
+
+class RTPTimeline(object):
+    """
+    Timeline of the packets of `RTPCursor` parts as their rtp timestamps
+    extended to 64 bits w/ resets joined, see `unwrap_timestamps`, so that
+    they only move forward in time. Packets are addressed by their
+    `RTPCursor` position.
+
+    Parts are added to it as seeks cross into them, each extended from its
+    neighbour's timestamps, so a seek only indexes the parts it reaches. The
+    running maximum (and minimum from the end) of each part's timestamps is
+    what lets `seek_forward` and `seek_backward` bisect rather than scan it.
+    """
+
+    # Consecutive timestamps further apart than this, in seconds, are a reset.
+    max_jump = 60
+
+    # Extended timestamps of a part's packets.
+    Segment = collections.namedtuple('Segment', [
+        'raw',
+        'timestamps',
+        'running_max',
+        'running_min',
+    ])
+
+    def __init__(self, clock_rate, idxs, max_jump=None):
+        """
+        :param clock_rate: Of the packets, see `RTPTimeMixin.clock_rate`.
+
+        :param idxs: Sequence of `index.PacketIndex`es, one for each part.
+            Each is only accessed once a seek reaches its part.
+
+        :param max_jump: Overrides the default `max_jump`.
+
+        """
+        if not clock_rate:
+            raise ValueError('Invalid clock rate {0}.'.format(clock_rate))
+        self.clock_rate = clock_rate
+        if max_jump is not None:
+            self.max_jump = max_jump
+        self.idxs = idxs
+        self.segments = {}
+        self.first = self.last = None
+
+    @property
+    def counts(self):
+        """
+        Packet counts of parts added so far, by part.
+        """
+        return dict(
+            (part, len(segment.raw))
+            for part, segment in self.segments.iteritems()
+        )
+
+    def segment(self, part):
+        """
+        Gets `Segment` of `part`, adding it and the parts between it and those
+        already added.
+        """
+        if self.first is None:
+            self.segments[part] = self._segment(self.idxs[part].timestamp)
+            self.first = self.last = part
+        while part > self.last:
+            before = self._anchor(xrange(self.last, self.first - 1, -1))
+            self.last += 1
+            self.segments[self.last] = self._segment(
+                self.idxs[self.last].timestamp, before=before,
+            )
+        while part < self.first:
+            after = self._anchor(xrange(self.first, self.last + 1))
+            self.first -= 1
+            self.segments[self.first] = self._segment(
+                self.idxs[self.first].timestamp, after=after,
+            )
+        return self.segments[part]
+
+    def position(self, (part, pkt)):
+        """
+        Normalizes `RTPCursor` position to that of a packet, i.e. of the next
+        one (or the last one if there is none) when past the end of its part.
+        """
+        count = len(self.segment(part).raw)
+        if pkt < 0:
+            pkt += count
+        if 0 <= pkt < count:
+            return part, pkt
+        for i in xrange(part + 1, len(self.idxs)):
+            if len(self.segment(i).raw):
+                return i, 0
+        for i in xrange(part, -1, -1):
+            count = len(self.segment(i).raw)
+            if count:
+                return i, count - 1
+        raise IndexError('No packets.')
+
+    def secs(self, pos):
+        """
+        Extended timestamp in seconds of packet at `RTPCursor` position.
+        """
+        part, pkt = self.position(pos)
+        return self.segment(part).timestamps[pkt] / self.clock_rate
+
+    def seek(self, pos, secs):
+        """
+        Finds packet `secs` away from the one at `pos`, see `seek_forward`
+        and `seek_backward`.
+        """
+        if not secs:
+            return self.position(pos)
+        if secs < 0:
+            return self.seek_backward(pos, -secs)
+        return self.seek_forward(pos, secs)
+
+    def seek_forward(self, pos, secs):
+        """
+        Finds first packet after the one at `pos` that is at least `secs`
+        later, or the last packet if there is none.
+        """
+        part, pkt = self.position(pos)
+        segment = self.segment(part)
+        start = segment.timestamps[pkt] / self.clock_rate
+
+        def reached(timestamp):
+            return timestamp / self.clock_rate - start >= secs
+
+        if reached(segment.running_max[pkt]):
+            # NOTE: only w/ packets before this one at least secs later
+            found = next((
+                i for i in xrange(pkt + 1, len(segment.raw))
+                if reached(segment.timestamps[i])
+            ), None)
+            if found is not None:
+                return part, found
+        else:
+            found = _bisect(
+                pkt + 1, len(segment.raw),
+                lambda i: reached(segment.running_max[i]),
+            )
+            if found < len(segment.raw):
+                return part, found
+        pos = part, len(segment.raw) - 1
+        for part in xrange(part + 1, len(self.idxs)):
+            segment = self.segment(part)
+            if not len(segment.raw):
+                continue
+            pos = part, len(segment.raw) - 1
+            if reached(segment.running_max[-1]):
+                return part, _bisect(
+                    0, len(segment.raw),
+                    lambda i: reached(segment.running_max[i]),
+                )
+        return pos
+
+    def seek_backward(self, pos, secs):
+        """
+        Finds last packet before the one at `pos` that is at least `secs`
+        earlier, or the first packet if there is none.
+        """
+        part, pkt = self.position(pos)
+        segment = self.segment(part)
+        start = segment.timestamps[pkt] / self.clock_rate
+
+        def reached(timestamp):
+            return start - timestamp / self.clock_rate >= secs
+
+        if reached(segment.running_min[pkt]):
+            # NOTE: only w/ packets after this one at least secs earlier
+            found = next((
+                i for i in xrange(pkt - 1, -1, -1)
+                if reached(segment.timestamps[i])
+            ), None)
+            if found is not None:
+                return part, found
+        else:
+            found = _bisect(
+                0, pkt,
+                lambda i: not reached(segment.running_min[i]),
+            ) - 1
+            if found >= 0:
+                return part, found
+        pos = part, 0
+        for part in xrange(part - 1, -1, -1):
+            segment = self.segment(part)
+            if not len(segment.raw):
+                continue
+            pos = part, 0
+            if reached(segment.running_min[0]):
+                return part, _bisect(
+                    0, len(segment.raw),
+                    lambda i: not reached(segment.running_min[i]),
+                ) - 1
+        return pos
+
+    # internals
+
+    def _anchor(self, parts):
+        # nearest added part w/ packets
+        for part in parts:
+            segment = self.segments[part]
+            if len(segment.raw):
+                return segment
+        return None
+
+    def _segment(self, raw, before=None, after=None):
+        raw = array.array('I', raw)
+        max_jump = int(self.max_jump * self.clock_rate)
+        if before is not None:
+            # NOTE: continues from last timestamps of preceding part
+            anchor = before.raw[-2:]
+            extended = unwrap_timestamps(anchor + raw, max_jump=max_jump)
+            shift = before.timestamps[-1] - extended[len(anchor) - 1]
+            timestamps = extended[len(anchor):]
+        elif after is not None:
+            # NOTE: continues into first timestamps of following part
+            anchor = after.raw[:2]
+            extended = unwrap_timestamps(raw + anchor, max_jump=max_jump)
+            shift = after.timestamps[0] - extended[len(raw)]
+            timestamps = extended[:len(raw)]
+        else:
+            shift = 0
+            timestamps = unwrap_timestamps(raw, max_jump=max_jump)
+        if numpy is not None:
+            timestamps = timestamps + shift
+            running_max = numpy.maximum.accumulate(timestamps)
+            running_min = numpy.minimum.accumulate(timestamps[::-1])[::-1]
+        else:
+            timestamps = array.array('l', (t + shift for t in timestamps))
+            running_max, m = array.array('l'), None
+            for timestamp in timestamps:
+                m = timestamp if m is None else max(m, timestamp)
+                running_max.append(m)
+            running_min, m = array.array('l'), None
+            for timestamp in reversed(timestamps):
+                m = timestamp if m is None else min(m, timestamp)
+                running_min.append(m)
+            running_min.reverse()
+        return self.Segment(raw, timestamps, running_max, running_min)
+
+
+class PacketCache(object):
+    """
+    Bounded least recently used cache of parsed `RTPPacket`s keyed by their
+    position, e.g. `(part, pkt)` of an `RTPCursor`, so that re-visiting a
+    packet (backward searches, `RTPCursor.restoring` blocks, etc.) doesn't
+    re-read and re-parse it.
+
+    It holds at most `count` packets and, when given, `size` bytes of them.
+    Lookups are counted as `hits` and `misses` and packets dropped to make
+    room as `evictions`.
+
+    Hits return the cached packet itself rather than a copy, so callers must
+    not modify packets it returns.
+    """
+
+    # Default maximum number of cached packets.
+    count = 256
+
+    # Default maximum number of cached bytes, None for no limit.
+    size = None
+
+    def __init__(self, count=None, size=None):
+        """
+        :param count: Overrides the default `count`, 0 disables caching.
+
+        :param size: Overrides the default `size`.
+
+        """
+        if count is not None:
+            self.count = count
+        if size is not None:
+            self.size = size
+        self.pkts = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, load):
+        """
+        Gets packet at `key`, calling `load()` to read it when not cached.
+
+        :param load: Call-able returning a tuple of the packet and its size
+            in bytes.
+
+        :returns: The packet.
+        """
+        value = self.pkts.pop(key, None)
+        if value is not None:
+            self.hits += 1
+            self.pkts[key] = value
+            return value[0]
+        self.misses += 1
+        pkt, size = load()
+        if self.count > 0 and (self.size is None or size <= self.size):
+            self.pkts[key] = pkt, size
+            self.bytes += size
+            self._evict()
+        return pkt
+
+    def clear(self):
+        self.pkts.clear()
+        self.bytes = 0
+
+    def copy(self):
+        """
+        Creates an empty cache w/ the same limits.
+        """
+        return type(self)(count=self.count, size=self.size)
+
+    def _evict(self):
+        while (len(self.pkts) > self.count or
+               (self.size is not None and self.bytes > self.size)):
+            _, (_, size) = self.pkts.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.pkts)
+
+
+def _bisect(lo, hi, pred):
+    # first in [lo, hi) for which pred goes from False to True, or hi
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if pred(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def open_reader(*args, **kwargs):
+    """
+    Opens a `RTPPacketReader` by extension, see `RTPPacketReader.open`.
+    Unlike that bound class method it's pickle-able, so can be the part type
+    of `RTPCursor`s indexed or computed on a process pool.
+    """
+    return RTPPacketReader.open(*args, **kwargs)
+
+
+def index_part((part_type, file, part_kwargs)):
+    """
+    Builds `index.PacketIndex` for a `RTPCursor` part, see
+    `RTPCursor.index_parts`.
+    """
+    return part_type(file, **part_kwargs).packet_index()
+
+
+def compute_part((part_type, file, part_kwargs, order, m, r, zero)):
+    """
+    Map-reduces all packets of a `RTPCursor` part, see
+    `RTPCursor.compute`.
+    """
+    cur = RTPCursor([file], part_type, order=order, **part_kwargs)
+    return reduce(r, (m(pkt) for pkt in cur), zero)
+
+
+def packet_order(idx, key):
+    """
+    Orders rows of an `index.PacketIndex` by `key`, one of:
+
+    - "seq", extended rtp sequence number
+    - "timestamp", extended rtp timestamp
+
+    The ordering is stable and kept in (and reused from) `idx.orders`. Once
+    rows are added to `idx` only those are sorted and merged into it.
+
+    :returns: Permutation of `idx` rows as an `array.array`.
+    """
+    order = idx.orders.get(key)
+    if order is not None and len(order) == len(idx):
+        return order
+    if key == 'seq':
+        values = unwrap_timestamps(idx.seq, bits=16)
+    elif key == 'timestamp':
+        values = unwrap_timestamps(idx.timestamp)
+    else:
+        raise ValueError('Unsupported order "{0}".'.format(key))
+    if order is not None and len(order) < len(idx):
+        # NOTE: rows are only ever appended, so earlier ones keep their order
+        order = _merge_order(order, values)
+    elif numpy is not None:
+        order = array.array(
+            index.ORDER_TYPECODE,
+            numpy.argsort(values, kind='mergesort').astype(numpy.int64).tostring(),
+        )
+    else:
+        order = array.array(
+            index.ORDER_TYPECODE,
+            sorted(xrange(len(values)), key=values.__getitem__),
+        )
+    idx.orders[key] = order
+    return order
+
+
+def _merge_order(order, values):
+    """
+    Extends stable `order` of leading `values` to all of them by sorting the
+    trailing ones and merging those in, ties going to the earlier row.
+    """
+    start = len(order)
+    if numpy is not None:
+        old = _column(order)
+        new = start + numpy.argsort(values[start:], kind='mergesort')
+        at = numpy.searchsorted(values[old], values[new], side='right')
+        merged = numpy.insert(old, at, new)
+        return array.array(
+            index.ORDER_TYPECODE, merged.astype(numpy.int64).tostring(),
+        )
+    new = sorted(xrange(start, len(values)), key=values.__getitem__)
+    return array.array(index.ORDER_TYPECODE, (
+        row for _, row in heapq.merge(
+            ((values[row], row) for row in order),
+            ((values[row], row) for row in new),
+        )
+    ))
+
+
+def unwrap_timestamps(timestamps, bits=32, max_jump=None):
+    """
+    Extends `bits` wide rtp timestamps to 64 bits assuming consecutive ones
+    are less than half that range apart, so that they don't wrap around.
+
+    If `max_jump` is given, consecutive timestamps further apart than it are
+    assumed to be a reset (e.g. by a restarted gateway) and joined by reusing
+    the preceding (non-negative) delta in place of theirs.
+
+    :returns: `numpy` array of extended timestamps if it's installed,
+        otherwise an `array.array`.
+    """
+    period, half = 1 << bits, 1 << (bits - 1)
+    if numpy is not None:
+        timestamps = _column(timestamps).astype(numpy.int64)
+        if not len(timestamps):
+            return timestamps
+        deltas = (numpy.diff(timestamps) + half) % period - half
+        if max_jump is not None:
+            joined = numpy.abs(deltas) <= max_jump
+            prev = numpy.maximum.accumulate(
+                numpy.where(joined, numpy.arange(len(deltas)), -1)
+            )
+            prev = numpy.where(prev >= 0, deltas[prev], 0).clip(min=0)
+            deltas = numpy.where(joined, deltas, prev)
+        extended = numpy.empty_like(timestamps)
+        extended[0] = timestamps[0]
+        numpy.cumsum(deltas, out=extended[1:])
+        extended[1:] += timestamps[0]
+        return extended
+    extended, prev, value, last = array.array('l'), None, None, 0
+    for timestamp in timestamps:
+        if prev is None:
+            value = timestamp
+        else:
+            delta = (timestamp - prev + half) % period - half
+            if max_jump is not None:
+                if abs(delta) > max_jump:
+                    delta = max(last, 0)
+                else:
+                    last = delta
+            value += delta
+        extended.append(value)
+        prev = timestamp
+    return extended
+
+
+def _column(values):
+    if numpy is None or isinstance(values, numpy.ndarray):
+        return values
+    if isinstance(values, array.array):
+        if not len(values):
+            return numpy.zeros(0, dtype=values.typecode)
+        return numpy.frombuffer(values, dtype=values.typecode)
+    return numpy.asarray(values)
+
+
+def lazy(packet_type):
+    """
+    Creates (or gets previously created) variant of `packet_type` w/
+    `LazyRTPPacketMixin`.
+    """
+    if issubclass(packet_type, LazyRTPPacketMixin):
+        return packet_type
+    if packet_type not in lazy_packet_types:
+        lazy_packet_types[packet_type] = type(
+            'Lazy' + packet_type.__name__,
+            (LazyRTPPacketMixin, packet_type),
+            {'__module__': packet_type.__module__, 'eager_type': packet_type},
+        )
+    return lazy_packet_types[packet_type]
+
+
+def _lazy_packet(eager_type):
+    return lazy(eager_type)()
+
+
+# `RTPPacket` types to their `lazy` variants.
+lazy_packet_types = {}
+
+
+def view(buf, begin, end=None):
+    """
+    Slices `buf`. If it's a `buffer` (e.g. of an `mmap.mmap`) the slice is
+    another `buffer` referencing the same memory rather than a copy.
+    """
+    if isinstance(buf, buffer):
+        if end is None:
+            return buffer(buf, begin)
+        return buffer(buf, begin, end - begin)
+    return buf[begin:end]
+
+
+class ReorderedPackets(collections.Iterator):
+    """
+    Reorders `RTPPacket`s by their (extended) sequence number as they stream
+    through, e.g. from an `RTPPacketReader` to `frame.Frames`, so memory is
+    bounded by:
+
+    - `window`, the number of packets held back and/or
+    - `duration`, the time in seconds spanned by packets held back
+
+    Packets are emitted as soon as they're next in sequence, otherwise when
+    held back for too long. Ones arriving after a later one was emitted are
+    dropped as late and repeated ones (held or recently emitted) are dropped
+    as duplicates. Counts of both are kept in `late` and `duplicates`.
+
+    A `duration` needs the packets' `clock_rate`, which if not given is that
+    of `packets.packet_type` (e.g. of an `RTPPacketReader` or `RTPCursor`).
+    """
+
+    # Number of emitted sequence numbers remembered to detect duplicates.
+    history = 1024
+
+    def __init__(self, packets, window=64, duration=None, clock_rate=None):
+        if window is None and duration is None:
+            raise ValueError('Missing window= and/or duration=.')
+        if clock_rate is None:
+            clock_rate = getattr(
+                getattr(packets, 'packet_type', None), 'clock_rate', None,
+            )
+        if duration is not None and not clock_rate:
+            raise ValueError('Missing clock_rate= for duration={0}.'.format(duration))
+        self.packets = iter(packets)
+        self.window = window
+        self.duration = duration
+        self.clock_rate = clock_rate
+        self.heap = []
+        self.held = set()
+        self.emitted = collections.deque()
+        self.recent = set()
+        self.highest = None
+        self.newest = None
+        self.last = None
+        self.late = 0
+        self.duplicates = 0
+        self.exhausted = False
+
+    def _extend(self, seq):
+        if self.highest is None:
+            return seq
+        return self.highest + ((seq - self.highest + 0x8000) & 0xffff) - 0x8000
+
+    def _push(self, pkt):
+        seq = self._extend(pkt.header.seq_number)
+        if seq in self.held or seq in self.recent:
+            logger.debug('dropping duplicate packet %s', pkt.header.seq_number)
+            self.duplicates += 1
+            return
+        if self.last is not None and seq <= self.last:
+            logger.debug('dropping late packet %s', pkt.header.seq_number)
+            self.late += 1
+            return
+        if self.highest is None or seq > self.highest:
+            self.highest, self.newest = seq, pkt
+        heapq.heappush(self.heap, (seq, pkt))
+        self.held.add(seq)
+
+    def _pop(self):
+        seq, pkt = heapq.heappop(self.heap)
+        self.held.remove(seq)
+        self.last = seq
+        self.emitted.append(seq)
+        self.recent.add(seq)
+        if len(self.emitted) > self.history:
+            self.recent.remove(self.emitted.popleft())
+        return pkt
+
+    def _is_due(self):
+        seq, pkt = self.heap[0]
+        if self.last is not None and seq == self.last + 1:
+            return True
+        if self.window is not None and len(self.heap) > self.window:
+            return True
+        if self.duration is not None:
+            delta = (
+                (self.newest.header.timestamp - pkt.header.timestamp + 0x80000000)
+                & 0xffffffff
+            ) - 0x80000000
+            if delta / self.clock_rate > self.duration:
+                return True
+        return False
+
+    # collections.Iterator
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while not self.exhausted:
+            if self.heap and self._is_due():
+                return self._pop()
+            try:
+                pkt = self.packets.next()
+            except StopIteration:
+                self.exhausted = True
+                break
+            self._push(pkt)
+        if not self.heap:
+            raise StopIteration()
+        return self._pop()
+
+
+# Statistics of a stream of `RTPPacket`s, see `stream_stats`. Times are in
+# seconds and `jitter` (RFC 3550 interarrival jitter) is None w/o arrival
+# times as are `frames`, `complete_frames` and `key_frames` for payloads w/o
+# framing (e.g. audio).
+StreamStats = collections.namedtuple('StreamStats', [
+    'count',
+    'bytes',
+    'expected',
+    'lost',
+    'duplicates',
+    'reordered',
+    'reorder_depth',
+    'jitter',
+    'duration',
+    'timestamp_gaps',
+    'max_timestamp_gap',
+    'frames',
+    'complete_frames',
+    'key_frames',
+])
+
+
+def stream_stats(packets, clock_rate=None, gap=1.0):
+    """
+    Computes `StreamStats` for `packets` in a single pass. Each is either an
+    `RTPPacket` or an (arrival secs, `RTPPacket`) tuple, e.g. as iterated by
+    `pcap.PCapRTPPacketReader.arrivals`, in which case jitter is computed
+    too.
+
+    :param clock_rate: Defaults to that of the first packet.
+
+    :param gap: Consecutive packets w/ timestamps further apart than this
+        many seconds count as a timestamp gap.
+
+    """
+    s = None
+    for pkt in packets:
+        if isinstance(pkt, tuple):
+            arrival, pkt = pkt
+        else:
+            arrival = None
+        if s is None:
+            s = _StreamStats(
+                clock_rate or getattr(pkt, 'clock_rate', None),
+                getattr(pkt.data, 'is_start_of_frame', None) is not None,
+                gap,
+            )
+        s.add(
+            pkt.header.seq_number,
+            pkt.header.timestamp,
+            pkt.size,
+            index.packet_flags(pkt),
+            arrival,
+        )
+    if s is None:
+        # NOTE: no packets so nothing to time
+        s = _StreamStats(clock_rate or 1, False, gap)
+    return s.result()
+
+
+def index_stats(idx, packet_type, gap=1.0):
+    """
+    Computes `StreamStats` (w/o jitter) for packets of an
+    `index.PacketIndex` in a single pass over its rows rather than its
+    packets. They're kept in (and reused from) `idx.meta` until rows are
+    added to `idx`.
+    """
+    cached = idx.meta.get('stats')
+    if cached and cached['count'] == len(idx) and cached['gap'] == gap:
+        return StreamStats(**cached['stats'])
+    s = _StreamStats(
+        getattr(packet_type, 'clock_rate', None),
+        getattr(packet_type.payload_type, 'is_start_of_frame', None) is not None,
+        gap,
+    )
+    for row in xrange(len(idx)):
+        s.add(
+            idx.seq[row],
+            idx.timestamp[row],
+            idx.size[row],
+            idx.flags[row],
+            None,
+        )
+    stats = s.result()
+    idx.meta['stats'] = {
+        'count': len(idx),
+        'gap': gap,
+        'stats': stats._asdict(),
+    }
+    return stats
+
+
+class _StreamStats(object):
+
+    # Number of sequence numbers remembered to detect duplicates.
+    history = 1024
+
+    # Number of frames (i.e. timestamps) tracked until complete.
+    max_frames = 32
+
+    def __init__(self, clock_rate, framed, gap):
+        if not clock_rate:
+            raise ValueError('Invalid clock rate {0}.'.format(clock_rate))
+        self.clock_rate = clock_rate
+        self.framed = framed
+        self.gap = gap * clock_rate
+        self.count = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.reorder_depth = 0
+        self.lowest = self.highest = None
+        self.seen, self.recent = collections.deque(), set()
+        self.timestamp = self.min_timestamp = self.max_timestamp = None
+        self.timestamp_gaps = 0
+        self.max_timestamp_gap = 0
+        self.transit = None
+        self.jitter = None
+        self.open_frames = collections.OrderedDict()
+        self.frames = self.complete_frames = self.key_frames = 0
+
+    def add(self, seq, timestamp, size, flags, arrival):
+        # sequence
+        if self.highest is not None:
+            seq = (
+                self.highest + ((seq - self.highest + 0x8000) & 0xffff) - 0x8000
+            )
+        if seq in self.recent:
+            self.duplicates += 1
+            return
+        self.seen.append(seq)
+        self.recent.add(seq)
+        if len(self.seen) > self.history:
+            self.recent.remove(self.seen.popleft())
+        self.count += 1
+        self.bytes += size
+        if self.highest is None:
+            self.lowest = self.highest = seq
+        elif seq < self.highest:
+            self.reordered += 1
+            self.reorder_depth = max(self.reorder_depth, self.highest - seq)
+            self.lowest = min(self.lowest, seq)
+        else:
+            self.highest = seq
+
+        # timestamp
+        if self.timestamp is not None:
+            delta = ((timestamp - self.timestamp + 0x80000000) & 0xffffffff) - 0x80000000
+            timestamp = self.timestamp + delta
+            if delta > self.gap:
+                self.timestamp_gaps += 1
+            self.max_timestamp_gap = max(self.max_timestamp_gap, delta)
+            self.min_timestamp = min(self.min_timestamp, timestamp)
+            self.max_timestamp = max(self.max_timestamp, timestamp)
+        else:
+            self.min_timestamp = self.max_timestamp = timestamp
+        self.timestamp = timestamp
+
+        # jitter, see https://tools.ietf.org/html/rfc3550#appendix-A.8
+        if arrival is not None:
+            transit = arrival * self.clock_rate - timestamp
+            if self.transit is not None:
+                if self.jitter is None:
+                    self.jitter = 0.0
+                self.jitter += (abs(transit - self.transit) - self.jitter) / 16
+            self.transit = transit
+
+        # frames
+        if self.framed:
+            frame = self.open_frames.get(timestamp)
+            if frame is None:
+                frame = self.open_frames[timestamp] = [None, None, 0, False]
+                if len(self.open_frames) > self.max_frames:
+                    self._close_frame(self.open_frames.popitem(last=False)[1])
+            if flags & index.FLAG_START_OF_FRAME:
+                frame[0] = seq
+                frame[3] = bool(flags & index.FLAG_KEY_FRAME)
+            if flags & index.FLAG_MARKER:
+                frame[1] = seq
+            frame[2] += 1
+
+    def _close_frame(self, (first, last, count, is_key_frame)):
+        if first is None:
+            return
+        self.frames += 1
+        if is_key_frame:
+            self.key_frames += 1
+        if last is not None and last - first + 1 == count:
+            self.complete_frames += 1
+
+    def result(self):
+        for frame in self.open_frames.itervalues():
+            self._close_frame(frame)
+        self.open_frames.clear()
+        expected = (
+            self.highest - self.lowest + 1 if self.highest is not None else 0
+        )
+        return StreamStats(
+            count=self.count,
+            bytes=self.bytes,
+            expected=expected,
+            lost=max(expected - self.count, 0),
+            duplicates=self.duplicates,
+            reordered=self.reordered,
+            reorder_depth=self.reorder_depth,
+            jitter=(
+                self.jitter / self.clock_rate
+                if self.jitter is not None else None
+            ),
+            duration=(
+                (self.max_timestamp - self.min_timestamp) / self.clock_rate
+                if self.count else 0
+            ),
+            timestamp_gaps=self.timestamp_gaps,
+            max_timestamp_gap=(
+                self.max_timestamp_gap / self.clock_rate if self.count else 0
+            ),
+            frames=self.frames if self.framed else None,
+            complete_frames=self.complete_frames if self.framed else None,
+            key_frames=self.key_frames if self.framed else None,
+        )
+
+
 def head_packets(packets, count=None, duration=None):
     """
     Iterator for first n packets where n is capped by a:
@@ -1032,8 +3089,11 @@ def probe_video_dimensions(packets):
 def estimate_video_frame_rate(packets, window=10, min_window=10):
     """
     Finds `window` start-of-frame packets and uses their timestamps to estimate
-    video frame rate. 
+    video frame rate. An `RTPPacketTable` is estimated from its first
+    start-of-frame packets w/o reading any.
     """
+    if isinstance(packets, RTPPacketTable):
+        return packets.frame_rate(window=window, min_window=min_window)
     ts = []
     for pkt in packets:
         if pkt.data.is_start_of_frame:
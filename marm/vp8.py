@@ -1,12 +1,20 @@
 from __future__ import division
 
-import ctypes
 import StringIO
+import struct
 
 from . import rtp
 
 
 class VP8RTPPayload(rtp.RTPVideoPayloadMixin, rtp.RTPPayload):
+    """
+    https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
+
+    Unpacking only measures the descriptor, its `desc*` fields are decoded
+    when first accessed.
+    """
+
+    __slots__ = ('_raw', '_desc', '_desc_x', '_desc_i', '_desc_l', '_desc_tk', 'data')
 
     def __init__(self, *args, **kwargs):
         if args:
@@ -19,6 +27,7 @@ class VP8RTPPayload(rtp.RTPVideoPayloadMixin, rtp.RTPPayload):
             if len(kwargs) == 1 and 'buf' in kwargs:
                 self.unpack(kwargs['buf'])
             else:
+                self._raw = None
                 self.desc = VP8RTPPayloadDescriptor()
                 self.desc_x = VP8RTPPayloadDescriptorX()
                 self.desc_i = VP8RTPPayloadDescriptorI()
@@ -35,8 +44,7 @@ class VP8RTPPayload(rtp.RTPVideoPayloadMixin, rtp.RTPPayload):
         # NOTE: part of frame data so we don't unpack
         if not self.is_start_of_frame:
             raise ValueError('Not start of frame.')
-        b = self.data[:ctypes.sizeof(VP8Header)]
-        return VP8Header.from_buffer_copy(b)
+        return VP8Header.from_buffer_copy(self.data)
 
     @property
     def key_header(self):
@@ -45,8 +53,67 @@ class VP8RTPPayload(rtp.RTPVideoPayloadMixin, rtp.RTPPayload):
             raise ValueError('Not start of frame.')
         if not self.header.is_key_frame:
             raise ValueError('Not key frame.')
-        b = self.data[ctypes.sizeof(VP8Header):ctypes.sizeof(VP8Header) + ctypes.sizeof(VP8KeyFrameHeader)]
-        return VP8KeyFrameHeader.from_buffer_copy(b)
+        return VP8KeyFrameHeader.from_buffer_copy(self.data, VP8Header._size_)
+
+    @property
+    def desc(self):
+        if self._raw is not None:
+            self._decode()
+        return self._desc
+
+    @desc.setter
+    def desc(self, value):
+        if self._raw is not None:
+            self._decode()
+        self._desc = value
+
+    @property
+    def desc_x(self):
+        if self._raw is not None:
+            self._decode()
+        return self._desc_x
+
+    @desc_x.setter
+    def desc_x(self, value):
+        if self._raw is not None:
+            self._decode()
+        self._desc_x = value
+
+    @property
+    def desc_i(self):
+        if self._raw is not None:
+            self._decode()
+        return self._desc_i
+
+    @desc_i.setter
+    def desc_i(self, value):
+        if self._raw is not None:
+            self._decode()
+        self._desc_i = value
+
+    @property
+    def desc_l(self):
+        if self._raw is not None:
+            self._decode()
+        return self._desc_l
+
+    @desc_l.setter
+    def desc_l(self, value):
+        if self._raw is not None:
+            self._decode()
+        self._desc_l = value
+
+    @property
+    def desc_tk(self):
+        if self._raw is not None:
+            self._decode()
+        return self._desc_tk
+
+    @desc_tk.setter
+    def desc_tk(self, value):
+        if self._raw is not None:
+            self._decode()
+        self._desc_tk = value
 
     # rtp.RTPPayload
 
@@ -55,160 +122,293 @@ class VP8RTPPayload(rtp.RTPVideoPayloadMixin, rtp.RTPPayload):
             fo, value = StringIO.StringIO(), True
         else:
             value = False
-        fo.write(buffer(self.desc))
+        if self._raw is not None:
+            fo.write(self._raw)
+        else:
+            fo.write(self.desc.pack())
+            if self.desc.x:
+                fo.write(self.desc_x.pack())
+            if self.desc_x and self.desc_x.i:
+                fo.write(self.desc_i.pack())
+            if self.desc_x and self.desc_x.l:
+                fo.write(self.desc_l.pack())
+            if self.desc_x and (self.desc_x.t or self.desc_x.k):
+                fo.write(self.desc_tk.pack())
+        fo.write(self.data)
+        if value:
+            return fo.getvalue()
+
+    @property
+    def size(self):
+        if self._raw is not None:
+            return len(self._raw) + len(self.data)
+        size = self.desc._size_
         if self.desc.x:
-            fo.write(buffer(self.desc_x))
+            size += self.desc_x._size_
         if self.desc_x and self.desc_x.i:
-            fo.write(buffer(self.desc_i))
+            size += self.desc_i.size
         if self.desc_x and self.desc_x.l:
-            fo.write(buffer(self.desc_l))
+            size += self.desc_l._size_
         if self.desc_x and (self.desc_x.t or self.desc_x.k):
-            fo.write(buffer(self.desc_tk))
-        fo.write(self.data)
-        if value:
-            return fo.getvalue()
+            size += self.desc_tk._size_
+        return size + len(self.data)
 
     def unpack(self, buf):
+        # descriptor size, see `_decode`
+        try:
+            b = ord(buf[0])
+            offset = 1
+            if b & 0x80:
+                x = ord(buf[offset])
+                offset += 1
+                if x & 0x80:
+                    offset += 2 if ord(buf[offset]) & 0x80 else 1
+                if x & 0x40:
+                    offset += 1
+                if x & 0x30:
+                    offset += 1
+        except IndexError:
+            raise ValueError('Buffer size too small ({0} bytes) for descriptor.'.format(len(buf)))
+        if len(buf) < offset:
+            raise ValueError('Buffer size too small ({0} instead of at least {1} bytes)'.format(len(buf), offset))
+
+        self._raw = str(buf[:offset])
+        self.data = rtp.view(buf, offset)
+
+    def __getstate__(self):
+        # NOTE: descriptors are unset until decoded, buffers aren't pickle-able
+        return tuple(
+            str(value) if isinstance(value, buffer) else value
+            for value in (
+                getattr(self, name, None) for name in VP8RTPPayload.__slots__
+            )
+        )
+
+    def __setstate__(self, state):
+        for name, value in zip(VP8RTPPayload.__slots__, state):
+            setattr(self, name, value)
+
+    # RTPVideoMixin
+
+    @property
+    def is_start_of_frame(self):
+        if self._raw is not None:
+            # s == 1 and pid == 0
+            return (ord(self._raw[0]) & 0x1f) == 0x10
+        return self._desc.s == 1 and self._desc.pid == 0
+
+    @property
+    def is_key_frame(self):
+        if not self.is_start_of_frame:
+            return False
+        if len(self.data) < VP8Header._size_:
+            raise ValueError('Buffer size too small ({0} instead of at least {1} bytes)'.format(
+                len(self.data), VP8Header._size_
+            ))
+        # NOTE: same as header.is_key_frame w/o unpacking it
+        return not ord(self.data[0]) & 0x01
+
+    @property
+    def width(self):
+        return self.key_header.width
+
+    @property
+    def height(self):
+        return self.key_header.height
+
+    # internals
+
+    def _decode(self):
+        buf, self._raw = self._raw, None
+
         # descriptor
         desc = VP8RTPPayloadDescriptor.from_buffer_copy(buf)
-        buf = buf[ctypes.sizeof(desc):]
+        offset = desc._size_
 
         # descriptor x
         if desc.x:
-            desc_x = VP8RTPPayloadDescriptorX.from_buffer_copy(buf)
-            buf = buf[ctypes.sizeof(desc_x):]
+            desc_x = VP8RTPPayloadDescriptorX.from_buffer_copy(buf, offset)
+            offset += desc_x._size_
         else:
             desc_x = None
 
         # descriptor i
         if desc_x and desc_x.i:
-            desc_i = VP8RTPPayloadDescriptorI.from_buffer_copy(buf)
-            buf = buf[desc_i.size:]
+            desc_i = VP8RTPPayloadDescriptorI.from_buffer_copy(buf, offset)
+            offset += desc_i.size
         else:
             desc_i = None
 
         # descriptor l
         if desc_x and desc_x.l:
-            desc_l = VP8RTPPayloadDescriptorL.from_buffer_copy(buf)
-            buf = buf[ctypes.sizeof(desc_l):]
+            desc_l = VP8RTPPayloadDescriptorL.from_buffer_copy(buf, offset)
+            offset += desc_l._size_
         else:
             desc_l = None
 
         # descriptor tk
         if desc_x and (desc_x.t or desc_x.k):
-            desc_tk = VP8RTPPayloadDescriptorTK.from_buffer_copy(buf)
-            buf = buf[ctypes.sizeof(desc_tk):]
+            desc_tk = VP8RTPPayloadDescriptorTK.from_buffer_copy(buf, offset)
+            offset += desc_tk._size_
         else:
             desc_tk = None
 
-        # data
-        data = buf
-
-        self.desc = desc
-        self.desc_x = desc_x
-        self.desc_i = desc_i
-        self.desc_l = desc_l
-        self.desc_tk = desc_tk
-        self.data = data
-
-    # RTPVideoMixin
-
-    @property
-    def is_start_of_frame(self):
-        return self.desc.s == 1 and self.desc.pid == 0
-
-    @property
-    def is_key_frame(self):
-        return self.header.is_key_frame if self.is_start_of_frame else False
-
-    @property
-    def width(self):
-        return self.key_header.width
-
-    @property
-    def height(self):
-        return self.key_header.height
+        self._desc = desc
+        self._desc_x = desc_x
+        self._desc_i = desc_i
+        self._desc_l = desc_l
+        self._desc_tk = desc_tk
 
 
-class VP8RTPPayloadDescriptor(ctypes.BigEndianStructure):
+class VP8RTPPayloadDescriptor(rtp.BitFields):
     """
     https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
     """
 
-    _fields_ = [
-        ('x', ctypes.c_uint8, 1),
-        ('r', ctypes.c_uint8, 1),
-        ('n', ctypes.c_uint8, 1),
-        ('s', ctypes.c_uint8, 1),
-        ('pid', ctypes.c_uint8, 4),
-    ]
+    __slots__ = ('x', 'r', 'n', 's', 'pid')
+
+    _size_ = 1
+
+    def _unpack(self, buf, offset):
+        b = ord(buf[offset])
+        self.x = b >> 7
+        self.r = (b >> 6) & 0x01
+        self.n = (b >> 5) & 0x01
+        self.s = (b >> 4) & 0x01
+        self.pid = b & 0x0f
+
+    def pack(self):
+        return chr(
+            ((self.x & 0x01) << 7) |
+            ((self.r & 0x01) << 6) |
+            ((self.n & 0x01) << 5) |
+            ((self.s & 0x01) << 4) |
+            (self.pid & 0x0f)
+        )
 
 
-class VP8RTPPayloadDescriptorX(ctypes.BigEndianStructure):
+class VP8RTPPayloadDescriptorX(rtp.BitFields):
     """
     https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
     """
 
-    _fields_ = [
-        ('i', ctypes.c_uint8, 1),
-        ('l', ctypes.c_uint8, 1),
-        ('t', ctypes.c_uint8, 1),
-        ('k', ctypes.c_uint8, 1),
-        ('rsv', ctypes.c_uint8, 4),
-    ]
+    __slots__ = ('i', 'l', 't', 'k', 'rsv')
+
+    _size_ = 1
+
+    def _unpack(self, buf, offset):
+        b = ord(buf[offset])
+        self.i = b >> 7
+        self.l = (b >> 6) & 0x01
+        self.t = (b >> 5) & 0x01
+        self.k = (b >> 4) & 0x01
+        self.rsv = b & 0x0f
+
+    def pack(self):
+        return chr(
+            ((self.i & 0x01) << 7) |
+            ((self.l & 0x01) << 6) |
+            ((self.t & 0x01) << 5) |
+            ((self.k & 0x01) << 4) |
+            (self.rsv & 0x0f)
+        )
 
 
-class VP8RTPPayloadDescriptorI(ctypes.BigEndianStructure):
+class VP8RTPPayloadDescriptorI(rtp.BitFields):
     """
     https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
     """
 
-    _fields_ = [
-        ('m', ctypes.c_uint8, 1),
-        ('pictureid0', ctypes.c_uint8, 7),
-        ('pictureid1', ctypes.c_uint8, 8),
-    ]
+    __slots__ = ('m', 'pictureid0', 'pictureid1')
+
+    _size_ = 1
+
+    def _unpack(self, buf, offset):
+        b = ord(buf[offset])
+        self.m = b >> 7
+        self.pictureid0 = b & 0x7f
+        if len(buf) - offset > 1:
+            self.pictureid1 = ord(buf[offset + 1])
+        elif self.m:
+            raise ValueError('Buffer size too small (1 instead of at least 2 bytes)')
+        else:
+            self.pictureid1 = 0
+
+    def pack(self):
+        b = chr(((self.m & 0x01) << 7) | (self.pictureid0 & 0x7f))
+        if self.m:
+            b += chr(self.pictureid1 & 0xff)
+        return b
 
     @property
     def size(self):
-        return ctypes.sizeof(self) - (0 if self.m else 1)
+        return 2 if self.m else 1
 
 
-class VP8RTPPayloadDescriptorL(ctypes.BigEndianStructure):
+class VP8RTPPayloadDescriptorL(rtp.BitFields):
     """
     https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
     """
 
-    _fields_ = [
-        ('tl0picidx', ctypes.c_uint8, 8),
-    ]
+    __slots__ = ('tl0picidx',)
+
+    _size_ = 1
+
+    def _unpack(self, buf, offset):
+        self.tl0picidx = ord(buf[offset])
+
+    def pack(self):
+        return chr(self.tl0picidx & 0xff)
 
 
-class VP8RTPPayloadDescriptorTK(ctypes.BigEndianStructure):
+class VP8RTPPayloadDescriptorTK(rtp.BitFields):
     """
     https://tools.ietf.org/html/draft-ietf-payload-vp8-16#section-4.2
     """
 
-    _fields_ = [
-        ('tid', ctypes.c_uint8, 3),
-        ('y', ctypes.c_uint8, 1),
-        ('keyidx', ctypes.c_uint8, 4),
-    ]
+    __slots__ = ('tid', 'y', 'keyidx')
 
+    _size_ = 1
 
-class VP8Header(ctypes.LittleEndianStructure):
+    def _unpack(self, buf, offset):
+        b = ord(buf[offset])
+        self.tid = b >> 5
+        self.y = (b >> 4) & 0x01
+        self.keyidx = b & 0x0f
+
+    def pack(self):
+        return chr(
+            ((self.tid & 0x07) << 5) |
+            ((self.y & 0x01) << 4) |
+            (self.keyidx & 0x0f)
+        )
+
+
+class VP8Header(rtp.BitFields):
     """
     https://tools.ietf.org/html/rfc6386#section-9.1
     """
 
-    _fields_ = [
-        ('p', ctypes.c_uint8, 1),
-        ('ver', ctypes.c_uint8, 3),
-        ('show', ctypes.c_uint8, 1),
-        ('size0', ctypes.c_uint8, 3),
-        ('size1', ctypes.c_uint8),
-        ('size2', ctypes.c_uint8),
-    ]
+    __slots__ = ('p', 'ver', 'show', 'size0', 'size1', 'size2')
+
+    _size_ = 3
+
+    def _unpack(self, buf, offset):
+        b = ord(buf[offset])
+        self.p = b & 0x01
+        self.ver = (b >> 1) & 0x07
+        self.show = (b >> 4) & 0x01
+        self.size0 = b >> 5
+        self.size1 = ord(buf[offset + 1])
+        self.size2 = ord(buf[offset + 2])
+
+    def pack(self):
+        return chr(
+            (self.p & 0x01) |
+            ((self.ver & 0x07) << 1) |
+            ((self.show & 0x01) << 4) |
+            ((self.size0 & 0x07) << 5)
+        ) + chr(self.size1 & 0xff) + chr(self.size2 & 0xff)
 
     @property
     def is_key_frame(self):
@@ -219,23 +419,35 @@ class VP8Header(ctypes.LittleEndianStructure):
         return self.size0 + (self.size1 << 3) + (self.size2 << 11)
 
 
-class VP8KeyFrameHeader(ctypes.LittleEndianStructure):
+class VP8KeyFrameHeader(rtp.BitFields):
     """
     https://tools.ietf.org/html/rfc6386#section-9.1
     """
 
-    _pack_ = 1
+    __slots__ = ('start_code0', 'start_code1', 'start_code2', 'horz', 'vert')
+
+    _size_ = 7
 
-    _fields_ = [
-        ('start_code0', ctypes.c_uint8),
-        ('start_code1', ctypes.c_uint8),
-        ('start_code2', ctypes.c_uint8),
-        ('horz', ctypes.c_uint16),
-        ('vert', ctypes.c_uint16),
-    ]
+    _struct = struct.Struct('<BBBHH')
 
     sync_code = (0x9d, 0x01, 0x2a)
 
+    def _unpack(self, buf, offset):
+        (self.start_code0,
+         self.start_code1,
+         self.start_code2,
+         self.horz,
+         self.vert) = self._struct.unpack_from(buf, offset)
+
+    def pack(self):
+        return self._struct.pack(
+            self.start_code0 & 0xff,
+            self.start_code1 & 0xff,
+            self.start_code2 & 0xff,
+            self.horz & 0xffff,
+            self.vert & 0xffff,
+        )
+
     @property
     def is_synced(self):
         return (
@@ -266,6 +478,8 @@ class VP8RTPPacket(rtp.RTPTimeMixin, rtp.RTPPacket):
     https://tools.ietf.org/html/draft-ietf-payload-vp8-16
     """
 
+    __slots__ = ()
+
     # RTPPacket
 
     type = rtp.RTPPacket.VIDEO_TYPE
@@ -34,6 +34,7 @@ ext_modules = [
     setuptools.Extension(
         'marm.ext',
         ['marm/ext/gen.c',
+         'marm/ext/mjr.c',
          'marm/ext/mux.c',
          'marm/ext/remux.c',
          'marm/ext/scan.c',
@@ -90,7 +91,6 @@ setuptools.setup(
     ext_modules=ext_modules,
     platforms='any',
     install_requires=[
-        'dpkt >=1.8,<2',
     ],
     tests_require=extras_require['test'],
     extras_require=extras_require,
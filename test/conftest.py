@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import multiprocessing.dummy
 import os
 import pprint
@@ -66,6 +67,13 @@ def pool():
     return multiprocessing.dummy.Pool(multiprocessing.cpu_count())
 
 
+@pytest.fixture()
+def process_pool(request):
+    pool = multiprocessing.Pool(2)
+    request.addfinalizer(pool.terminate)
+    return pool
+
+
 def probe(cur):
     if isinstance(cur, marm.rtp.RTPPacketReader):
         with cur.restoring():
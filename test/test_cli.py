@@ -1,6 +1,9 @@
+import json
+
 import pytest
 
 import marm.cli
+import marm.index
 
 
 @pytest.mark.parametrize(
@@ -39,6 +42,79 @@ def test_cli_split(
         ) == packets
 
 
+@pytest.mark.parametrize(
+    ('stored,mapping,out_format,sidecar,expected'), [
+        ('streets-of-rage.pcap', None, None, False, {
+            'streets-of-rage-3830765780-100.mjr': 1239,
+            'streets-of-rage-4286666423-111.mjr': 490,
+        }),
+        ('streets-of-rage.pcap', None, None, True, {
+            'streets-of-rage-3830765780-100.mjr': 1239,
+            'streets-of-rage-4286666423-111.mjr': 490,
+        }),
+        ('streets-of-rage.pcap', '100=vp8,111=opus', '{type}-{dst_port}.mra', True, {
+            'video-60401.mra': 1239,
+            'audio-60401.mra': 490,
+        }),
+    ]
+)
+def test_cli_demux(tmpdir, fixtures, stored, mapping, out_format, sidecar, expected):
+    src_path = fixtures.join(stored)
+
+    args = ['demux', src_path]
+    args.append(tmpdir.join(out_format) if out_format else tmpdir)
+    if mapping:
+        args.extend(['--map', mapping])
+    if sidecar:
+        args.append('--sidecar')
+    parsed = marm.cli.arg_parser.parse_args(map(str, args))
+    parsed.cmd(parsed)
+
+    assert dict(
+        (name, sum(1 for _ in marm.rtp.RTPPacketReader.open(tmpdir.join(name).strpath)))
+        for name in expected
+    ) == expected
+    assert all(
+        tmpdir.join(marm.index.sidecar_path(name)).check() ==
+        (sidecar and name.endswith('.mjr'))
+        for name in expected
+    )
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,pkt_filter,sidecar,count,lost'), [
+        ('sonic-a.mjr', 'opus', None, False, 5996, 4),
+        ('sonic-a.mjr', 'opus', None, True, 5996, 4),
+        ('streets-of-rage.pcap', 'opus', 'ssrc=4286666423', False, 490, 0),
+    ]
+)
+def test_cli_stats(
+        capsys, tmpdir, fixtures, stored, pkt_type, pkt_filter, sidecar, count, lost):
+    src_path = tmpdir.join(stored)
+    fixtures.join(stored).copy(src_path)
+
+    args = ['stats', pkt_type, src_path]
+    if pkt_filter:
+        args.extend(['--filter', pkt_filter])
+    if sidecar:
+        args.append('--sidecar')
+    parsed = marm.cli.arg_parser.parse_args(map(str, args))
+    parsed.cmd(parsed)
+
+    out, _ = capsys.readouterr()
+    line, = map(json.loads, out.splitlines())
+    assert line['path'] == src_path.strpath
+    assert line['count'] == count
+    assert line['lost'] == lost
+    assert (line['jitter'] is None) == (stored.endswith('.mjr'))
+    idx = marm.index.load_sidecar(
+        src_path.strpath, marm.cli.packet_types[pkt_type],
+    )
+    assert (idx is not None) == sidecar
+    if sidecar:
+        assert idx.meta['stats']['stats']['count'] == count
+
+
 @pytest.mark.parametrize(
     ('a_stored,a_type,a_filter,a_dur,v_stored,v_type,v_filter,v_dur,muxed'), [
         ('sonic-a.mjr', 'opus', None, 10.0,
@@ -26,3 +26,315 @@ def test_mjr_empty(fixtures, file_name, packet_type, expected):
     path = fixtures.join(file_name)
     mjr = marm.mjr.MJRRTPPacketReader(path.open('rb'), packet_type=packet_type)
     assert mjr.is_empty is expected
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket),
+    ]
+)
+def test_mjr_sidecar_index(tmpdir, fixtures, file_name, packet_type):
+    path = tmpdir.join(file_name)
+    fixtures.join(file_name).copy(path)
+    idx_path = tmpdir.join(file_name + marm.index.SIDECAR_EXT)
+
+    # opt-in
+    marm.mjr.MJRRTPPacketReader(path.strpath, packet_type=packet_type).packet_index()
+    assert not idx_path.check()
+
+    # build
+    mjr = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=True,
+    )
+    idx = mjr.packet_index()
+    assert idx_path.check()
+    assert len(idx) == sum(1 for _ in mjr)
+    for entry, pkt in zip(idx, mjr):
+        assert mjr.read_packet(entry.offset, entry.size).pack() == pkt.pack()
+        assert entry.seq == pkt.header.seq_number
+        assert entry.timestamp == pkt.header.timestamp
+
+    # load
+    loaded = marm.index.load_sidecar(path.strpath, packet_type)
+    assert loaded is not None
+    assert list(loaded) == list(idx)
+    assert loaded.end == idx.end
+
+    # stale
+    assert marm.index.load_sidecar(path.strpath, marm.rtp.RTPPacket) is None
+    path.setmtime(path.mtime() - 10)
+    assert marm.index.load_sidecar(path.strpath, packet_type) is None
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket),
+    ]
+)
+def test_mjr_mmap(tmpdir, fixtures, file_name, packet_type):
+    path = fixtures.join(file_name)
+    mjr = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=False,
+    )
+    mapped = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=False, mmap=True,
+    )
+    count = 0
+    for pkt, m_pkt in zip(mjr, mapped):
+        assert isinstance(m_pkt.data.data, buffer)
+        assert m_pkt.pack() == pkt.pack()
+        count += 1
+    assert count == sum(1 for _ in mjr)
+    idx = mapped.packet_index()
+    assert list(idx) == list(mjr.packet_index())
+    for entry, pkt in zip(idx, mjr):
+        assert mapped.read_packet(entry.offset, entry.size).pack() == pkt.pack()
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type,truncate', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 0),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 7),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 0),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 100),
+        ('empty.mjr', marm.vp8.VP8RTPPacket, 0),
+    ]
+)
+def test_mjr_scan(tmpdir, fixtures, file_name, packet_type, truncate):
+    path = tmpdir.join(file_name)
+    buf = fixtures.join(file_name).read('rb')
+    path.write(buf[:len(buf) - truncate], 'wb')
+
+    # scanned
+    mjr = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=False,
+    )
+    assert marm.mjr.scan_codec(packet_type) is not None
+    scanned = mjr.packet_index()
+
+    # unpacked
+    unpacked = marm.mjr.MJRRTPPacketReader(
+        path.strpath,
+        packet_type=packet_type,
+        packet_filter=lambda pkt: True,
+        sidecar=False,
+    ).packet_index()
+
+    assert list(scanned) == list(unpacked)
+    assert scanned.end == unpacked.end
+    if packet_type is marm.vp8.VP8RTPPacket and len(scanned):
+        flags = set(scanned.flags)
+        assert marm.index.FLAG_START_OF_FRAME in flags
+        assert marm.index.FLAG_START_OF_FRAME | marm.index.FLAG_KEY_FRAME in flags
+
+
+def test_mjr_scan_short_frame_header(tmpdir):
+    # start of frame w/ 0, 2 and 3 (key) frame header bytes
+    header = marm.rtp.RTPHeader(version=2, type=100).pack()
+    bufs = [header + '\x10' + '\x00' * size for size in [0, 2, 3]]
+    path = tmpdir.join('short.mjr')
+    with marm.mjr.MJRWriter(path.strpath, packet_type=marm.vp8.VP8RTPPacket) as w:
+        for buf in bufs:
+            w.write(buf)
+
+    expected = [
+        marm.index.FLAG_START_OF_FRAME,
+        marm.index.FLAG_START_OF_FRAME,
+        marm.index.FLAG_START_OF_FRAME | marm.index.FLAG_KEY_FRAME,
+    ]
+    assert [
+        marm.index.packet_flags(marm.vp8.VP8RTPPacket(buf)) for buf in bufs
+    ] == expected
+    for packet_filter in [None, lambda pkt: True]:
+        idx = marm.mjr.MJRRTPPacketReader(
+            path.strpath,
+            packet_type=marm.vp8.VP8RTPPacket,
+            packet_filter=packet_filter,
+        ).packet_index()
+        assert list(idx.flags) == expected
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type,raw,buffer_size,sync', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, False, 1024, marm.mjr.MJRWriter.SYNC_NONE),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, True, 1, marm.mjr.MJRWriter.SYNC_FLUSH),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, False, 4096, marm.mjr.MJRWriter.SYNC_CLOSE),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, True, 1024 * 1024, marm.mjr.MJRWriter.SYNC_NONE),
+    ]
+)
+def test_mjr_writer(tmpdir, fixtures, file_name, packet_type, raw, buffer_size, sync):
+    src = marm.mjr.MJRRTPPacketReader(
+        fixtures.join(file_name).strpath, packet_type=packet_type, sidecar=False,
+    )
+
+    # unbuffered
+    expected_path = tmpdir.join('expected.mjr')
+    with expected_path.open('wb') as fo:
+        marm.mjr.write_header(fo, packet_type.type)
+        for pkt in src:
+            marm.mjr.write_packet(fo, pkt)
+
+    # buffered
+    path = tmpdir.join(file_name)
+    with marm.mjr.MJRWriter(
+            path.strpath,
+            packet_type=packet_type,
+            buffer_size=buffer_size,
+            sidecar=True,
+            sync=sync) as w:
+        for pkt in src:
+            w.write(pkt.pack() if raw else pkt)
+    assert w.count == sum(1 for _ in src)
+    assert path.read('rb') == expected_path.read('rb')
+
+    # sidecar
+    idx = marm.index.load_sidecar(path.strpath, packet_type)
+    assert idx is not None
+    mjr = marm.mjr.MJRRTPPacketReader(
+        path.strpath,
+        packet_type=packet_type,
+        packet_filter=lambda pkt: True,
+    )
+    unpacked = mjr.packet_index()
+    assert list(idx) == list(unpacked)
+    assert idx.end == unpacked.end
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type,mmap,head,partial', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, False, 100, 5),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, True, 10, 50),
+    ]
+)
+def test_mjr_follow(tmpdir, fixtures, file_name, packet_type, mmap, head, partial):
+    src = marm.mjr.MJRRTPPacketReader(
+        fixtures.join(file_name).strpath, packet_type=packet_type, sidecar=False,
+    )
+    src_idx = src.packet_index()
+    buf = fixtures.join(file_name).read('rb')
+    cut = src_idx.offset[head] - marm.mjr.RECORD_HEADER_SIZE + partial
+
+    # partially recorded
+    path = tmpdir.join(file_name)
+    path.write(buf[:cut], 'wb')
+    cur = marm.rtp.RTPCursor(
+        [path.strpath],
+        marm.mjr.MJRRTPPacketReader,
+        packet_type=packet_type,
+        follow=True,
+        mmap=mmap,
+    )
+    assert sum(1 for _ in cur) == head
+    assert cur.poll() == 0
+    assert cur.wait(timeout=0.01, interval=0.001) == 0
+
+    # rest recorded
+    with path.open('ab') as fo:
+        fo.write(buf[cut:])
+    pkts = list(cur.follow(timeout=0.01, interval=0.001))
+    assert len(pkts) == len(src_idx) - head
+    assert [pkt.pack() for pkt in pkts] == [
+        src.read_packet(offset, size).pack()
+        for offset, size in zip(src_idx.offset[head:], src_idx.size[head:])
+    ]
+
+    # stale sidecar extended
+    path.write(buf[:cut], 'wb')
+    marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=True,
+    ).packet_index()
+    with path.open('ab') as fo:
+        fo.write(buf[cut:])
+    assert marm.index.load_sidecar(path.strpath, packet_type) is None
+    idx = marm.index.load_sidecar(path.strpath, packet_type, prefix=True)
+    assert len(idx) == head
+    idx = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, follow=True, sidecar=True,
+    ).packet_index()
+    assert list(idx) == list(src_idx)
+    assert marm.index.load_sidecar(path.strpath, packet_type) is not None
+
+    # rewritten, i.e. not extended, sidecar ignored
+    path.write(buf[:cut], 'wb')
+    marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=True,
+    ).packet_index()
+    src_idx = src.packet_index()
+    org = src_idx.offset[0] - marm.mjr.RECORD_HEADER_SIZE
+    half = src_idx.offset[head // 2] - marm.mjr.RECORD_HEADER_SIZE
+    path.write(buf[:half] + buf[org:], 'wb')
+    idx = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, follow=True, sidecar=True,
+    ).packet_index()
+    assert len(idx) == head // 2 + len(src_idx)
+
+
+def damage(buf, offsets):
+    # garbled marker
+    i = offsets[10] - marm.mjr.RECORD_HEADER_SIZE
+    buf = buf[:i] + 'MEETXXXX' + buf[i + 8:]
+    # implausible length
+    i = offsets[20] - 2
+    buf = buf[:i] + '\xff\xff' + buf[i + 2:]
+    # junk between records, w/ a marker in it
+    i = offsets[30] - marm.mjr.RECORD_HEADER_SIZE
+    junk = 'junk' + marm.mjr.MARKER + '\x00\x01' + 'junk'
+    buf = buf[:i] + junk + buf[i:]
+    return buf, [10, 20], [
+        [offsets[10] - marm.mjr.RECORD_HEADER_SIZE, offsets[11] - marm.mjr.RECORD_HEADER_SIZE],
+        [offsets[20] - marm.mjr.RECORD_HEADER_SIZE, offsets[21] - marm.mjr.RECORD_HEADER_SIZE],
+        [offsets[30] - marm.mjr.RECORD_HEADER_SIZE, offsets[30] - marm.mjr.RECORD_HEADER_SIZE + len(junk)],
+    ]
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type,mmap,filtered', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, False, False),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, True, True),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, True, False),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, False, True),
+    ]
+)
+def test_mjr_recover(tmpdir, fixtures, file_name, packet_type, mmap, filtered):
+    src = marm.mjr.MJRRTPPacketReader(
+        fixtures.join(file_name).strpath, packet_type=packet_type, sidecar=False,
+    )
+    src_idx = src.packet_index()
+    buf, lost, skipped = damage(fixtures.join(file_name).read('rb'), src_idx.offset)
+    path = tmpdir.join(file_name)
+    path.write(buf, 'wb')
+    expected = [
+        src.read_packet(entry.offset, entry.size).pack()
+        for i, entry in enumerate(src_idx) if i not in lost
+    ]
+
+    # not recovered
+    mjr = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=False, mmap=mmap,
+        packet_filter=(lambda pkt: True) if filtered else None,
+    )
+    assert len(mjr.packet_index()) == lost[0]
+
+    # recovered
+    mjr = marm.mjr.MJRRTPPacketReader(
+        path.strpath, packet_type=packet_type, sidecar=False, mmap=mmap,
+        packet_filter=(lambda pkt: True) if filtered else None,
+        recover=True,
+    )
+    idx = mjr.packet_index()
+    assert idx.meta['skipped'] == skipped
+    assert idx.end == len(buf)
+    assert [
+        mjr.read_packet(entry.offset, entry.size).pack() for entry in idx
+    ] == expected
+    assert [pkt.pack() for pkt in mjr] == expected
+
+    # sidecar of either mode isn't used by the other
+    for recover, count in [(False, lost[0]), (True, len(expected)), (False, lost[0])]:
+        mjr = marm.mjr.MJRRTPPacketReader(
+            path.strpath, packet_type=packet_type, recover=recover, sidecar=True,
+        )
+        assert len(mjr.packet_index()) == count
+        assert len(mjr.packet_index()) == count
@@ -0,0 +1,146 @@
+import pytest
+
+import marm
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type,raw,block_size', [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, False, 4096),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, True, 1),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, False, 64 * 1024),
+        ('streets-of-rage.pcap', marm.opus.OpusRTPPacket, False, 16 * 1024),
+        ('empty.mjr', marm.vp8.VP8RTPPacket, False, 4096),
+    ]
+)
+def test_mra_write_read(tmpdir, fixtures, file_name, packet_type, raw, block_size):
+    src_path = fixtures.join(file_name)
+    pkts = [
+        pkt.pack()
+        for pkt in marm.rtp.RTPPacketReader.open(
+            src_path.strpath, packet_type=packet_type,
+        )
+    ]
+    src = marm.rtp.RTPPacketReader.open(src_path.strpath, packet_type=packet_type)
+
+    # write
+    path = tmpdir.join('archive.mra')
+    with marm.mra.MRAWriter(
+            path.strpath,
+            packet_type=packet_type,
+            block_size=block_size) as w:
+        for pkt in src:
+            w.write(pkt.pack() if raw else pkt)
+    assert w.count == len(pkts)
+    if block_size > 1024 and pkts:
+        assert path.size() < src_path.size()
+
+    # iterate
+    mra = marm.rtp.RTPPacketReader.open(path.strpath, packet_type=packet_type)
+    assert isinstance(mra, marm.mra.MRARTPPacketReader)
+    assert [pkt.pack() for pkt in mra] == pkts
+
+    # random access
+    idx = mra.packet_index()
+    assert len(idx) == len(pkts)
+    timestamps = marm.rtp.unwrap_timestamps(idx.timestamp)
+    for ordinal in reversed(range(len(idx))):
+        entry = idx[ordinal]
+        assert entry.offset == ordinal
+        assert mra.read_packet(entry.offset, entry.size).pack() == pkts[ordinal]
+        block = mra.blocks[mra.block_of(ordinal)]
+        assert block.ordinal <= ordinal < block.ordinal + block.count
+        assert block.min_timestamp <= timestamps[ordinal] <= block.max_timestamp
+    for ordinal in range(0, len(idx), 97):
+        assert mra.block_of(ordinal) in mra.blocks_at(timestamps[ordinal])
+
+    # cursor
+    if pkts:
+        cur = marm.rtp.RTPCursor([path.strpath], packet_type=packet_type)
+        cur.seek((0, len(pkts) // 2))
+        assert cur.current().pack() == pkts[len(pkts) // 2]
+        assert [pkt.pack() for pkt in cur] == pkts[len(pkts) // 2:]
+
+
+def test_mra_timestamp_wrap(tmpdir, fixtures):
+    pkts = list(marm.mjr.MJRRTPPacketReader(
+        fixtures.join('sonic-a.mjr').strpath,
+        packet_type=marm.opus.OpusRTPPacket,
+    ))
+    first = pkts[0].header.timestamp
+    base = (1 << 32) - (pkts[len(pkts) // 2].header.timestamp - first)
+    for pkt in pkts:
+        pkt.header.timestamp = (pkt.header.timestamp - first + base) & 0xffffffff
+    path = tmpdir.join('archive.mra')
+    with marm.mra.MRAWriter(
+            path.strpath,
+            packet_type=marm.opus.OpusRTPPacket,
+            block_size=4096) as w:
+        for pkt in pkts:
+            w.write(pkt)
+
+    mra = marm.mra.MRARTPPacketReader(
+        path.strpath, packet_type=marm.opus.OpusRTPPacket,
+    )
+    idx = mra.packet_index()
+    assert idx.timestamp[-1] < idx.timestamp[0]
+    timestamps = marm.rtp.unwrap_timestamps(idx.timestamp)
+    for ordinal in range(0, len(idx), 13):
+        blocks = mra.blocks_at(timestamps[ordinal])
+        assert mra.block_of(ordinal) in blocks
+        assert len(blocks) <= 2
+
+
+def test_mra_late_packets(tmpdir, fixtures):
+    pkts = list(marm.mjr.MJRRTPPacketReader(
+        fixtures.join('sonic-a.mjr').strpath,
+        packet_type=marm.opus.OpusRTPPacket,
+    ))
+    # NOTE: early packets arriving late, i.e. in a later overlapping block
+    pkts.insert(3000, pkts.pop(5))
+    pkts.insert(4000, pkts.pop(1000))
+    path = tmpdir.join('archive.mra')
+    with marm.mra.MRAWriter(
+            path.strpath,
+            packet_type=marm.opus.OpusRTPPacket,
+            block_size=4096) as w:
+        for pkt in pkts:
+            w.write(pkt)
+
+    mra = marm.mra.MRARTPPacketReader(
+        path.strpath, packet_type=marm.opus.OpusRTPPacket,
+    )
+    assert mra.block_of(2999) != mra.block_of(5)
+    timestamps = marm.rtp.unwrap_timestamps(mra.packet_index().timestamp)
+    for ordinal in range(len(pkts)):
+        blocks = mra.blocks_at(timestamps[ordinal])
+        assert mra.block_of(ordinal) in blocks
+        assert all(
+            mra.blocks[i].min_timestamp <= timestamps[ordinal] <= mra.blocks[i].max_timestamp
+            for i in blocks
+        )
+
+
+@pytest.mark.parametrize(
+    'file_name,packet_type,ssrc,expected', [
+        ('streets-of-rage.pcap', marm.opus.OpusRTPPacket, 4286666423, 490),
+    ]
+)
+def test_mra_filter(tmpdir, fixtures, file_name, packet_type, ssrc, expected):
+    src = marm.rtp.RTPPacketReader.open(
+        fixtures.join(file_name).strpath, packet_type=packet_type,
+    )
+    path = tmpdir.join('archive.mra')
+    with marm.mra.MRAWriter(path.strpath, packet_type=packet_type) as w:
+        for pkt in src:
+            w.write(pkt)
+    mra = marm.mra.MRARTPPacketReader(
+        path.strpath,
+        packet_type=packet_type,
+        packet_filter=lambda pkt: pkt.header.ssrc == ssrc,
+    )
+    assert sum(1 for _ in mra) == expected
+    idx = mra.packet_index()
+    assert len(idx) == expected
+    assert set(idx.ssrc) == set([ssrc])
+    for entry in idx:
+        assert mra.read_packet(entry.offset, entry.size).header.ssrc == ssrc
@@ -1,3 +1,5 @@
+import struct
+
 import pytest
 
 import marm
@@ -30,6 +32,226 @@ def test_extract_frames_from_pcap(
         assert sum(1 for _ in pkts) == expected
 
 
+@pytest.mark.parametrize(
+    ('capture,pt,ssrc,packet_type,expected'), [
+        ('streets-of-rage.pcap', 100, 3830765780, marm.vp8.VP8RTPPacket, 1239),
+        ('streets-of-rage.pcap', 111, 4286666423, marm.opus.OpusRTPPacket,
+         490),
+    ])
+def test_pcap_index(
+        fixtures,
+        capture,
+        pt,
+        ssrc,
+        packet_type,
+        expected):
+    c_path = fixtures.join(capture)
+    with c_path.open('rb') as fo:
+        pkts = marm.pcap.PCapRTPPacketReader(
+            fo,
+            packet_type=packet_type,
+            packet_filter=lambda pkt: (
+                pkt.header.type == pt and
+                pkt.header.ssrc == ssrc
+            )
+        )
+        idx = pkts.packet_index()
+        assert len(idx) == expected
+        assert idx.end == c_path.size()
+        assert list(pkts.index()) == list(idx.offset)
+        assert set(idx.type) == set([pt])
+        expected = [pkt.pack() for pkt in pkts]
+        for i in reversed(xrange(len(idx))):
+            pkt = pkts.read_packet(idx.offset[i], idx.size[i])
+            assert pkt.pack() == expected[i]
+
+
+@pytest.mark.parametrize(
+    ('capture,payload_types,expected'), [
+        ('streets-of-rage.pcap', None, {
+            (3830765780, 100): (marm.vp8.VP8RTPPacket, 1239),
+            (4286666423, 111): (marm.opus.OpusRTPPacket, 490),
+        }),
+        ('streets-of-rage.pcap', {111: marm.opus.OpusRTPPacket}, {
+            (3830765780, 100): (marm.vp8.VP8RTPPacket, 1239),
+            (4286666423, 111): (marm.opus.OpusRTPPacket, 490),
+        }),
+    ])
+def test_pcap_demux(tmpdir, fixtures, capture, payload_types, expected):
+    c_path = fixtures.join(capture)
+
+    def writer(flow, packet_type):
+        path = tmpdir.join('{0}-{1}.mjr'.format(flow.ssrc, flow.type))
+        return marm.mjr.MJRWriter(path.strpath, packet_type=packet_type)
+
+    with c_path.open('rb') as fo:
+        pkts = marm.pcap.PCapRTPPacketReader(fo)
+        flows = pkts.demux(
+            writer,
+            payload_types=payload_types,
+            packet_types=[marm.vp8.VP8RTPPacket, marm.opus.OpusRTPPacket],
+        )
+    assert dict(
+        ((flow.ssrc, flow.type), value) for flow, value in flows.items()
+    ) == expected
+
+    # writers w/o a count
+    class Writer(object):
+
+        def __init__(self, flow, packet_type):
+            self.bufs = []
+
+        def write(self, buf):
+            self.bufs.append(buf)
+
+        def close(self):
+            pass
+
+    with c_path.open('rb') as fo:
+        pkts = marm.pcap.PCapRTPPacketReader(fo)
+        assert pkts.demux(
+            Writer,
+            payload_types=payload_types,
+            packet_types=[marm.vp8.VP8RTPPacket, marm.opus.OpusRTPPacket],
+        ) == flows
+
+    for (ssrc, pt), (packet_type, count) in expected.items():
+        with c_path.open('rb') as fo:
+            pkts = marm.pcap.PCapRTPPacketReader(
+                fo,
+                packet_type=packet_type,
+                packet_filter=lambda pkt: (
+                    pkt.header.type == pt and
+                    pkt.header.ssrc == ssrc
+                )
+            )
+            c_bufs = [pkt.pack() for pkt in pkts]
+        path = tmpdir.join('{0}-{1}.mjr'.format(ssrc, pt))
+        pkts = marm.rtp.RTPPacketReader.open(path.strpath, packet_type=packet_type)
+        assert [pkt.pack() for pkt in pkts] == c_bufs
+
+
+@pytest.mark.parametrize(
+    ('capture,expected'), [
+        ('streets-of-rage.pcap', [
+            (3830765780, 100, marm.vp8.VP8RTPPacket, 1239),
+            (4286666423, 111, marm.opus.OpusRTPPacket, 490),
+        ]),
+    ])
+def test_pcap_session(fixtures, capture, expected):
+    c_path = fixtures.join(capture)
+    with marm.pcap.PCapSession(c_path.strpath) as session:
+        assert len(session.flows) == len(expected)
+        assert session.update() == 0
+        for ssrc, pt, packet_type, count in expected:
+            flow, = session.find(ssrc=ssrc, type=pt)
+            assert session.infer_packet_type(
+                flow, [marm.vp8.VP8RTPPacket, marm.opus.OpusRTPPacket]
+            ) is packet_type
+
+            with c_path.open('rb') as fo:
+                pkts = marm.pcap.PCapRTPPacketReader(
+                    fo,
+                    packet_type=packet_type,
+                    packet_filter=lambda pkt: (
+                        pkt.header.type == pt and
+                        pkt.header.ssrc == ssrc
+                    )
+                )
+                c_idx = pkts.packet_index()
+                c_bufs = [pkt.pack() for pkt in pkts]
+
+            pkts = session.reader(flow, packet_type=packet_type)
+            idx = pkts.packet_index()
+            assert len(idx) == count
+            assert list(idx) == list(c_idx)
+            assert pkts.packet_index() is idx
+            assert [pkt.pack() for pkt in pkts] == c_bufs
+
+            cur = marm.rtp.RTPCursor(
+                [flow], session.reader, packet_type=packet_type,
+            )
+            assert [pkt.pack() for pkt in cur] == c_bufs
+
+
+def udp(payload, ip_version):
+    u = struct.pack('>HHHH', 5000, 5002, 8 + len(payload), 0) + payload
+    if ip_version == 4:
+        return struct.pack(
+            '>BBHHHBBH4s4s', 0x45, 0, 20 + len(u), 0, 0, 64, 17, 0,
+            '\x0a\x00\x00\x01', '\x0a\x00\x00\x02',
+        ) + u
+    return struct.pack(
+        '>IHBB16s16s', 0x60000000, len(u), 17, 64, '\x00' * 16, '\x00' * 16,
+    ) + u
+
+
+def frame(linktype, ip, vlans=0):
+    ethertype = 0x0800 if ord(ip[0]) >> 4 == 4 else 0x86dd
+    tags = ''.join(struct.pack('>HH', 0x8100, 7) for _ in xrange(vlans))
+    if linktype == marm.pcap.LINKTYPE_ETHERNET:
+        buf = '\x00' * 12 + tags + struct.pack('>H', ethertype) + ip
+        return buf + '\x00' * max(0, 60 - len(buf))
+    if linktype == marm.pcap.LINKTYPE_LINUX_SLL:
+        return struct.pack('>HHH8s', 0, 1, 6, '\x00' * 8) + tags + struct.pack('>H', ethertype) + ip
+    return ip
+
+
+def write_pcap(fo, linktype, frames, byte_order='<', magic=marm.pcap.MAGIC):
+    fo.write(struct.pack(byte_order + 'IHHiIII', magic, 2, 4, 0, 0, 65535, linktype))
+    for i, buf in enumerate(frames):
+        fo.write(struct.pack(byte_order + 'IIII', i, 0, len(buf), len(buf)))
+        fo.write(buf)
+
+
+@pytest.mark.parametrize(
+    ('capture,packet_type,linktype,ip_version,vlans,byte_order,magic'), [
+        ('streets-of-rage.pcap', marm.vp8.VP8RTPPacket,
+         marm.pcap.LINKTYPE_ETHERNET, 4, 1, '<', marm.pcap.MAGIC),
+        ('streets-of-rage.pcap', marm.vp8.VP8RTPPacket,
+         marm.pcap.LINKTYPE_ETHERNET, 6, 2, '>', marm.pcap.NS_MAGIC),
+        ('streets-of-rage.pcap', marm.opus.OpusRTPPacket,
+         marm.pcap.LINKTYPE_LINUX_SLL, 4, 0, '>', marm.pcap.MAGIC),
+        ('streets-of-rage.pcap', marm.opus.OpusRTPPacket,
+         marm.pcap.LINKTYPE_LINUX_SLL, 6, 1, '<', marm.pcap.MAGIC),
+        ('streets-of-rage.pcap', marm.vp8.VP8RTPPacket,
+         marm.pcap.LINKTYPE_RAW, 4, 0, '<', marm.pcap.NS_MAGIC),
+        ('streets-of-rage.pcap', marm.vp8.VP8RTPPacket,
+         marm.pcap.LINKTYPE_IPV6, 6, 0, '<', marm.pcap.MAGIC),
+    ])
+def test_pcap_linktypes(
+        tmpdir,
+        fixtures,
+        capture,
+        packet_type,
+        linktype,
+        ip_version,
+        vlans,
+        byte_order,
+        magic):
+    with fixtures.join(capture).open('rb') as fo:
+        pkts = marm.pcap.PCapRTPPacketReader(fo, packet_type=packet_type)
+        expected = [pkt.pack() for pkt in marm.rtp.head_packets(pkts, count=200)]
+
+    frames = []
+    for buf in expected:
+        frames.append(frame(linktype, udp(buf, ip_version), vlans))
+        # not rtp, i.e. rtcp, short and arp
+        frames.append(frame(linktype, udp('\x80\xc8' + '\x00' * 26, ip_version), vlans))
+        frames.append(frame(linktype, udp('\x80', ip_version), vlans))
+        if linktype == marm.pcap.LINKTYPE_ETHERNET:
+            frames.append('\x00' * 12 + struct.pack('>H', 0x0806) + '\x00' * 46)
+    assert sum(marm.pcap.is_rtp_packet(buf, linktype) for buf in frames) == len(expected)
+    c_path = tmpdir.join('c.pcap')
+    with c_path.open('wb') as fo:
+        write_pcap(fo, linktype, frames, byte_order, magic)
+
+    with c_path.open('rb') as fo:
+        pkts = marm.pcap.PCapRTPPacketReader(fo, packet_type=packet_type)
+        assert pkts.header.linktype == linktype
+        assert [pkt.pack() for pkt in pkts] == expected
+
+
 @pytest.mark.parametrize(
     ('capture,'
      'a_pt,a_ssrc,a_pkt_type,a_enc,'
@@ -1,4 +1,6 @@
+import copy
 import inspect
+import pickle
 
 import pytest
 
@@ -271,6 +273,97 @@ def test_rtp_cursor_compute(
             assert cur.compute(map_func, reduce_func, stop, cache) == expected
 
 
+def sample_count(pkt):
+    return pkt.data.nb_samples * pkt.data.nb_channels
+
+
+def packet_size(pkt):
+    return len(pkt.pack())
+
+
+def packet_count_size(pkt):
+    return 1, len(pkt.pack())
+
+
+def add(x, y):
+    return x + y
+
+
+def add_pairs((x_a, x_b), (y_a, y_b)):
+    return x_a + y_a, x_b + y_b
+
+
+@pytest.mark.parametrize(
+    ('srcs,pkt_type,map_func,reduce_func,zero,expected,saved'), [
+        (['sonic-a.mjr'] * 3,
+         marm.opus.OpusRTPPacket,
+         sample_count, add, 0,
+         3 * 5756160,
+         True),
+        (['padded-v.mjr'] * 2,
+         marm.vp8.VP8RTPPacket,
+         packet_size, add, 0,
+         2 * 1095541,
+         True),
+        (['padded-v.mjr'] * 2,
+         marm.vp8.VP8RTPPacket,
+         packet_count_size, add_pairs, (0, 0),
+         (2 * 1058, 2 * 1095541),
+         False),
+    ],
+)
+def test_rtp_cursor_compute_parts(
+        tmpdir,
+        fixtures,
+        pool,
+        process_pool,
+        srcs,
+        pkt_type,
+        map_func,
+        reduce_func,
+        zero,
+        expected,
+        saved):
+    paths = []
+    for i, src in enumerate(srcs):
+        path = tmpdir.join('{0}-{1}'.format(i, src))
+        fixtures.join(src).copy(path)
+        paths.append(path.strpath)
+
+    # pool
+    cur = marm.rtp.RTPCursor(paths, packet_type=pkt_type, sidecar=True)
+    serial = cur.copy().compute(map_func, reduce_func, zero=zero)
+    assert serial == expected
+    for p in [pool, process_pool]:
+        assert cur.compute(map_func, reduce_func, zero=zero, pool=p) == serial
+        cur.seek((1, 10))
+        partial = cur.copy().compute(map_func, reduce_func, zero=zero)
+        assert cur.compute(map_func, reduce_func, zero=zero, pool=p) == partial < serial
+        cur.seek((0, 0))
+
+    # persistent
+    cur = marm.rtp.RTPCursor(paths, packet_type=pkt_type, sidecar=True)
+    assert cur.compute(map_func, reduce_func, zero=zero, cache='total', pool=pool) == serial
+    for path in paths:
+        idx = marm.index.load_sidecar(path, pkt_type)
+        assert ('total' in idx.meta.get('reductions', {})) == saved
+
+    def unmapped(pkt):
+        raise AssertionError('Not cached.')
+
+    cur = marm.rtp.RTPCursor(paths, packet_type=pkt_type, sidecar=True)
+    if saved:
+        assert cur.compute(unmapped, reduce_func, zero=zero, cache='total') == serial
+    else:
+        # NOTE: not json round-trip-able so only cached in memory
+        assert cur.compute(map_func, reduce_func, zero=zero, cache='total') == serial
+        cur.seek((0, 0))
+        assert cur.compute(unmapped, reduce_func, zero=zero, cache='total') == serial
+    with pytest.raises(AssertionError):
+        cur.seek((0, 0))
+        cur.compute(unmapped, reduce_func, zero=zero, cache='other')
+
+
 @pytest.mark.parametrize(
     ('srcs,pkt_type,expected'), [
         ([], marm.vp8.VP8RTPPacket, None),
@@ -325,3 +418,761 @@ def test_rtp_cursor_padded(fixtures, srcs, pkt_type, expected):
         packet_type=pkt_type,
     )
     assert cur.probe() == expected
+
+
+@pytest.mark.parametrize(
+    ('srcs,pkt_type,expected'), [
+        (['empty.mjr', 'sonic-a.mjr', 'empty.mjr', 'sonic-a.mjr'],
+         marm.opus.OpusRTPPacket,
+         [0, 5996, 0, 5996]),
+        (['padded-v.mjr'], marm.vp8.VP8RTPPacket, [1058]),
+        (['sonic-a.mjr', 'empty.mjr'], None, [5996, 0]),
+    ],
+)
+def test_rtp_cursor_index_parts(fixtures, pool, process_pool, srcs, pkt_type, expected):
+    paths = [fixtures.join(src).strpath for src in srcs]
+    part_kwargs = {'packet_type': pkt_type} if pkt_type else {}
+    cur = marm.rtp.RTPCursor(paths, **part_kwargs)
+    spans = cur.index_parts(pool)
+    assert [span.count for span in spans] == expected
+    for span, part in zip(spans, cur.parts):
+        assert span.name == part.name
+        if span.count and pkt_type:
+            assert span.begin_secs <= span.end_secs
+        else:
+            assert span.begin_secs is None and span.end_secs is None
+
+    assert cur.index_parts() == spans
+    assert cur.index_parts(process_pool) == spans
+
+    # empty
+    cur = marm.rtp.RTPCursor(paths, empty=False, pool=pool, **part_kwargs)
+    assert len(cur.parts) == sum(1 for count in expected if count)
+
+    # kept
+    idxs = [part.idx for part in cur.parts]
+    assert sum(1 for _ in cur) == sum(expected)
+    assert all(a is b for a, b in zip(idxs, [part.idx for part in cur.parts]))
+
+
+def test_rtp_cursor_index_parts_wrap(tmpdir, fixtures):
+    pkts = list(marm.mjr.MJRRTPPacketReader(
+        fixtures.join('sonic-a.mjr').strpath,
+        packet_type=marm.opus.OpusRTPPacket,
+    ))
+    first = pkts[0].header.timestamp
+    base = (1 << 32) - (pkts[len(pkts) // 2].header.timestamp - first)
+    for pkt in pkts:
+        pkt.header.timestamp = (pkt.header.timestamp - first + base) & 0xffffffff
+    path = tmpdir.join('wrapped.mjr')
+    with marm.mjr.MJRWriter(path.strpath, packet_type=marm.opus.OpusRTPPacket) as w:
+        for pkt in pkts:
+            w.write(pkt)
+
+    cur = marm.rtp.RTPCursor([path.strpath], packet_type=marm.opus.OpusRTPPacket)
+    span, = cur.index_parts()
+    assert span.count == len(pkts)
+    clock_rate = marm.opus.OpusRTPPacket.clock_rate
+    assert span.begin_secs == base / float(clock_rate)
+    assert span.end_secs == ((1 << 32) + pkts[-1].header.timestamp) / float(clock_rate)
+
+
+@pytest.mark.parametrize(
+    ('srcs,order'), [
+        (['padded-v.mjr'], None),
+        (['padded-v.mjr', 'empty.mjr', 'padded-v.mjr'], None),
+        (['empty.mjr', 'padded-v.mjr', 'padded-v.mjr'], 'timestamp'),
+    ],
+)
+def test_rtp_cursor_search_frames(fixtures, srcs, order):
+    paths = [fixtures.join(src).strpath for src in srcs]
+    cur = marm.rtp.RTPCursor(paths, order=order, packet_type=marm.vp8.VP8RTPPacket)
+    ref = cur.copy()
+    matches = [
+        ('prev_key_frame', 'backward', lambda pkt: pkt.data.is_start_of_frame and pkt.data.is_key_frame),
+        ('next_key_frame', 'forward', lambda pkt: pkt.data.is_start_of_frame and pkt.data.is_key_frame),
+        ('prev_start_of_frame', 'backward', lambda pkt: pkt.data.is_start_of_frame),
+        ('next_start_of_frame', 'forward', lambda pkt: pkt.data.is_start_of_frame),
+    ]
+    positions = [
+        (i, j)
+        for i, part in enumerate(cur.parts)
+        for j in [0, 1, 2, 50, 500, len(part) - 2, len(part) - 1]
+        if 0 <= j < len(part)
+    ]
+    for pos in positions:
+        for name, dir, match in matches:
+            cur.seek(pos)
+            ref.seek(pos)
+            pkt, ref_pkt = getattr(cur, name)(), ref.search(match, dir)
+            assert (pkt and pkt.pack()) == (ref_pkt and ref_pkt.pack())
+            assert cur.tell() == ref.tell()
+
+    with pytest.raises(ValueError):
+        cur.search_frames(marm.index.FLAG_START_OF_FRAME, 'sideways')
+
+
+@pytest.mark.parametrize(
+    ('srcs,pkt_type,max_open'), [
+        (['sonic-a.mjr', 'empty.mjr'] * 8, marm.opus.OpusRTPPacket, 3),
+        (['padded-v.mjr'] * 4, marm.vp8.VP8RTPPacket, 1),
+    ],
+)
+def test_rtp_cursor_max_open(fixtures, srcs, pkt_type, max_open):
+    paths = [fixtures.join(src).strpath for src in srcs]
+    indexed = []
+
+    def part_type(path, **kwargs):
+        pkts = marm.mjr.MJRRTPPacketReader(path, sidecar=False, **kwargs)
+        packet_index = pkts.packet_index
+
+        def index():
+            indexed.append(path)
+            return packet_index()
+
+        pkts.packet_index = index
+        return pkts
+
+    cur = marm.rtp.RTPCursor(paths, part_type, max_open=max_open, packet_type=pkt_type)
+    empties = [src == 'empty.mjr' for src in srcs]
+    assert [part.is_empty for part in cur.parts] == empties
+    for part in cur.parts:
+        part.open()
+    assert [part.is_empty for part in cur.parts] == empties
+    assert len(cur.opened) <= max_open
+    del indexed[:]
+
+    cur = marm.rtp.RTPCursor(
+        paths, part_type, empty=False, max_open=max_open, packet_type=pkt_type,
+    )
+    paths = [path for path, empty in zip(paths, empties) if not empty]
+    expected = [pkt.pack() for pkt in cur]
+    assert len(indexed) == len(paths)
+    assert len(cur.opened) <= max_open
+    assert sum(1 for part in cur.parts if part.is_opened) == len(cur.opened)
+
+    # back and forth
+    for _ in xrange(2):
+        for i in [len(paths) - 1, 1, len(paths) - 2, 0]:
+            cur.seek((i, -1))
+            assert cur.is_last((i, len(cur.parts[i]) - 1)) == (i == len(paths) - 1)
+            assert len(cur.opened) <= max_open
+    cur.seek((0, 0))
+    assert [pkt.pack() for pkt in cur] == expected
+    assert len(indexed) == len(paths)
+
+
+def test_rtp_cursor_max_open_invalid(fixtures):
+    path = fixtures.join('sonic-a.mjr').strpath
+    for max_open in [0, -1]:
+        with pytest.raises(ValueError):
+            marm.rtp.RTPCursor([path], max_open=max_open)
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,fields,expected'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket,
+         {'seq': (5000, 6000)}, 996),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket,
+         {'ssrc': 1441911339, 'timestamp': (None, 970000000)}, None),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket,
+         {'marker': 1}, 269),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket,
+         {'pt': 100, 'timestamp': (3758000000, 3758314889)}, None),
+        ('streets-of-rage.pcap', marm.vp8.VP8RTPPacket,
+         {'pt': 100, 'ssrc': 3830765780}, 1239),
+        ('streets-of-rage.pcap', marm.opus.OpusRTPPacket,
+         {'pt': 111, 'marker': 0}, None),
+    ],
+)
+def test_rtp_packet_filter(tmpdir, fixtures, stored, pkt_type, fields, expected):
+    s_path = fixtures.join(stored)
+    srcs = [s_path]
+    if s_path.ext == '.mjr':
+        a_path = tmpdir.join(s_path.purebasename + '.mra')
+        with s_path.open('rb') as fo, marm.mra.MRAWriter(a_path.strpath, packet_type=pkt_type) as w:
+            for pkt in marm.mjr.MJRRTPPacketReader(fo, packet_type=pkt_type, sidecar=False):
+                w.write(pkt)
+        srcs.append(a_path)
+
+    packet_filter = marm.rtp.PacketFilter(**fields)
+    for src in srcs:
+        with src.open('rb') as fo:
+            pkts = marm.rtp.RTPPacketReader.open(
+                fo, packet_type=pkt_type, packet_filter=lambda pkt: packet_filter(pkt),
+            )
+            p_idx = list(pkts.packet_index())
+            p_bufs = [pkt.pack() for pkt in pkts]
+
+        with src.open('rb') as fo:
+            pkts = marm.rtp.RTPPacketReader.open(
+                fo, packet_type=pkt_type, packet_filter=packet_filter,
+            )
+            assert pkts.header_filter is packet_filter
+            assert list(pkts.packet_index()) == p_idx
+            assert [pkt.pack() for pkt in pkts] == p_bufs
+
+        assert p_bufs
+        if expected is not None:
+            assert len(p_bufs) == expected
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket),
+    ],
+)
+def test_rtp_lazy_packet(fixtures, stored, pkt_type):
+    lazy_type = marm.rtp.lazy(pkt_type)
+    assert marm.rtp.lazy(pkt_type) is lazy_type
+    assert marm.rtp.lazy(lazy_type) is lazy_type
+    assert issubclass(lazy_type, pkt_type)
+    assert marm.index.packet_type_name(lazy_type) == marm.index.packet_type_name(pkt_type)
+
+    s_path = fixtures.join(stored)
+    with s_path.open('rb') as fo:
+        pkts = list(marm.mjr.MJRRTPPacketReader(fo, packet_type=pkt_type, sidecar=False))
+    with s_path.open('rb') as fo:
+        lazy_pkts = list(marm.mjr.MJRRTPPacketReader(fo, packet_type=lazy_type, sidecar=False))
+    assert len(lazy_pkts) == len(pkts)
+
+    # header only
+    assert [
+        pkt.msecs for pkt in lazy_pkts
+    ] == [
+        pkt.msecs for pkt in pkts
+    ]
+    assert not any(pkt.is_decoded for pkt in lazy_pkts)
+    assert [pkt.pack() for pkt in lazy_pkts] == [pkt.pack() for pkt in pkts]
+
+    # all
+    for lazy_pkt, pkt in zip(lazy_pkts, pkts):
+        assert marm.index.packet_flags(lazy_pkt) == marm.index.packet_flags(pkt)
+        assert lazy_pkt.is_decoded
+        assert lazy_pkt.csrcs == pkt.csrcs
+        assert lazy_pkt.pad == pkt.pad
+        assert lazy_pkt.pack() == pkt.pack()
+
+    # modified
+    lazy_pkt, pkt = lazy_pkts[0], pkts[0]
+    lazy_pkt.header.timestamp = pkt.header.timestamp = 1234
+    assert lazy_pkt.pack() == pkt.pack()
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket),
+    ],
+)
+def test_rtp_packet_fields(fixtures, stored, pkt_type):
+    s_path = fixtures.join(stored)
+    with s_path.open('rb') as fo:
+        pkts = marm.mjr.MJRRTPPacketReader(fo, packet_type=pkt_type, sidecar=False)
+        bufs = [str(buf) for _, buf in pkts._records()]
+
+    lazy_type = marm.rtp.lazy(pkt_type)
+    for buf in bufs:
+        pkt = pkt_type(buf)
+        assert not hasattr(pkt, '__dict__')
+        assert pkt.header.pack() == buf[:12]
+        assert pickle.loads(pickle.dumps(pkt.header)).pack() == buf[:12]
+        assert copy.copy(pkt.header).pack() == buf[:12]
+        assert pkt.pack() == buf
+        for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+            for p in [pkt, pkt_type(buffer(buf)), lazy_type(buffer(buf))]:
+                unpickled = pickle.loads(pickle.dumps(p, protocol))
+                assert type(unpickled) is type(p)
+                assert unpickled.header.seq_number == pkt.header.seq_number
+                assert unpickled.pack() == buf
+        if pkt_type is marm.vp8.VP8RTPPacket:
+            is_start_of_frame = pkt.data.is_start_of_frame
+            is_key_frame = pkt.data.is_key_frame
+            desc = pkt.data.desc
+            assert pkt.data.is_start_of_frame == is_start_of_frame
+            assert pkt.data.is_key_frame == is_key_frame
+            if is_start_of_frame:
+                assert pkt.data.header.is_key_frame == is_key_frame
+            assert pkt.pack() == buf
+            desc.n ^= 1
+            assert pkt.pack() != buf
+            lazy_pkt = lazy_type(buf)
+            lazy_pkt.data.desc.n ^= 1
+            for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+                for p in [pkt, lazy_pkt]:
+                    unpickled = pickle.loads(pickle.dumps(p, protocol))
+                    assert type(unpickled) is type(p)
+                    assert unpickled.pack() == pkt.pack()
+
+    # bits are masked when packed
+    header = marm.rtp.RTPHeader(version=2, type=0xff, seq_number=0x10001)
+    header = marm.rtp.RTPHeader.from_buffer_copy(header.pack())
+    assert (header.version, header.type, header.seq_number) == (2, 0x7f, 1)
+    with pytest.raises(ValueError):
+        marm.rtp.RTPHeader.from_buffer_copy(bufs[0][:11])
+
+
+@pytest.mark.parametrize(
+    ('srcs,pkt_type,gaps'), [
+        (['sonic-a.mjr'], marm.opus.OpusRTPPacket, [(1405, 4)]),
+        (['padded-v.mjr'], marm.vp8.VP8RTPPacket, []),
+        (['empty.mjr', 'sonic-a.mjr', 'empty.mjr'], marm.opus.OpusRTPPacket,
+         [(1405, 4)]),
+    ],
+)
+def test_rtp_packet_table(fixtures, srcs, pkt_type, gaps):
+    paths = [fixtures.join(src).strpath for src in srcs]
+    cur = marm.rtp.RTPCursor(paths, packet_type=pkt_type)
+    table = cur.table()
+    positions, pkts = [], []
+    for i, path in enumerate(paths):
+        for j, pkt in enumerate(marm.rtp.RTPPacketReader.open(path, packet_type=pkt_type)):
+            positions.append((i, j))
+            pkts.append(pkt)
+    assert len(table) == len(pkts)
+    assert [table.position(row) for row in xrange(len(table))] == positions
+    assert list(table.seq) == [pkt.header.seq_number for pkt in pkts]
+    assert list(table.secs) == [pkt.secs for pkt in pkts]
+    assert list(table.size) == [len(pkt.pack()) for pkt in pkts]
+    assert table.gaps() == gaps
+    assert table.count() == len(pkts)
+    assert table.count(marker=True) == sum(
+        1 for pkt in pkts if pkt.header.markerbit
+    )
+    if pkt_type.type == pkt_type.VIDEO_TYPE:
+        sofs = [
+            row for row, pkt in enumerate(pkts) if pkt.data.is_start_of_frame
+        ]
+        assert list(table.frame_rows()) == sofs
+        assert table.count(start_of_frame=True) == len(sofs)
+        assert table.count(start_of_frame=True, key_frame=True) == len(
+            table.frame_rows(key_frames=True)
+        )
+        assert list(table.frame_ids())[sofs[0]:sofs[1]] == [0] * (sofs[1] - sofs[0])
+        assert table.frame_rate() == marm.rtp.estimate_video_frame_rate(pkts)
+        assert marm.rtp.estimate_video_frame_rate(table) == table.frame_rate()
+    else:
+        with pytest.raises(ValueError):
+            table.frame_rate()
+    with pytest.raises(TypeError):
+        table.count(keyframe=True)
+
+    # time
+    epoch = pkts[0].secs
+    duration = pkts[-1].secs - epoch
+    for secs in [0, duration / 3, duration / 2, duration]:
+        cur.seek(table.position(0))
+        cur.fastforward(secs)
+        assert table.time_position(epoch + secs) == cur.tell()
+    assert table.time_position(pkts[-1].secs + 1) is None
+
+    # bit rates
+    bit_rates = table.bit_rates(window=10.0)
+    assert bit_rates[0][0] == epoch
+    assert sum(bps * 10.0 for _, bps in bit_rates) == 8 * sum(table.size)
+
+    # splits
+    chunks = table.split_rows(duration=10.0)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(table)
+    assert [len(list(part)) for part in marm.rtp.split_packets(pkts, duration=10.0)] == [
+        end - begin for begin, end in chunks
+    ]
+    assert all(end - begin <= 100 for begin, end in table.split_rows(count=100))
+
+    # w/o clock rate
+    with pytest.raises(ValueError):
+        marm.rtp.RTPCursor(paths).table()
+
+
+@pytest.mark.parametrize(
+    ('timestamps,expected'), [
+        ([], []),
+        ([5, 10, 7], [5, 10, 7]),
+        ([0xfffffff0, 0xffffffff, 0x10, 0xfffffffe, 0x20],
+         [0xfffffff0, 0xffffffff, 0x100000010, 0xfffffffe, 0x100000020]),
+        ([0x10, 0xfffffff0], [0x10, -0x10]),
+    ],
+)
+def test_rtp_unwrap_timestamps(timestamps, expected):
+    assert list(marm.rtp.unwrap_timestamps(timestamps)) == expected
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,wrap_secs,reset_at,reset'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 30, None, 0),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 30, 3000, 0x12345678),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 90, 3000, 0xf0000000),
+    ],
+)
+def test_rtp_cursor_timeline(
+        tmpdir, fixtures, stored, pkt_type, wrap_secs, reset_at, reset):
+    s_path = fixtures.join(stored)
+    pkts = list(marm.mjr.MJRRTPPacketReader(s_path.strpath, packet_type=pkt_type))
+    t_path = tmpdir.join(stored)
+    with t_path.open('wb') as fo:
+        marm.mjr.write_header(fo, pkt_type.type)
+        epoch = pkts[0].header.timestamp
+        for i, pkt in enumerate(pkts):
+            pkt = pkt_type(pkt.pack())
+            timestamp = (
+                pkt.header.timestamp - epoch +
+                (1 << 32) - wrap_secs * pkt_type.clock_rate
+            )
+            if reset_at is not None and i >= reset_at:
+                timestamp += reset
+            pkt.header.timestamp = timestamp & 0xffffffff
+            marm.mjr.write_packet(fo, pkt)
+
+    s_cur = marm.rtp.RTPCursor([s_path.strpath], packet_type=pkt_type)
+    t_cur = marm.rtp.RTPCursor([t_path.strpath], packet_type=pkt_type)
+    assert abs(t_cur.interval() - s_cur.interval()) < 0.1
+    for secs in [wrap_secs - 1, wrap_secs + 1, 59.5, 100]:
+        s_cur.seek((0, 0))
+        t_cur.seek((0, 0))
+        assert t_cur.time_positions(secs) == s_cur.time_positions(secs)
+        s_cur.seek((0, -1))
+        t_cur.seek((0, -1))
+        s_cur.rewind(secs)
+        t_cur.rewind(secs)
+        assert t_cur.tell() == s_cur.tell()
+
+    # w/o clock rate
+    with pytest.raises(ValueError):
+        marm.rtp.RTPCursor([t_path.strpath]).timeline()
+
+
+def test_rtp_cursor_timeline_parts(tmpdir, fixtures):
+    pkt_type = marm.opus.OpusRTPPacket
+    s_path = fixtures.join('sonic-a.mjr')
+    pkts = list(marm.mjr.MJRRTPPacketReader(s_path.strpath, packet_type=pkt_type))
+    size = len(pkts) // 3 + 1
+    paths = []
+    for i in range(3):
+        path = tmpdir.join('part-{0}.mjr'.format(i))
+        with path.open('wb') as fo:
+            marm.mjr.write_header(fo, pkt_type.type)
+            for pkt in pkts[i * size:(i + 1) * size]:
+                marm.mjr.write_packet(fo, pkt)
+        paths.append(path.strpath)
+
+    # seeks only index parts they reach
+    p_cur = marm.rtp.RTPCursor(paths, packet_type=pkt_type)
+    p_cur.seek((2, 10))
+    p_cur.fastforward(1)
+    assert [part.keep_idx for part in p_cur.parts] == [False, False, True]
+    p_cur.rewind(2)
+    assert p_cur.tell()[0] == 1
+    assert [part.keep_idx for part in p_cur.parts] == [False, True, True]
+
+    # and across parts as w/ a single one
+    s_cur = marm.rtp.RTPCursor([s_path.strpath], packet_type=pkt_type)
+    for secs in [1, 30, 59.5, 100, 1000]:
+        s_cur.seek((0, 2 * size + 10))
+        p_cur.seek((2, 10))
+        s_cur.rewind(secs)
+        p_cur.rewind(secs)
+        _, ordinal = s_cur.tell()
+        assert p_cur.tell() == (ordinal // size, ordinal % size)
+        s_cur.seek((0, 10))
+        p_cur.seek((0, 10))
+        assert (
+            abs(p_cur.fastforward(secs) - s_cur.fastforward(secs)) < 1e-6
+        )
+        _, ordinal = s_cur.tell()
+        assert p_cur.tell() == (ordinal // size, ordinal % size)
+    p_cur.seek((0, 0))
+    s_cur.seek((0, 0))
+    assert abs(p_cur.interval() - s_cur.interval()) < 1e-6
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,window,duration,late,duplicates'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 16, None, 1, 2),
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, None, 0.5, 1, 2),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 8, 1.0, 1, 2),
+    ],
+)
+def test_rtp_reordered_packets(
+        fixtures, stored, pkt_type, window, duration, late, duplicates):
+    s_path = fixtures.join(stored)
+    pkts = list(marm.mjr.MJRRTPPacketReader(s_path.strpath, packet_type=pkt_type))
+    expected = [pkt.header.seq_number for pkt in pkts]
+
+    # swap neighbours, repeat some and delay one past the window
+    shuffled = list(pkts)
+    for i in xrange(0, len(shuffled) - 1, 3):
+        shuffled[i], shuffled[i + 1] = shuffled[i + 1], shuffled[i]
+    shuffled.insert(100, shuffled[90])
+    shuffled.insert(len(shuffled) - 10, shuffled[-5])
+    delayed = shuffled.pop(200)
+    shuffled.insert(500, delayed)
+    expected.remove(delayed.header.seq_number)
+
+    held = []
+
+    def packets():
+        for pkt in shuffled:
+            yield pkt
+            held.append(len(r.heap))
+
+    r = marm.rtp.ReorderedPackets(
+        packets(), window=window, duration=duration, clock_rate=pkt_type.clock_rate,
+    )
+    assert [pkt.header.seq_number for pkt in r] == expected
+    assert (r.late, r.duplicates) == (late, duplicates)
+    if window is not None:
+        assert max(held) <= window + 1
+
+    with pytest.raises(ValueError):
+        marm.rtp.ReorderedPackets(pkts, window=None)
+    with pytest.raises(ValueError):
+        marm.rtp.ReorderedPackets(pkts, duration=1.0)
+    with pytest.raises(ValueError):
+        marm.rtp.ReorderedPackets(
+            marm.mjr.MJRRTPPacketReader(s_path.strpath), duration=1.0,
+        )
+    r = marm.rtp.ReorderedPackets(
+        marm.mjr.MJRRTPPacketReader(s_path.strpath, packet_type=pkt_type),
+        duration=1.0,
+    )
+    assert r.clock_rate == pkt_type.clock_rate
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,order'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 'seq'),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 'seq'),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 'timestamp'),
+    ],
+)
+def test_rtp_cursor_order(tmpdir, fixtures, stored, pkt_type, order):
+    s_path = fixtures.join(stored)
+    pkts = list(marm.mjr.MJRRTPPacketReader(s_path.strpath, packet_type=pkt_type))
+    key = {
+        'seq': lambda pkt: pkt.header.seq_number,
+        'timestamp': lambda pkt: pkt.header.timestamp,
+    }[order]
+    expected = [key(pkt) for pkt in sorted(pkts, key=key)]
+
+    # store shuffled
+    shuffled = list(pkts)
+    for i in xrange(0, len(shuffled) - 1, 3):
+        shuffled[i], shuffled[i + 1] = shuffled[i + 1], shuffled[i]
+    shuffled.append(shuffled.pop(10))
+    t_path = tmpdir.join(stored)
+    with marm.mjr.MJRWriter(t_path.strpath, pkt_type.type, packet_type=pkt_type) as w:
+        for pkt in shuffled:
+            w.write(pkt)
+
+    cur = marm.rtp.RTPCursor(
+        [t_path.strpath], marm.mjr.MJRRTPPacketReader,
+        order=order, packet_type=pkt_type, sidecar=True,
+    )
+    assert [key(pkt) for pkt in cur] == expected
+    cur.seek((0, -1))
+    assert key(cur.current()) == expected[-1]
+    assert [key(pkt) for pkt in cur.slice((0, 0), inclusive=True)] == expected[::-1]
+    cur.seek((0, 5))
+    assert key(cur.prev()) == expected[4]
+    assert key(cur.copy().current()) == expected[4]
+    assert len(cur.table()) == len(expected)
+
+    # saved w/ index
+    idx = marm.index.load_sidecar(t_path.strpath, pkt_type)
+    assert list(idx.orders[order]) == list(cur.parts[0].perm)
+    assert [key(shuffled[i]) for i in idx.orders[order]] == expected
+    cur = marm.rtp.RTPCursor(
+        [t_path.strpath], marm.mjr.MJRRTPPacketReader,
+        order=order, packet_type=pkt_type, sidecar=True,
+    )
+    assert [key(pkt) for pkt in cur] == expected
+
+    # followed, merged on poll and saved on close
+    f_path = tmpdir.join('followed-' + stored)
+    buf = t_path.read('rb')
+    head = len(idx) // 2
+    f_path.write(buf[:idx.offset[head] - marm.mjr.RECORD_HEADER_SIZE], 'wb')
+    cur = marm.rtp.RTPCursor(
+        [f_path.strpath], marm.mjr.MJRRTPPacketReader,
+        order=order, packet_type=pkt_type, follow=True, sidecar=True,
+    )
+    assert sum(1 for _ in cur) == head
+    f_path.write(buf, 'wb')
+    assert cur.poll() == len(idx) - head
+    assert list(cur.parts[0].perm) == list(idx.orders[order])
+    saved = marm.index.load_sidecar(f_path.strpath, pkt_type, prefix=True)
+    assert len(saved.orders[order]) == head
+    cur.parts[0].close()
+    saved = marm.index.load_sidecar(f_path.strpath, pkt_type)
+    assert list(saved.orders[order]) == list(idx.orders[order])
+
+    with pytest.raises(ValueError):
+        marm.rtp.packet_order(idx, 'ssrc')
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,count,size'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, 16, None),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 64, 32 * 1024),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, 0, None),
+    ],
+)
+def test_rtp_cursor_cache(fixtures, stored, pkt_type, count, size):
+    path = fixtures.join(stored)
+    expected = [
+        pkt.pack()
+        for pkt in marm.mjr.MJRRTPPacketReader(path.strpath, packet_type=pkt_type)
+    ]
+    cache = marm.rtp.PacketCache(count=count, size=size)
+    cur = marm.rtp.RTPCursor(
+        [path.strpath], marm.mjr.MJRRTPPacketReader,
+        packet_cache=cache, packet_type=pkt_type,
+    )
+    assert [pkt.pack() for pkt in cur] == expected
+    assert (cache.hits, cache.misses) == (0, len(expected))
+    assert len(cache) <= count
+    assert size is None or cache.bytes <= size
+    assert cache.bytes == sum(len(pkt) for pkt in expected[len(expected) - len(cache):])
+
+    # re-visits hit
+    misses = cache.misses
+    cur.seek((0, 100))
+    for _ in xrange(10):
+        with cur.restoring():
+            assert [pkt.pack() for pkt in cur.slice((0, 90), inclusive=True)] == expected[90:101][::-1]
+    if count:
+        assert cache.misses == misses + 11
+        assert cache.hits == 9 * 11
+    else:
+        assert cache.misses == misses + 10 * 11
+        assert cache.hits == 0
+    assert cur.copy().packet_cache is not cache
+
+    # opt-in so by default packets read are never shared
+    cur = marm.rtp.RTPCursor([path.strpath], packet_type=pkt_type)
+    assert cur.packet_cache is None
+    assert cur.copy().packet_cache is None
+    pkt = cur.current()
+    pkt.header.seq_number += 1
+    assert cur.current() is not pkt
+    assert cur.current().pack() == expected[0]
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,part_kwargs'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, {}),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, {'mmap': True}),
+        ('streets-of-rage.pcap', marm.vp8.VP8RTPPacket, {
+            'packet_filter': marm.rtp.PacketFilter(ssrc=3830765780),
+        }),
+    ],
+)
+def test_rtp_cursor_sequential(fixtures, stored, pkt_type, part_kwargs):
+    path = fixtures.join(stored)
+    expected = [
+        pkt.pack()
+        for pkt in marm.rtp.RTPPacketReader.open(
+            path.strpath, packet_type=pkt_type, **part_kwargs
+        )
+    ]
+    cur = marm.rtp.RTPCursor(
+        [path.strpath],
+        packet_cache=marm.rtp.PacketCache(count=0),
+        packet_type=pkt_type,
+        **part_kwargs
+    )
+    assert [pkt.pack() for pkt in cur] == expected
+    assert cur.part.stream is not None
+
+    # jumps fall back to random access
+    for begin, end in [(500, 510), (10, 20), (400, 300), (20, 30)]:
+        cur.seek((0, begin))
+        if begin <= end:
+            slice_ = expected[begin:end + 1]
+        else:
+            slice_ = expected[end:begin + 1][::-1]
+        assert [pkt.pack() for pkt in cur.slice((0, end), inclusive=True)] == slice_
+        assert cur.current().pack() == expected[end]
+        cur.seek(1)
+        assert cur.current().pack() == expected[end + 1]
+
+
+@pytest.mark.parametrize(
+    ('stored,pkt_type,expected'), [
+        ('sonic-a.mjr', marm.opus.OpusRTPPacket, {
+            'count': 5996, 'expected': 6000, 'lost': 4, 'frames': None,
+        }),
+        ('padded-v.mjr', marm.vp8.VP8RTPPacket, {
+            'count': 1058, 'expected': 1058, 'lost': 0, 'frames': 269,
+            'complete_frames': 267, 'key_frames': 6,
+        }),
+    ],
+)
+def test_rtp_stream_stats(tmpdir, fixtures, stored, pkt_type, expected):
+    s_path = tmpdir.join(stored)
+    fixtures.join(stored).copy(s_path)
+    pkts = list(marm.mjr.MJRRTPPacketReader(s_path.strpath, packet_type=pkt_type))
+
+    stats = marm.rtp.stream_stats(pkts)
+    for name, value in expected.items():
+        assert getattr(stats, name) == value
+    assert stats.bytes == sum(len(pkt.pack()) for pkt in pkts)
+    assert all(pkt.size == len(pkt.pack()) for pkt in pkts)
+    l_pkts = marm.mjr.MJRRTPPacketReader(
+        s_path.strpath, packet_type=marm.rtp.lazy(pkt_type),
+    )
+    assert all(pkt.size == len(pkt.pack()) for pkt in l_pkts)
+    assert (stats.duplicates, stats.reordered, stats.jitter) == (0, 0, None)
+    assert abs(stats.duration - (pkts[-1].secs - pkts[0].secs)) < 1e-6
+
+    # from index, kept in it and saved w/ it
+    cur = marm.rtp.RTPCursor([s_path.strpath], packet_type=pkt_type, sidecar=True)
+    assert cur.stats() == [stats]
+    idx = marm.index.load_sidecar(s_path.strpath, pkt_type)
+    assert idx.meta['stats']['stats'] == stats._asdict()
+    idx.meta['stats']['stats']['count'] = -1
+    assert marm.rtp.index_stats(idx, pkt_type).count == -1
+    assert marm.rtp.index_stats(idx, pkt_type, gap=0.01).count == stats.count
+
+    # perturbed
+    perturbed = list(pkts)
+    perturbed[10], perturbed[13] = perturbed[13], perturbed[10]
+    perturbed.insert(20, perturbed[18])
+    perturbed.insert(30, perturbed[25])
+    del perturbed[40:43]
+    p_stats = marm.rtp.stream_stats(perturbed, gap=0.01)
+    assert p_stats.count == stats.count - 3
+    assert p_stats.lost == stats.lost + 3
+    assert p_stats.duplicates == 2
+    assert p_stats.reordered == 3
+    assert p_stats.reorder_depth == 3
+    assert p_stats.timestamp_gaps > 0
+
+    # arrivals
+    arrivals = [(pkt.secs, pkt) for pkt in pkts]
+    assert marm.rtp.stream_stats(arrivals).jitter < 1e-9
+    assert marm.rtp.stream_stats([]).count == 0
+
+    # w/o clock rate
+    with pytest.raises(ValueError):
+        marm.rtp.stream_stats(
+            marm.mjr.MJRRTPPacketReader(s_path.strpath)
+        )
+    with pytest.raises(ValueError):
+        marm.rtp.index_stats(idx, marm.rtp.RTPPacket)
+    with pytest.raises(ValueError):
+        marm.rtp.RTPCursor([s_path.strpath]).stats()
+
+
+def test_rtp_pcap_stream_stats(fixtures):
+    with fixtures.join('streets-of-rage.pcap').open('rb') as fo:
+        pkts = marm.pcap.PCapRTPPacketReader(
+            fo,
+            packet_type=marm.vp8.VP8RTPPacket,
+            packet_filter=marm.rtp.PacketFilter(ssrc=3830765780),
+        )
+        stats = marm.rtp.stream_stats(pkts.arrivals())
+        assert (stats.count, stats.lost, stats.frames) == (1239, 0, 244)
+        assert 0 < stats.jitter < 0.1
+        assert stats._replace(jitter=None) == marm.rtp.stream_stats(pkts)